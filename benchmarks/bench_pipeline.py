@@ -0,0 +1,234 @@
+"""
+Benchmark the capture -> decode -> detect -> analyze pipeline offline
+
+Replays synthetic scenes (or a directory of recorded JPEGs) through the
+AppDaemon app's own MotionPipeline, with a headless host, in-memory frame
+capture and stub Anthropic and MQTT clients, and reports per-stage latency
+percentiles, frames/sec and peak memory for each scene and resolution.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --resolutions 1920x1080 --scenes moving_blob --frames 200
+    python benchmarks/bench_pipeline.py --frames-dir ~/recordings/driveway --json after.json --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'deployment'))
+
+from motion_core.decode import DETECTION_SIZE  # noqa: E402
+from motion_core.headless import HeadlessHost, run  # noqa: E402
+from motion_core.metrics import Metrics  # noqa: E402
+from motion_core.pipeline import MotionPipeline  # noqa: E402
+
+from frames import (SCENES, ReplayAnalysisCapture, ReplayCapture, directory_jpegs, raw_gray,  # noqa: E402
+                    synthetic_jpegs)
+from stubs import StubMQTT, stub_anthropic_module  # noqa: E402
+
+# Settings the benchmark runs with unless --settings overrides them: every
+# trigger is analyzed (by the stub), and nothing is timed or published in the background
+BENCH_SETTINGS = {
+    'camera_name': 'bench',
+    'snapshot_url': 'bench://frames',
+    'analyzer': 'anthropic',
+    'anthropic_api_key': 'bench',
+    'analysis_rate_per_minute': 0,
+    'cooldown_seconds': 0,
+    'log_ticks': False,
+}
+
+
+class BenchHost(HeadlessHost):
+    """Headless host that hands MQTT publishes to a StubMQTT and drops the log"""
+
+    name = 'bench'
+
+    def __init__(self, mqtt: StubMQTT):
+        super().__init__()
+        self.mqtt = mqtt
+        self.errors: List[str] = []
+
+    def log(self, message: str):
+        pass
+
+    def error(self, message: str):
+        self.errors.append(message)
+
+    def call_service(self, service: str, **kwargs):
+        if service == 'mqtt/publish':
+            self.mqtt.publish(kwargs.get('topic'), kwargs.get('payload'), kwargs.get('retain', False))
+
+    def fire_event(self, event: str, **kwargs):
+        pass
+
+
+def start_pipeline(frames: List[bytes], jpegs: List[bytes], settings: Dict) -> Tuple[MotionPipeline, BenchHost]:
+    """MotionPipeline for one camera whose captures replay frames (raw gray or JPEG) on stream time"""
+    args = dict(BENCH_SETTINGS)
+    args.update(settings)
+    args.update({'mqtt_client': 'service', 'metrics_interval': 0, 'metrics_port': None,
+                 'analysis_queue_size': max(args.get('analysis_queue_size', 2), len(frames)),
+                 'analysis_max_age': float('inf')})
+    host = BenchHost(StubMQTT())
+    pipeline = MotionPipeline(args, host=host, label='bench')
+    if not pipeline.start():
+        pipeline.stop()
+        raise SystemExit('\n'.join(host.errors) or "pipeline failed to start")
+    for camera in pipeline.cameras.values():
+        camera.snapshot_capture = ReplayCapture(frames, camera.check_interval)
+        camera.clock = camera.snapshot_capture.clock
+        if camera.analysis_capture is not None:
+            camera.analysis_capture = ReplayAnalysisCapture(camera.snapshot_capture, jpegs)
+    return pipeline, host
+
+
+def percentiles(summary: Dict) -> Dict[str, float]:
+    """A Metrics stage summary (seconds) as count, mean and p50/p95/p99 in milliseconds"""
+    return {"count": summary['count'], "mean": summary['mean'] * 1000,
+            "p50": summary['p50'] * 1000, "p95": summary['p95'] * 1000, "p99": summary['p99'] * 1000}
+
+
+def bench(frames: List[bytes], jpegs: List[bytes], settings: Dict, warmup: int, measure_memory: bool) -> Dict:
+    """Run check_motion over every frame, then optionally replay them again under tracemalloc"""
+    anthropic = stub_anthropic_module()
+    previous_module = sys.modules.get('anthropic')
+    sys.modules['anthropic'] = anthropic
+    try:
+        pipeline, host = start_pipeline(frames, jpegs, settings)
+        camera = next(iter(pipeline.cameras.values()))
+        try:
+            for _ in range(warmup):
+                pipeline.check_motion({'camera': camera.name})
+            pipeline.analysis_queue.wait()
+            # Measure from here, keeping every sample for the percentiles
+            camera.metrics = Metrics(window=max(len(frames), 1))
+            api_calls = sum(client.messages.calls for client in anthropic.clients)
+            started = time.perf_counter()
+            run(pipeline)
+            elapsed = time.perf_counter() - started
+        finally:
+            pipeline.stop()
+        snapshot = camera.metrics.snapshot()
+        counters = snapshot['counters']
+        measured = len(frames) - warmup
+        report = {
+            "frames": measured,
+            "triggers": counters['triggers'],
+            "coarse_quiet": counters.get('cascade_quiet', 0) + counters.get('cascade_refresh', 0),
+            "preclassifier_filtered": counters.get('preclassifier_rejected', 0),
+            "cache_hits": counters['cache_hits'],
+            "analyses": counters['analyses'],
+            "api_calls": sum(client.messages.calls for client in anthropic.clients) - api_calls,
+            "published": len(host.mqtt.messages),
+            "errors": len(host.errors),
+            "fps": measured / elapsed if elapsed else 0.0,
+            "stages": {stage: percentiles(summary) for stage, summary in snapshot['stages'].items()
+                       if summary['count']}
+        }
+
+        if measure_memory:
+            # Separate pass: tracemalloc slows allocation-heavy code down
+            tracemalloc.start()
+            pipeline, _ = start_pipeline(frames, jpegs, settings)
+            try:
+                run(pipeline)
+            finally:
+                pipeline.stop()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report["peak_traced_mb"] = peak / 2 ** 20
+    finally:
+        if previous_module is None:
+            sys.modules.pop('anthropic', None)
+        else:
+            sys.modules['anthropic'] = previous_module
+    return report
+
+
+def parse_resolution(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def print_report(results: List[Dict], baseline: Optional[Dict] = None):
+    header = f"{'source':<14} {'resolution':>10} {'fps':>8} {'check p50':>9} {'p95':>7} {'p99':>7} " \
+             f"{'decode':>7} {'detect':>7} {'quiet':>5} {'trig':>5} {'peak MB':>8}   (latencies in ms, stages at p50)"
+    print(header)
+    print('-' * 98)
+    previous = {(r['source'], r['resolution']): r for r in (baseline or {}).get('results', [])}
+    for r in results:
+        stages = r['stages']
+        check = stages['check']
+        decode = stages.get('decode', {}).get('p50', 0.0)
+        detect = stages.get('detect', {}).get('p50', 0.0)
+        peak = f"{r['peak_traced_mb']:.1f}" if 'peak_traced_mb' in r else '-'
+        line = (f"{r['source']:<14} {r['resolution']:>10} {r['fps']:>8.1f} {check['p50']:>9.2f} "
+                f"{check['p95']:>7.2f} {check['p99']:>7.2f} {decode:>7.2f} {detect:>7.2f} "
+                f"{r.get('coarse_quiet', 0):>5} {r['triggers']:>5} {peak:>8}")
+        before = previous.get((r['source'], r['resolution']))
+        if before:
+            # Reports from before the benchmark drove MotionPipeline called the check "tick"
+            before_p50 = (before['stages'].get('check') or before['stages']['tick'])['p50']
+            change = (check['p50'] - before_p50) / before_p50
+            line += f"  {change:+.0%} vs baseline"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenes', default=','.join(SCENES),
+                        help=f"comma-separated synthetic scenes ({', '.join(SCENES)})")
+    parser.add_argument('--frames-dir', help="directory of recorded JPEGs to replay as well")
+    parser.add_argument('--resolutions', default='640x360,1280x720,1920x1080',
+                        help="comma-separated WIDTHxHEIGHT for synthetic scenes")
+    parser.add_argument('--frames', type=int, default=60, help="frames per run")
+    parser.add_argument('--warmup', type=int, default=3, help="untimed frames at the start of each run")
+    parser.add_argument('--settings', default='{}',
+                        help="JSON dict of app settings, e.g. '{\"decode_mode\": \"raw\", \"background_model\": \"gaussian\"}'")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--json', help="write the full report to this file")
+    parser.add_argument('--baseline', help="earlier --json report to compare check p50 against")
+    args = parser.parse_args(argv)
+
+    settings = json.loads(args.settings)
+    raw = settings.get('decode_mode') == 'raw'
+    sources = []
+    for scene in filter(None, args.scenes.split(',')):
+        for resolution in args.resolutions.split(','):
+            frames = synthetic_jpegs(scene, parse_resolution(resolution), args.frames + args.warmup)
+            sources.append((scene, resolution, frames))
+    if args.frames_dir:
+        frames = directory_jpegs(args.frames_dir, args.frames + args.warmup)
+        sources.append((os.path.basename(os.path.normpath(args.frames_dir)), 'recorded', frames))
+
+    results = []
+    for name, resolution, frames in sources:
+        jpegs = frames
+        if raw:
+            # ffmpeg already scaled to DETECTION_SIZE; the JPEGs are the on-demand analysis snapshots
+            frames = raw_gray(frames, DETECTION_SIZE)
+        report = bench(frames, jpegs, settings, min(args.warmup, len(frames) - 1), not args.no_memory)
+        report.update(source=name, resolution=resolution)
+        results.append(report)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nProcess peak RSS: {max_rss:.0f} MB")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"settings": settings, "max_rss_mb": max_rss, "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
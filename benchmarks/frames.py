@@ -0,0 +1,147 @@
+"""
+Frame sources for benchmarks
+Synthetic scenes rendered in memory, or a directory of recorded JPEGs
+"""
+
+import os
+import time
+from io import BytesIO
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def _backdrop(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """A textured RGB 'yard': sky/ground gradient plus a few fixed boxes"""
+    rng = np.random.default_rng(seed)
+    ys = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    xs = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    base = 90 + 80 * ys + 20 * xs
+    frame = np.repeat(base[:, :, None], 3, axis=2)
+    for _ in range(6):
+        x0, y0 = rng.integers(0, width - width // 6), rng.integers(0, height - height // 6)
+        frame[y0:y0 + height // 6, x0:x0 + width // 6] = rng.integers(20, 230, 3)
+    frame += rng.normal(0, 4, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def _encode(frame: np.ndarray, quality: int = 85) -> bytes:
+    out = BytesIO()
+    Image.fromarray(frame).save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+
+def static_scene(width: int, height: int, count: int) -> Iterator[np.ndarray]:
+    """The same frame every time"""
+    frame = _backdrop(width, height)
+    for _ in range(count):
+        yield frame
+
+
+def noise_scene(width: int, height: int, count: int) -> Iterator[np.ndarray]:
+    """Static scene with per-frame sensor noise"""
+    frame = _backdrop(width, height).astype(np.int16)
+    rng = np.random.default_rng(1)
+    for _ in range(count):
+        noisy = frame + rng.normal(0, 6, frame.shape).astype(np.int16)
+        yield np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def moving_blob_scene(width: int, height: int, count: int) -> Iterator[np.ndarray]:
+    """A dark person-sized blob walking across the frame"""
+    backdrop = _backdrop(width, height)
+    blob_w, blob_h = max(4, width // 12), max(8, height // 4)
+    ys, xs = np.ogrid[:blob_h, :blob_w]
+    ellipse = ((xs - blob_w / 2) / (blob_w / 2)) ** 2 + ((ys - blob_h / 2) / (blob_h / 2)) ** 2 <= 1
+    top = height // 2
+    for index in range(count):
+        frame = backdrop.copy()
+        left = int((index * width / max(1, count // 2)) % (width - blob_w))
+        frame[top:top + blob_h, left:left + blob_w][ellipse] = (40, 35, 30)
+        yield frame
+
+
+def lighting_ramp_scene(width: int, height: int, count: int) -> Iterator[np.ndarray]:
+    """Whole scene slowly brightening, like a cloud passing or dawn"""
+    frame = _backdrop(width, height).astype(np.float32)
+    for index in range(count):
+        gain = 0.6 + 0.8 * index / max(1, count - 1)
+        yield np.clip(frame * gain, 0, 255).astype(np.uint8)
+
+
+SCENES: Dict[str, Callable[[int, int, int], Iterator[np.ndarray]]] = {
+    'static': static_scene,
+    'noise': noise_scene,
+    'moving_blob': moving_blob_scene,
+    'lighting_ramp': lighting_ramp_scene,
+}
+
+
+def synthetic_jpegs(scene: str, size: Tuple[int, int], count: int, quality: int = 85) -> List[bytes]:
+    """Render and JPEG-encode a synthetic scene up front, so encoding is not timed"""
+    width, height = size
+    return [_encode(frame, quality) for frame in SCENES[scene](width, height, count)]
+
+
+def directory_jpegs(path: str, count: int = 0) -> List[bytes]:
+    """Recorded JPEGs from a directory, in file name order (0 = all)"""
+    names = sorted(name for name in os.listdir(path) if name.lower().endswith(('.jpg', '.jpeg')))
+    if count:
+        names = names[:count]
+    frames = []
+    for name in names:
+        with open(os.path.join(path, name), 'rb') as f:
+            frames.append(f.read())
+    if not frames:
+        raise ValueError(f"no JPEG files in {path}")
+    return frames
+
+
+def raw_gray(jpegs: List[bytes], size: Tuple[int, int]) -> List[bytes]:
+    """Convert JPEGs to the gray rawvideo frames ffmpeg emits for decode_mode raw"""
+    frames = []
+    for jpeg in jpegs:
+        img = Image.open(BytesIO(jpeg)).convert('L').resize(size, Image.Resampling.BOX)
+        frames.append(img.tobytes())
+    return frames
+
+
+class ReplayCapture:
+    """In-memory frames served one per capture() call, in place of a camera's ffmpeg capture
+
+    Like FileFrameSource it runs on stream time (`clock`), one frame per
+    interval, and sets `exhausted` once the last frame has been returned.
+    """
+
+    def __init__(self, frames: List[bytes], interval: float = 1.0):
+        self.frames = frames
+        self.interval = interval
+        self.frames_read = 0
+        self.exhausted = not frames
+        self.started = time.time()
+
+    def clock(self) -> float:
+        return self.started + max(0, self.frames_read - 1) * self.interval
+
+    def capture(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        if self.exhausted:
+            return None
+        frame = self.frames[self.frames_read]
+        self.frames_read += 1
+        self.exhausted = self.frames_read >= len(self.frames)
+        return frame
+
+    def close(self):
+        pass
+
+
+class ReplayAnalysisCapture:
+    """The JPEG of the frame a ReplayCapture returned last, standing in for the on-demand analysis snapshot"""
+
+    def __init__(self, source: ReplayCapture, jpegs: List[bytes]):
+        self.source = source
+        self.jpegs = jpegs
+
+    def capture(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        return self.jpegs[max(0, self.source.frames_read - 1)]
@@ -0,0 +1,107 @@
+"""
+Offline stand-ins for the Anthropic and MQTT clients
+They do the same serialization work as the real calls, minus the network
+"""
+
+import json
+import time
+from types import ModuleType, SimpleNamespace
+from typing import Dict, List, Optional
+
+from motion_core.vision import min_cacheable_tokens
+
+STUB_RESULT = {
+    "detections": [
+        {"type": "person", "location": "driveway", "description": "walking up the driveway", "confidence": 0.9}
+    ],
+    "summary": "person on the driveway"
+}
+
+
+class StubMessages:
+    def __init__(self, latency: float = 0.0, text: Optional[str] = None):
+        self.latency = latency
+        self.text = text
+        self.calls = 0
+        self.request_bytes = 0
+
+    def create(self, **request):
+        """Serialize the request like the SDK would and return a canned answer
+
+        Answers through the forced tool when the request defines one, otherwise
+        as JSON text. Cacheable prefixes of at least the model's minimum size
+        count as cache reads after the first call.
+        """
+        self.calls += 1
+        body = json.dumps(request)
+        self.request_bytes += len(body)
+        if self.latency:
+            time.sleep(self.latency)
+
+        # Like the API: the prefix (tools, then system blocks up to the last cache_control
+        # breakpoint) is only cached when it reaches the model's minimum size
+        system = request.get('system', [])
+        marked = [index for index, block in enumerate(system) if isinstance(block, dict) and 'cache_control' in block]
+        cached = 0
+        if marked:
+            cached = (len(json.dumps(request.get('tools', []))) +
+                      sum(len(json.dumps(block)) for block in system[:marked[-1] + 1])) // 4
+            if cached < min_cacheable_tokens(request.get('model', '')):
+                cached = 0
+        usage = SimpleNamespace(
+            input_tokens=len(body) // 4 - cached,
+            output_tokens=60,
+            cache_read_input_tokens=cached if self.calls > 1 else 0,
+            cache_creation_input_tokens=cached if self.calls == 1 else 0
+        )
+        tool_choice = request.get('tool_choice') or {}
+        if self.text is not None:
+            block = SimpleNamespace(type='text', text=self.text)
+            stop_reason = 'end_turn'
+        elif tool_choice.get('type') == 'tool':
+            block = SimpleNamespace(type='tool_use', id='toolu_stub', name=tool_choice['name'],
+                                    input=json.loads(json.dumps(STUB_RESULT)))
+            stop_reason = 'tool_use'
+        else:
+            block = SimpleNamespace(type='text', text=json.dumps(STUB_RESULT))
+            stop_reason = 'end_turn'
+        return SimpleNamespace(content=[block], usage=usage, stop_reason=stop_reason)
+
+
+class StubAnthropic:
+    """Drop-in for anthropic.Anthropic with an optional fixed response latency
+
+    With text set every answer is that text, as from a model that ignored the tool.
+    """
+
+    def __init__(self, latency: float = 0.0, text: Optional[str] = None, **_):
+        self.messages = StubMessages(latency, text)
+
+
+def stub_anthropic_module(latency: float = 0.0) -> ModuleType:
+    """Stand-in for the anthropic package: Anthropic(...) builds StubAnthropic clients, kept in .clients
+
+    Put it in sys.modules['anthropic'] before the analyzer is created.
+    """
+    module = ModuleType('anthropic')
+    module.clients = []
+
+    def create(**_):
+        client = StubAnthropic(latency)
+        module.clients.append(client)
+        return client
+
+    module.Anthropic = create
+    return module
+
+
+class StubMQTT:
+    """Collects publishes instead of sending them"""
+
+    def __init__(self):
+        self.messages: List[Dict] = []
+
+    def publish(self, topic: str, payload, retain: bool = False):
+        if not isinstance(payload, str):
+            payload = json.dumps(payload)
+        self.messages.append({"topic": topic, "payload": payload, "retain": retain})
@@ -0,0 +1,41 @@
+"""
+Camera Motion Detection core
+Frame capture, detection, analysis and publishing shared by the AppDaemon apps.
+Nothing in this package imports AppDaemon; `python -m motion_core` runs the
+pipeline on recordings (see headless.py).
+
+The names below are resolved on first access, so `import motion_core` loads
+none of numpy, Pillow or the optional dependencies.
+"""
+
+import importlib
+
+_EXPORTS = {
+    'MotionPipeline': 'pipeline',
+    'scheduled_args': 'pipeline',
+    'HeadlessHost': 'headless',
+    'Camera': 'camera',
+    'camera_configs': 'camera',
+    'create_analyzer': 'analyzers',
+    'ANALYZERS': 'analyzers',
+    'DETECTORS': 'detectors',
+    'CAPTURE_MODES': 'capture',
+    'FileFrameSource': 'capture',
+    'DECODE_MODES': 'decode',
+    'MQTT_CLIENTS': 'publisher',
+    'MQTTPublisher': 'publisher',
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,162 @@
+"""
+Analysis strategies
+What a trigger is sent to once it passes the cooldown, cache and pre-classifier
+
+    anthropic - Claude vision behind the ResilientClient (rate limit, daily budget,
+                retries, circuit breaker); the default
+    none      - motion-only: triggers are published and stored without detections
+                and no API key is needed (headless replays, cost-free setups)
+
+Every analyzer offers available() (None, or why no call can go out now),
+reserve() (the same check, also claiming the rate-limit slot for one call) and
+release() (give an unused reservation back), analyze(images_base64, note,
+reserved) returning a result dict, and state() for the analysis/api topic. The anthropic package is imported when the analyzer is
+built, not with this module.
+"""
+
+import traceback
+from typing import Callable, Dict, List, Optional
+
+from .resilience import APIUnavailable, CircuitBreaker, DailyBudget, ResilientClient
+from .vision import (DEFAULT_MODEL, DETECTION_PROMPT, build_request, parse_response, prompt_cacheable,
+                     response_text, usage_counts)
+
+ANALYZERS = ('anthropic', 'none')
+
+
+class VisionAnalyzer:
+    """Detections from the Anthropic vision API"""
+
+    name = 'anthropic'
+
+    def __init__(self, client: ResilientClient, model: str = DEFAULT_MODEL, max_tokens: int = 300,
+                 prompt: str = DETECTION_PROMPT, cache_prompt: bool = True, structured: bool = True,
+                 error: Optional[Callable[[str], None]] = None):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.prompt = prompt
+        self.cache_prompt = cache_prompt
+        self.structured = structured
+        # The API ignores cache_control on prefixes below its minimum size
+        self.prompt_cached = cache_prompt and prompt_cacheable(model, prompt, structured)
+        self.error = error or (lambda message: None)
+
+    def available(self) -> Optional[str]:
+        return self.client.available()
+
+    def reserve(self) -> Optional[str]:
+        return self.client.reserve()
+
+    def release(self):
+        self.client.release()
+
+    def state(self) -> Dict:
+        return self.client.state()
+
+    def analyze(self, images_base64: List[str], note: Optional[str] = None, reserved: bool = False) -> Dict:
+        """Analyze one or more images with Anthropic Claude Vision"""
+        try:
+            request = build_request(
+                images_base64,
+                note,
+                model=self.model,
+                max_tokens=self.max_tokens,
+                prompt=self.prompt,
+                cache_prompt=self.cache_prompt,
+                structured=self.structured
+            )
+
+            # Call Anthropic API (rate limited, retried, behind the circuit breaker)
+            response = self.client.create(reserved=reserved, **request)
+
+            result = parse_response(response)
+            if result is None:
+                text_content = response_text(response)
+                self.error(f"Could not parse detections from response: {text_content}")
+                result = {"detections": [], "summary": text_content}
+            result["usage"] = usage_counts(response)
+            return result
+
+        except APIUnavailable as e:
+            return {"detections": [], "summary": f"AI analysis skipped: {e.reason}", "skipped": True}
+        except Exception as e:
+            self.error(f"Error calling Anthropic API: {e}")
+            self.error(traceback.format_exc())
+            return {"detections": [], "summary": f"Error: {str(e)}", "error": True}
+
+
+class MotionOnlyAnalyzer:
+    """No analysis: every trigger becomes a motion-only event"""
+
+    name = 'none'
+
+    def available(self) -> Optional[str]:
+        return "analysis disabled"
+
+    def reserve(self) -> Optional[str]:
+        return self.available()
+
+    def release(self):
+        pass
+
+    def state(self) -> Dict:
+        return {"analyzer": self.name}
+
+    def analyze(self, images_base64: List[str], note: Optional[str] = None, reserved: bool = False) -> Dict:
+        return {"detections": [], "summary": "AI analysis skipped: analysis disabled", "skipped": True}
+
+
+def create_analyzer(args: Dict, on_change: Optional[Callable[[Dict], None]] = None,
+                    log: Optional[Callable[[str], None]] = None,
+                    error: Optional[Callable[[str], None]] = None):
+    """Build the analyzer named by args['analyzer'] from the app settings
+
+    Raises ValueError for an unknown analyzer or a missing API key, and whatever
+    the anthropic package raises if it is missing or rejects the settings.
+    """
+    name = args.get('analyzer', 'anthropic')
+    if name == 'none':
+        return MotionOnlyAnalyzer()
+    if name != 'anthropic':
+        raise ValueError(f"analyzer must be one of {', '.join(ANALYZERS)}")
+    api_key = args.get('anthropic_api_key')
+    if not api_key:
+        raise ValueError("anthropic_api_key is required in configuration")
+
+    import anthropic
+    # Retries are handled by the ResilientClient wrapper below
+    client = anthropic.Anthropic(
+        api_key=api_key,
+        timeout=args.get('analysis_timeout', 30),
+        max_retries=0
+    )
+
+    # Rate limit, daily budget, retries and circuit breaker shared by every camera
+    resilient = ResilientClient(
+        client,
+        usage_counts,
+        rate_per_minute=args.get('analysis_rate_per_minute', 6),
+        burst=args.get('analysis_burst', 3),
+        budget=DailyBudget(
+            max_calls=args.get('analysis_daily_call_limit', 0),
+            max_cost=args.get('analysis_daily_cost_limit', 0),
+            prices=args.get('analysis_prices')
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=args.get('analysis_breaker_failures', 3),
+            reset_timeout=args.get('analysis_breaker_reset', 300)
+        ),
+        retries=args.get('analysis_retries', 2),
+        on_change=on_change,
+        log=log
+    )
+    return VisionAnalyzer(
+        resilient,
+        model=args.get('analysis_model', DEFAULT_MODEL),
+        max_tokens=args.get('analysis_max_tokens', 300),
+        prompt=args.get('analysis_prompt', DETECTION_PROMPT),
+        cache_prompt=args.get('analysis_prompt_cache', True),
+        structured=args.get('analysis_structured_output', True),
+        error=error
+    )
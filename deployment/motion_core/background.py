@@ -0,0 +1,195 @@
+"""
+Background models for motion detection
+Each model compares a new frame against what it has learned, then updates in place
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .diff import FrameDiffer
+
+BACKGROUND_MODELS = ('last_frame', 'running_average', 'gaussian')
+
+
+class BackgroundModel:
+    """Base class for pluggable background models
+
+    apply() returns (changed_pixels, avg_change) for a uint8 grayscale frame, or
+    None while the model is still establishing its baseline. The changed-pixel
+    mask of the last call is available as `mask`.
+    """
+
+    def __init__(self, threshold: int = 30):
+        self.threshold = threshold
+        self.frames_seen = 0
+
+    @property
+    def mask(self) -> Optional[np.ndarray]:
+        """Changed-pixel mask from the last apply() call"""
+        raise NotImplementedError
+
+    def apply(self, frame: np.ndarray) -> Optional[Tuple[int, float]]:
+        """Score a frame against the background, then learn from it"""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget the learned background"""
+        self.frames_seen = 0
+
+
+class LastFrameModel(BackgroundModel):
+    """Compare each frame with the previous one (original behaviour)"""
+
+    def __init__(self, threshold: int = 30):
+        super().__init__(threshold)
+        self.differ = FrameDiffer(threshold)
+        self._previous: Optional[np.ndarray] = None
+
+    @property
+    def mask(self) -> Optional[np.ndarray]:
+        return self.differ.mask if self.frames_seen > 1 else None
+
+    def apply(self, frame: np.ndarray) -> Optional[Tuple[int, float]]:
+        result = None
+        if self._previous is None or self._previous.shape != frame.shape:
+            self._previous = np.empty_like(frame, dtype=np.uint8)
+            self.frames_seen = 0
+        elif self.frames_seen:
+            result = self.differ.compare(frame, self._previous)
+        np.copyto(self._previous, frame)
+        self.frames_seen += 1
+        return result
+
+
+class RunningAverageModel(BackgroundModel):
+    """Exponential running average background
+
+    background += alpha * (frame - background), kept as float32 and compared as
+    uint8, so gradual lighting drift is absorbed instead of counted as motion.
+    """
+
+    def __init__(self, threshold: int = 30, alpha: float = 0.05):
+        super().__init__(threshold)
+        self.alpha = alpha
+        self.differ = FrameDiffer(threshold)
+        self._average: Optional[np.ndarray] = None
+
+    @property
+    def mask(self) -> Optional[np.ndarray]:
+        return self.differ.mask if self.frames_seen > 1 else None
+
+    @property
+    def background(self) -> Optional[np.ndarray]:
+        """Current background as uint8"""
+        return self._background if self._average is not None else None
+
+    def _allocate(self, frame: np.ndarray):
+        self._average = frame.astype(np.float32)
+        self._scratch = np.empty(frame.shape, dtype=np.float32)
+        self._background = frame.astype(np.uint8)
+
+    def apply(self, frame: np.ndarray) -> Optional[Tuple[int, float]]:
+        if self._average is None or self._average.shape != frame.shape:
+            self._allocate(frame)
+            self.frames_seen = 1
+            return None
+
+        result = self.differ.compare(frame, self._background)
+
+        # average += alpha * (frame - average), all in preallocated float32
+        np.subtract(frame, self._average, out=self._scratch)
+        self._scratch *= self.alpha
+        self._average += self._scratch
+        np.rint(self._average, out=self._scratch)
+        np.copyto(self._background, self._scratch, casting='unsafe')
+
+        self.frames_seen += 1
+        return result
+
+    def reset(self):
+        super().reset()
+        self._average = None
+
+
+class GaussianModel(BackgroundModel):
+    """Per-pixel running mean/variance (single Gaussian) background
+
+    A pixel is foreground when it is more than k standard deviations from its mean
+    and also changed by more than the brightness threshold. Noisy areas (foliage,
+    compression artefacts) learn a wide variance and stop triggering.
+    """
+
+    def __init__(self, threshold: int = 30, alpha: float = 0.05, k: float = 2.5,
+                 initial_std: float = 15.0):
+        super().__init__(threshold)
+        self.alpha = alpha
+        self.k = k
+        self.initial_std = initial_std
+        self._mean: Optional[np.ndarray] = None
+
+    @property
+    def mask(self) -> Optional[np.ndarray]:
+        return self._mask if self.frames_seen > 1 else None
+
+    @property
+    def background(self) -> Optional[np.ndarray]:
+        """Current per-pixel mean (float32)"""
+        return self._mean
+
+    def _allocate(self, frame: np.ndarray):
+        shape = frame.shape
+        self._mean = frame.astype(np.float32)
+        self._var = np.full(shape, self.initial_std ** 2, dtype=np.float32)
+        self._delta = np.empty(shape, dtype=np.float32)
+        self._delta_sq = np.empty(shape, dtype=np.float32)
+        self._limit = np.empty(shape, dtype=np.float32)
+        self._mask = np.zeros(shape, dtype=bool)
+
+    def apply(self, frame: np.ndarray) -> Optional[Tuple[int, float]]:
+        if self._mean is None or self._mean.shape != frame.shape:
+            self._allocate(frame)
+            self.frames_seen = 1
+            return None
+
+        delta, delta_sq, limit, mask = self._delta, self._delta_sq, self._limit, self._mask
+
+        # Squared distance from the mean vs. max(k^2 * variance, threshold^2)
+        np.subtract(frame, self._mean, out=delta)
+        np.multiply(delta, delta, out=delta_sq)
+        np.multiply(self._var, self.k * self.k, out=limit)
+        np.maximum(limit, float(self.threshold * self.threshold), out=limit)
+        np.greater(delta_sq, limit, out=mask)
+
+        changed_pixels = int(np.count_nonzero(mask))
+        avg_change = 0.0
+        if changed_pixels:
+            np.abs(delta, out=limit)
+            limit *= mask
+            avg_change = float(limit.sum(dtype=np.float64)) / changed_pixels
+
+        # mean += alpha * delta; var += alpha * (delta^2 - var)
+        delta *= self.alpha
+        self._mean += delta
+        np.subtract(delta_sq, self._var, out=delta_sq)
+        delta_sq *= self.alpha
+        self._var += delta_sq
+
+        self.frames_seen += 1
+        return changed_pixels, avg_change
+
+    def reset(self):
+        super().reset()
+        self._mean = None
+
+
+def create_background_model(name: str, threshold: int = 30, alpha: float = 0.05,
+                            k: float = 2.5) -> BackgroundModel:
+    """Build a background model by its configuration name"""
+    if name == 'last_frame':
+        return LastFrameModel(threshold)
+    if name == 'running_average':
+        return RunningAverageModel(threshold, alpha=alpha)
+    if name == 'gaussian':
+        return GaussianModel(threshold, alpha=alpha, k=k)
+    raise ValueError(f"Unknown background model '{name}' (expected one of {', '.join(BACKGROUND_MODELS)})")
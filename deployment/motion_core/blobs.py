@@ -0,0 +1,146 @@
+"""
+Blob analysis of the motion mask
+Morphological cleanup and 8-connected component labelling (NumPy only), with per-blob boxes
+"""
+
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+
+class Blob(NamedTuple):
+    """One connected region of changed pixels, in detection-frame pixels"""
+    area: int
+    box: Tuple[int, int, int, int]          # (x0, y0, x1, y1), exclusive right/bottom
+    centroid: Tuple[float, float]           # (x, y)
+
+
+def _neighbourhood(mask: np.ndarray, combine) -> np.ndarray:
+    """Combine each pixel with its 8 neighbours, as a 1x3 then a 3x1 pass
+
+    Edges are padded with the neutral value, so erosion does not eat the frame border.
+    """
+    height, width = mask.shape
+    padded = np.empty((height + 2, width + 2), dtype=bool)
+    padded.fill(combine is np.logical_and)
+    padded[1:-1, 1:-1] = mask
+    rows = combine(padded[:, :-2], padded[:, 1:-1])
+    combine(rows, padded[:, 2:], out=rows)
+    out = combine(rows[:-2], rows[1:-1])
+    combine(out, rows[2:], out=out)
+    return out
+
+
+def erode(mask: np.ndarray, iterations: int = 1) -> np.ndarray:
+    for _ in range(iterations):
+        mask = _neighbourhood(mask, np.logical_and)
+    return mask
+
+
+def dilate(mask: np.ndarray, iterations: int = 1) -> np.ndarray:
+    for _ in range(iterations):
+        mask = _neighbourhood(mask, np.logical_or)
+    return mask
+
+
+def clean_mask(mask: np.ndarray, open_iterations: int = 1, close_iterations: int = 1) -> np.ndarray:
+    """Opening removes speckle noise, closing fills small holes inside objects (3x3 square element)"""
+    if open_iterations:
+        mask = dilate(erode(mask, open_iterations), open_iterations)
+    if close_iterations:
+        mask = erode(dilate(mask, close_iterations), close_iterations)
+    return mask
+
+
+def mask_runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Horizontal runs of set pixels as (rows, starts, ends), row-major, ends exclusive"""
+    padded = np.zeros((mask.shape[0], mask.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    return rows, starts, ends
+
+
+def label_runs(rows: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Component label (0..n-1) per run: runs on adjacent rows that touch (8-connected) are merged
+
+    Works on runs rather than pixels and stays vectorized: touching run pairs
+    are found with two searchsorted calls, then labels are merged by repeated
+    min-hooking and pointer jumping until every pair agrees.
+    """
+    count = len(rows)
+    if not count:
+        return np.zeros(0, dtype=np.int64)
+
+    # Within a row runs are sorted and disjoint, so the runs of the row above that
+    # touch run j (start <= ends[j] and end >= starts[j]) form a contiguous range
+    stride = int(ends.max()) + 2
+    start_keys = rows * stride + starts
+    end_keys = rows * stride + ends
+    above = (rows - 1) * stride
+    first = np.searchsorted(end_keys, above + starts)
+    last = np.searchsorted(start_keys, above + ends, side='right')
+    touching = np.maximum(last - first, 0)
+    pairs_b = np.repeat(np.arange(count), touching)
+    pairs_a = np.arange(len(pairs_b)) - np.repeat(np.cumsum(touching) - touching, touching) + \
+        np.repeat(first, touching)
+
+    labels = np.arange(count)
+    while True:
+        label_a, label_b = labels[pairs_a], labels[pairs_b]
+        if np.array_equal(label_a, label_b):
+            break
+        low = np.minimum(label_a, label_b)
+        np.minimum.at(labels, label_a, low)
+        np.minimum.at(labels, label_b, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+
+def find_blobs(mask: np.ndarray, min_area: int = 1, max_area: int = 0, open_iterations: int = 1,
+               close_iterations: int = 1, offset: Tuple[int, int] = (0, 0)) -> List[Blob]:
+    """Connected components of a cleaned mask with min_area <= area <= max_area (0 = no max)
+
+    offset is the (x, y) position of the mask inside the detection frame, for
+    masks computed on an ROI crop. Blobs are returned largest first.
+    """
+    if mask is None or not mask.any():
+        return []
+    mask = clean_mask(mask, open_iterations, close_iterations)
+    rows, starts, ends = mask_runs(mask)
+    if not len(rows):
+        return []
+    labels = label_runs(rows, starts, ends)
+    count = int(labels.max()) + 1
+
+    lengths = ends - starts
+    area = np.bincount(labels, weights=lengths, minlength=count)
+    sum_x = np.bincount(labels, weights=lengths * (starts + ends - 1) / 2.0, minlength=count)
+    sum_y = np.bincount(labels, weights=lengths * rows, minlength=count)
+    x0 = np.full(count, mask.shape[1])
+    y0 = np.full(count, mask.shape[0])
+    x1 = np.zeros(count, dtype=np.int64)
+    y1 = np.zeros(count, dtype=np.int64)
+    np.minimum.at(x0, labels, starts)
+    np.minimum.at(y0, labels, rows)
+    np.maximum.at(x1, labels, ends)
+    np.maximum.at(y1, labels, rows + 1)
+
+    offset_x, offset_y = offset
+    blobs = []
+    for index in np.argsort(-area):
+        size = int(area[index])
+        if size < min_area or (max_area and size > max_area):
+            continue
+        blobs.append(Blob(
+            size,
+            (int(x0[index]) + offset_x, int(y0[index]) + offset_y,
+             int(x1[index]) + offset_x, int(y1[index]) + offset_y),
+            (float(sum_x[index] / size) + offset_x, float(sum_y[index] / size) + offset_y)
+        ))
+    return blobs
@@ -0,0 +1,504 @@
+"""
+Per-camera configuration and detection state
+One app instance can watch several cameras, each with its own thresholds, ROI and interval
+"""
+
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .background import BACKGROUND_MODELS, create_background_model
+from .blobs import Blob, find_blobs
+from .cascade import COARSE_FACTOR, CoarseGate
+from .capture import CAPTURE_MODES, FileFrameSource, RTSPFrameReader, SnapshotCapture
+from .decode import DECODE_MODES, DETECTION_SIZE, decode_grayscale
+from .detectors import DETECTORS, FileSizeDetector
+from .guard import OVERLAP_POLICIES, CheckGuard
+from .metrics import Metrics
+from .motionvectors import MOTION_SOURCES, MotionVectorReader, VectorSample
+from .payload import PAYLOAD_CROPS, CropBox, mask_bounding_box
+from .phash import HASH_METHODS, ResultCache
+from .ringbuffer import ANALYSIS_FRAMES, FrameRing
+from .roi import MotionROI
+from .scheduler import AdaptiveInterval
+
+# Settings a camera entry may override; anything not set falls back to the app-level value
+CAMERA_KEYS = (
+    'snapshot_url',
+    'check_interval',
+    'motion_pixel_threshold',
+    'pixel_difference_threshold',
+    'cooldown_seconds',
+    'background_model',
+    'background_alpha',
+    'background_k',
+    'roi',
+    'capture_mode',
+    'file_interval',
+    'stream_fps',
+    'max_frame_age',
+    'decode_mode',
+    'debug_snapshot_dir',
+    'payload_crop',
+    'payload_margin',
+    'payload_max_edge',
+    'payload_quality',
+    'result_cache_ttl',
+    'result_cache_size',
+    'result_cache_distance',
+    'result_cache_hash',
+    'adaptive_schedule',
+    'burst_interval',
+    'burst_duration',
+    'idle_after',
+    'idle_interval',
+    'min_interval',
+    'max_interval',
+    'interval_schedule',
+    'overlap_policy',
+    'tick_budget',
+    'stage_budgets',
+    'analysis_frames',
+    'preroll_frames',
+    'postroll_frames',
+    'frame_buffer_size',
+    'frame_buffer_jpegs',
+    'cascade',
+    'cascade_threshold',
+    'cascade_min_changed',
+    'cascade_refresh',
+    'blob_detection',
+    'blob_min_area',
+    'blob_max_area',
+    'blob_open',
+    'blob_close',
+    'motion_source',
+    'mv_min_magnitude',
+    'mv_min_frames',
+    'preclassifier_model',
+    'preclassifier_threshold',
+    'detector',
+    'filesize_threshold',
+    'ignore_keywords',
+)
+
+# Keys only a `cameras` entry can set
+CAMERA_ENTRY_KEYS = ('name', 'mqtt_topic_prefix')
+
+
+class Detection(NamedTuple):
+    """Outcome of one detection frame
+
+    region is the (possibly ROI-cropped) frame that was scored, or None for
+    the file-size detector (changed_pixels is then the size change in bytes);
+    region_scores holds (name, changed, threshold) per ROI region, or None
+    without an ROI; blobs holds the qualifying blobs (largest first) when blob
+    detection is on.
+    """
+    triggered: bool
+    changed_pixels: int
+    avg_change: float
+    region_scores: Optional[List[Tuple[str, int, int]]]
+    region: Optional[np.ndarray]
+    blobs: Optional[List[Blob]] = None
+
+
+def camera_configs(args: Dict) -> List[Dict]:
+    """Expand app arguments into one settings dict per camera
+
+    Without a `cameras` list the app-level settings describe a single camera that
+    publishes under mqtt_topic_prefix (the original layout). With a list, each
+    entry inherits the app-level settings, overrides what it needs and publishes
+    under <mqtt_topic_prefix>/<name> unless it sets its own prefix. Entries
+    may only set CAMERA_KEYS (plus name and prefix); names must be unique.
+    """
+    prefix = args.get('mqtt_topic_prefix', 'camera_detection')
+    inherited = {key: args[key] for key in CAMERA_KEYS if key in args}
+
+    cameras = args.get('cameras')
+    if not cameras:
+        config = dict(inherited)
+        config['name'] = args.get('camera_name', 'camera')
+        config['mqtt_topic_prefix'] = prefix
+        config['log_prefix'] = ''
+        return [config]
+
+    configs = []
+    names = set()
+    for index, camera in enumerate(cameras):
+        unknown = sorted(key for key in camera if key not in CAMERA_KEYS and key not in CAMERA_ENTRY_KEYS)
+        if unknown:
+            raise ValueError(f"unknown camera setting(s) {', '.join(unknown)} in cameras entry {index + 1}")
+        config = dict(inherited)
+        config.update(camera)
+        name = camera.get('name') or f"camera_{index + 1}"
+        if name in names:
+            raise ValueError(f"duplicate camera name '{name}'")
+        names.add(name)
+        config['name'] = name
+        config['mqtt_topic_prefix'] = camera.get('mqtt_topic_prefix', f"{prefix}/{name}")
+        config['log_prefix'] = f"[{name}] "
+        configs.append(config)
+    return configs
+
+
+class Camera:
+    """Settings, capture sources and background state for one camera"""
+
+    def __init__(self, config: Dict):
+        self.name = config['name']
+        self.log_prefix = config.get('log_prefix', '')
+        self.mqtt_topic_prefix = config['mqtt_topic_prefix']
+
+        self.snapshot_url = config.get('snapshot_url')
+        self.check_interval = config.get('check_interval', 30)
+        self.motion_pixel_threshold = config.get('motion_pixel_threshold', 2000)
+        self.pixel_difference_threshold = config.get('pixel_difference_threshold', 30)
+        self.cooldown_seconds = config.get('cooldown_seconds', 30)
+        self.background_model_name = config.get('background_model', 'last_frame')
+        self.background_alpha = config.get('background_alpha', 0.05)
+        self.background_k = config.get('background_k', 2.5)
+        self.capture_mode = config.get('capture_mode', 'snapshot')
+        self.file_interval = config.get('file_interval', self.check_interval)
+        self.detector = config.get('detector', 'pixel')
+        self.filesize_threshold = config.get('filesize_threshold', 50000)
+        self.stream_fps = config.get('stream_fps', 2)
+        self.max_frame_age = config.get('max_frame_age', 10)
+        self.decode_mode = config.get('decode_mode', 'fast')
+        self.motion_source = config.get('motion_source', 'pixels')
+        self.mv_min_magnitude = config.get('mv_min_magnitude', 1.0)
+        self.mv_min_frames = config.get('mv_min_frames', 1)
+        self.debug_snapshot_dir = config.get('debug_snapshot_dir')
+        # Detections whose description mentions one of these are not published (e.g. "decoration")
+        self.ignore_keywords = [keyword.lower() for keyword in config.get('ignore_keywords') or []]
+
+        # AI payload: crop ("none", "motion" box or "roi" box), longest edge, JPEG quality
+        self.payload_crop = config.get('payload_crop', 'none')
+        self.payload_margin = config.get('payload_margin', 0.15)
+        self.payload_max_edge = config.get('payload_max_edge', 0)
+        self.payload_quality = config.get('payload_quality', 80)
+
+        # Perceptual-hash result cache (ttl 0 disables it)
+        self.result_cache_ttl = config.get('result_cache_ttl', 0)
+        self.result_cache_size = config.get('result_cache_size', 32)
+        self.result_cache_distance = config.get('result_cache_distance', 5)
+        self.result_cache_hash = config.get('result_cache_hash', 'dhash')
+
+        if not self.snapshot_url:
+            raise ValueError(f"{self.log_prefix}snapshot_url is required")
+        if self.background_model_name not in BACKGROUND_MODELS:
+            raise ValueError(f"background_model must be one of {', '.join(BACKGROUND_MODELS)}")
+        if self.capture_mode not in CAPTURE_MODES:
+            raise ValueError(f"capture_mode must be one of {', '.join(CAPTURE_MODES)}")
+        if self.detector not in DETECTORS:
+            raise ValueError(f"detector must be one of {', '.join(DETECTORS)}")
+        if self.decode_mode not in DECODE_MODES:
+            raise ValueError(f"decode_mode must be one of {', '.join(DECODE_MODES)}")
+        if self.motion_source not in MOTION_SOURCES:
+            raise ValueError(f"motion_source must be one of {', '.join(MOTION_SOURCES)}")
+        if self.payload_crop not in PAYLOAD_CROPS:
+            raise ValueError(f"payload_crop must be one of {', '.join(PAYLOAD_CROPS)}")
+        if self.result_cache_hash not in HASH_METHODS:
+            raise ValueError(f"result_cache_hash must be one of {', '.join(HASH_METHODS)}")
+
+        # Region of interest: only tiles inside the configured regions are evaluated
+        self.roi = None
+        roi_config = config.get('roi')
+        if roi_config:
+            self.roi = MotionROI(
+                roi_config.get('regions', []),
+                tile_size=roi_config.get('tile_size', 20),
+                default_threshold=self.motion_pixel_threshold
+            )
+
+        # Blob analysis: trigger on object-sized connected regions instead of a pixel count
+        self.blob_detection = config.get('blob_detection', False)
+        self.blob_min_area = config.get('blob_min_area', 200)
+        self.blob_max_area = config.get('blob_max_area', 0)
+        self.blob_open = config.get('blob_open', 1)
+        self.blob_close = config.get('blob_close', 1)
+        if self.blob_max_area and self.blob_max_area < self.blob_min_area:
+            raise ValueError("blob_max_area must be 0 or at least blob_min_area")
+        self.last_blobs: Optional[List[Blob]] = None
+        self.last_mask: Optional[np.ndarray] = None
+
+        # Local pre-classifier: crops that look empty never reach the vision API
+        self.preclassifier = None
+        model_path = config.get('preclassifier_model')
+        if model_path:
+            from .classifier import PreClassifier
+            try:
+                self.preclassifier = PreClassifier(model_path, config.get('preclassifier_threshold', 0.3))
+            except OSError as e:
+                raise ValueError(f"cannot load preclassifier_model {model_path}: {e}")
+
+        # Coarse-to-fine cascade: an 80x60 thumbnail decides whether the full path runs
+        self.cascade = None
+        if config.get('cascade', False):
+            # Conservative defaults: half the pixel threshold, and a quarter of the
+            # (smallest) trigger area measured in 4x4 coarse pixels
+            area = self.motion_pixel_threshold
+            if self.roi:
+                area = min(region.threshold for region in self.roi.regions)
+            if self.blob_detection:
+                area = min(area, self.blob_min_area)
+            self.cascade = CoarseGate.for_detection_bounds(
+                self.roi.pixel_bounds if self.roi else None,
+                threshold=config.get('cascade_threshold', max(1, self.pixel_difference_threshold // 2)),
+                min_changed=config.get('cascade_min_changed', max(1, area // (COARSE_FACTOR ** 2 * 4))),
+                refresh_every=config.get('cascade_refresh', 10)
+            )
+
+        # At most one check in flight; overlapping ticks are skipped or coalesced
+        self.overlap_policy = config.get('overlap_policy', 'skip')
+        if self.overlap_policy not in OVERLAP_POLICIES:
+            raise ValueError(f"overlap_policy must be one of {', '.join(OVERLAP_POLICIES)}")
+        self.guard = CheckGuard(self.overlap_policy)
+        self.tick_budget = config.get('tick_budget', self.check_interval)
+        self.stage_budgets = config.get('stage_budgets') or {}
+
+        # Motion detection state
+        self.background_model = create_background_model(
+            self.background_model_name,
+            threshold=self.pixel_difference_threshold,
+            alpha=self.background_alpha,
+            k=self.background_k
+        )
+        self.last_analysis_time = 0
+        self.metrics = Metrics()
+        self.result_cache = None
+        if self.result_cache_ttl:
+            self.result_cache = ResultCache(
+                max_entries=self.result_cache_size,
+                ttl=self.result_cache_ttl,
+                max_distance=self.result_cache_distance
+            )
+
+        # Pre-roll buffer: what the AI sees on a trigger ("single" frame, a
+        # "sequence" of frames or one "contact_sheet" of them)
+        self.analysis_frames = config.get('analysis_frames', 'single')
+        if self.analysis_frames not in ANALYSIS_FRAMES:
+            raise ValueError(f"analysis_frames must be one of {', '.join(ANALYSIS_FRAMES)}")
+        self.preroll_frames = config.get('preroll_frames', 2)
+        self.postroll_frames = config.get('postroll_frames', 0)
+        self.frame_ring = None
+        self.pending_job: Optional[Dict] = None
+        self.postroll_remaining = 0
+        if self.analysis_frames != 'single':
+            needed = self.preroll_frames + 1 + self.postroll_frames
+            size = config.get('frame_buffer_size', needed)
+            if size < needed:
+                raise ValueError(f"frame_buffer_size must hold preroll_frames + 1 + postroll_frames ({needed})")
+            # Grayscale frames cost 75 KB each; JPEGs are only kept for the newest few.
+            # Frames the cascade never decoded are decoded only when a trigger needs them
+            self.frame_ring = FrameRing(size, DETECTION_SIZE, config.get('frame_buffer_jpegs', needed),
+                                        decode=lambda data: decode_grayscale(data, DETECTION_SIZE, self.decode_mode))
+
+        # Legacy file-size detector: works on the JPEG bytes, so none of the pixel stages apply
+        self.filesize_detector = None
+        if self.detector == 'filesize':
+            if self.decode_mode == 'raw' or self.motion_source != 'pixels':
+                raise ValueError("detector filesize needs JPEG frames (decode_mode fast or lanczos, motion_source pixels)")
+            if self.frame_ring is not None or self.cascade is not None:
+                raise ValueError("detector filesize does not support analysis_frames buffers or the cascade")
+            self.filesize_detector = FileSizeDetector(self.filesize_threshold)
+
+        # Capture sources; without JPEG detection frames the analysis JPEG is captured on demand
+        gray_size = DETECTION_SIZE if self.decode_mode == 'raw' else None
+        self.clock: Callable[[], float] = time.time
+        if self.capture_mode == 'file':
+            # Recordings have no second stream to grab an analysis JPEG from
+            if gray_size or self.motion_source != 'pixels':
+                raise ValueError("capture_mode file needs decode_mode fast or lanczos and motion_source pixels")
+            self.snapshot_capture = FileFrameSource(self.snapshot_url, self.file_interval)
+            # Cooldowns and event times follow stream time, however fast the file is read
+            self.clock = self.snapshot_capture.clock
+        else:
+            self.snapshot_capture = SnapshotCapture(self.snapshot_url, gray_size=gray_size)
+        self.gray_size = gray_size
+        self.analysis_capture: Optional[SnapshotCapture] = None
+        self.update_analysis_capture()
+        self.frame_reader: Optional[RTSPFrameReader] = None
+        self.vector_reader: Optional[MotionVectorReader] = None
+
+        # Adaptive polling: burst after motion, back off when idle
+        self.scheduler = None
+        if config.get('adaptive_schedule', False):
+            # A persistent stream makes frames cheap, so burst at the stream rate
+            if self.capture_mode == 'persistent':
+                default_burst = max(1, round(1 / self.stream_fps))
+            else:
+                default_burst = 5
+            self.scheduler = AdaptiveInterval(
+                self.check_interval,
+                burst_interval=config.get('burst_interval', default_burst),
+                burst_duration=config.get('burst_duration', 60),
+                idle_after=config.get('idle_after', 300),
+                idle_interval=config.get('idle_interval', max(60, self.check_interval)),
+                min_interval=config.get('min_interval', 1),
+                max_interval=config.get('max_interval', 300),
+                windows=config.get('interval_schedule')
+            )
+
+    def detect(self, frame: np.ndarray) -> Optional[Detection]:
+        """Score a full detection frame against the background model (which then learns it)
+
+        Returns None while the model is still establishing its baseline. With
+        blob detection a trigger also needs at least one blob within the area
+        limits; without an ROI the blobs replace the motion_pixel_threshold test.
+        """
+        region = self.roi.crop(frame) if self.roi else frame
+        motion = self.background_model.apply(region)
+        if motion is None:
+            return None
+        changed_pixels, avg_change = motion
+        return self.evaluate(self.background_model.mask, changed_pixels, avg_change, region)
+
+    def detect_sample(self, sample: VectorSample) -> Optional[Detection]:
+        """Score what a MotionVectorReader collected since the last check
+
+        Keyframe-only samples go through the background model like any frame;
+        for vector samples avg_change is the mean vector length in source
+        pixels per frame.
+        """
+        if sample.mask is None:
+            if not sample.frames:
+                # No new keyframe since the last check; do not teach the model the same frame twice
+                region = self.roi.crop(sample.frame) if self.roi else sample.frame
+                return self.evaluate(None, 0, 0.0, region)
+            return self.detect(sample.frame)
+        mask = self.roi.crop(sample.mask) if self.roi else sample.mask
+        region = self.roi.crop(sample.frame) if self.roi else sample.frame
+        return self.evaluate(mask, int(np.count_nonzero(mask)), sample.magnitude, region)
+
+    def detect_bytes(self, frame_bytes: bytes) -> Optional[Detection]:
+        """Score a captured JPEG with the file-size detector (no decoding)"""
+        size_change = self.filesize_detector.apply(frame_bytes)
+        if size_change is None:
+            return None
+        self.last_mask = None
+        self.last_blobs = None
+        return Detection(size_change > self.filesize_threshold, size_change, 0.0, None, None)
+
+    def evaluate(self, mask: Optional[np.ndarray], changed_pixels: int, avg_change: float,
+                 region: np.ndarray) -> Detection:
+        """Trigger decision for a (possibly ROI-cropped) motion mask"""
+        scores = None
+        if self.roi:
+            changed_pixels, scores = self.roi.score(mask)
+            triggered = any(count > threshold for _, count, threshold in scores)
+        else:
+            triggered = changed_pixels > self.motion_pixel_threshold
+
+        blobs = None
+        if self.blob_detection:
+            blobs = self.find_blobs(mask)
+            triggered = bool(blobs) and (triggered or not self.roi)
+        self.last_mask = mask
+        self.last_blobs = blobs
+        return Detection(triggered, changed_pixels, avg_change, scores, region, blobs)
+
+    def find_blobs(self, mask: Optional[np.ndarray]) -> List[Blob]:
+        """Blobs of a (possibly ROI-cropped) motion mask, in detection-frame pixels"""
+        if mask is None:
+            return []
+        offset = (0, 0)
+        if self.roi:
+            # Only pixels on region tiles count, like the region scores
+            mask = mask & self.roi.active_pixels
+            y0, _, x0, _ = self.roi.pixel_bounds
+            offset = (x0, y0)
+        return find_blobs(mask, self.blob_min_area, self.blob_max_area,
+                          self.blob_open, self.blob_close, offset)
+
+    def learn(self, frame: np.ndarray):
+        """Update the background model with a frame without evaluating it"""
+        self.background_model.apply(self.roi.crop(frame) if self.roi else frame)
+
+    def motion_box(self) -> Optional[CropBox]:
+        """Box around the last detection's motion as frame fractions, or None without motion
+
+        Uses the union of the blob boxes when blob detection is on: it ignores
+        the noise pixels the cleanup removed.
+        """
+        width, height = DETECTION_SIZE
+        if self.last_blobs:
+            return (min(blob.box[0] for blob in self.last_blobs) / width,
+                    min(blob.box[1] for blob in self.last_blobs) / height,
+                    max(blob.box[2] for blob in self.last_blobs) / width,
+                    max(blob.box[3] for blob in self.last_blobs) / height)
+        offset = (0, 0)
+        if self.roi:
+            y0, _, x0, _ = self.roi.pixel_bounds
+            offset = (x0, y0)
+        return mask_bounding_box(self.last_mask, DETECTION_SIZE, offset)
+
+    def payload_crop_box(self) -> Optional[CropBox]:
+        """Crop box for the AI payload based on the last detection"""
+        width, height = DETECTION_SIZE
+        roi_box = None
+        if self.roi:
+            y0, y1, x0, x1 = self.roi.pixel_bounds
+            roi_box = (x0 / width, y0 / height, x1 / width, y1 / height)
+
+        if self.payload_crop == 'motion':
+            return self.motion_box() or roi_box
+        if self.payload_crop == 'roi':
+            return roi_box
+        return None
+
+    def update_analysis_capture(self):
+        """Capture the analysis JPEG on demand only when detection frames are not JPEGs"""
+        needs_jpeg = self.gray_size or self.motion_source != 'pixels'
+        if not needs_jpeg:
+            self.analysis_capture = None
+        elif self.analysis_capture is None:
+            self.analysis_capture = SnapshotCapture(self.snapshot_url)
+
+    def use_pixels(self):
+        """Fall back to decoded-frame detection (e.g. PyAV is missing for motion_source vectors)"""
+        self.motion_source = 'pixels'
+        self.update_analysis_capture()
+
+    def create_vector_reader(self, log: Optional[Callable[[str], None]] = None) -> MotionVectorReader:
+        """Stream reader for motion_source vectors/keyframes; raises ImportError without PyAV"""
+        return MotionVectorReader(
+            self.snapshot_url,
+            min_magnitude=self.mv_min_magnitude,
+            min_frames=self.mv_min_frames,
+            keyframes_only=self.motion_source == 'keyframes',
+            stall_timeout=self.max_frame_age,
+            log=log
+        )
+
+    def start(self, log: Optional[Callable[[str], None]] = None):
+        """Start the persistent stream or motion-vector reader if this camera uses one"""
+        if self.motion_source != 'pixels':
+            if self.vector_reader is None:
+                prefix = self.log_prefix
+                self.vector_reader = self.create_vector_reader(
+                    (lambda message: log(f"{prefix}{message}")) if log else None)
+                self.vector_reader.start()
+            return
+        if self.capture_mode == 'persistent' and self.frame_reader is None:
+            prefix = self.log_prefix
+            self.frame_reader = RTSPFrameReader(
+                self.snapshot_url,
+                fps=self.stream_fps,
+                gray_size=self.gray_size,
+                stall_timeout=self.max_frame_age,
+                log=(lambda message: log(f"{prefix}{message}")) if log else None
+            )
+            self.frame_reader.start()
+
+    def stop(self):
+        """Stop the persistent stream or motion-vector reader"""
+        if self.vector_reader:
+            self.vector_reader.stop()
+            self.vector_reader = None
+        if self.capture_mode == 'file':
+            self.snapshot_capture.close()
+        if self.frame_reader:
+            self.frame_reader.stop()
+            self.frame_reader = None
@@ -0,0 +1,448 @@
+"""
+Frame capture from RTSP cameras
+One-shot and persistent ffmpeg captures that read frames straight from stdout
+
+Frames are JPEG bytes by default. With gray_size=(width, height) ffmpeg scales and
+converts the frame itself and emits raw 8-bit grayscale, so Python does no decoding.
+FileFrameSource plays a recording (or a directory of snapshots) back one frame per
+capture, for headless runs without a camera.
+"""
+
+import os
+import select
+import subprocess
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+# capture_mode values: one ffmpeg run per check, a long-lived stream, or a recording
+CAPTURE_MODES = ('snapshot', 'persistent', 'file')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+JPEG_SOI = b'\xff\xd8'
+JPEG_EOI = b'\xff\xd9'
+
+# Initial size of the reusable frame buffers (grown if a frame does not fit)
+BUFFER_SIZE = 1 << 20
+
+
+def _output_args(gray_size: Optional[Tuple[int, int]], quality: int) -> List[str]:
+    """ffmpeg output options for JPEG or scaled grayscale rawvideo frames"""
+    if gray_size:
+        width, height = gray_size
+        return ['-vf', f'scale={width}:{height}:flags=area,format=gray',
+                '-f', 'rawvideo', '-pix_fmt', 'gray']
+    return ['-f', 'image2pipe', '-vcodec', 'mjpeg', '-q:v', str(quality)]
+
+
+def _grow(buffer: bytearray, view: memoryview) -> memoryview:
+    """Double a bytearray in place and return a fresh view over it"""
+    view.release()
+    buffer.extend(bytes(len(buffer)))
+    return memoryview(buffer)
+
+
+def split_jpegs(buffer: bytearray, filled: int) -> Tuple[List[Tuple[int, int]], int]:
+    """Find the complete JPEGs in buffer[:filled] of an image2pipe stream
+
+    Returns their (start, end) spans in order and how many leading bytes are
+    used up. A frame (or a marker) cut off at the end is left unconsumed so the
+    next read can complete it.
+    """
+    spans = []
+    consumed = 0
+    while True:
+        start = buffer.find(JPEG_SOI, consumed, filled)
+        if start < 0:
+            # Keep a trailing 0xFF that may be the first half of a marker
+            if filled > consumed:
+                consumed = filled - 1 if buffer[filled - 1] == 0xFF else filled
+            return spans, consumed
+        end = buffer.find(JPEG_EOI, start + 2, filled)
+        if end < 0:
+            return spans, start
+        spans.append((start, end + 2))
+        consumed = end + 2
+
+
+class SnapshotCapture:
+    """One-shot capture: start ffmpeg, read a single frame from its stdout
+
+    The frame is read into a buffer that is reused between checks, so nothing
+    touches the filesystem.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0, quality: int = 2,
+                 gray_size: Optional[Tuple[int, int]] = None):
+        self.url = url
+        self.timeout = timeout
+        self.quality = quality
+        self.gray_size = gray_size
+        self._buffer = bytearray(BUFFER_SIZE)
+
+    def build_command(self) -> List[str]:
+        """ffmpeg command that writes one frame to stdout"""
+        return [
+            'ffmpeg',
+            '-nostdin',
+            '-loglevel', 'error',
+            '-rtsp_transport', 'tcp',
+            '-i', self.url,
+            '-an',
+            '-frames:v', '1',
+            *_output_args(self.gray_size, self.quality),
+            'pipe:1'
+        ]
+
+    def capture(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Capture one frame; raises subprocess.TimeoutExpired if ffmpeg takes too long"""
+        command = self.build_command()
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        deadline = time.time() + timeout
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        buffer = self._buffer
+        view = memoryview(buffer)
+        filled = 0
+        try:
+            fd = process.stdout.fileno()
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                ready, _, _ = select.select([fd], [], [], remaining)
+                if not ready:
+                    continue
+                if filled == len(buffer):
+                    view = _grow(buffer, view)
+                read = process.stdout.readinto(view[filled:])
+                if not read:
+                    break
+                filled += read
+
+            process.wait(timeout=max(deadline - time.time(), 0.1))
+            if process.returncode != 0 or filled == 0:
+                return None
+            return bytes(view[:filled])
+        finally:
+            view.release()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+
+class RTSPFrameReader:
+    """Long-lived RTSP reader that streams frames from ffmpeg into a latest-frame slot
+
+    A background thread keeps one ffmpeg process open for the camera and splits the
+    MJPEG (or fixed-size gray rawvideo) stream it writes to stdout. Only the newest
+    frame is kept. If the stream drops or stalls, ffmpeg is restarted with
+    exponential backoff.
+
+    The reader thread owns the ffmpeg process: it spawns, closes and reaps it.
+    stop() only terminates it (under _process_lock), which ends the read with EOF.
+    """
+
+    def __init__(self, url: str, fps: float = 2.0, quality: int = 2,
+                 gray_size: Optional[Tuple[int, int]] = None,
+                 stall_timeout: float = 10.0, reconnect_delay: float = 2.0,
+                 max_reconnect_delay: float = 60.0,
+                 log: Optional[Callable[[str], None]] = None):
+        self.url = url
+        self.fps = fps
+        self.quality = quality
+        self.gray_size = gray_size
+        self.stall_timeout = stall_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.log = log or (lambda message: None)
+
+        self.frames_received = 0
+        self.reconnects = 0
+
+        self._lock = threading.Lock()
+        self._frame: Optional[bytes] = None
+        self._frame_time = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._process_lock = threading.Lock()
+        # Parse buffer reused across reads and reconnects
+        self._buffer = bytearray(BUFFER_SIZE)
+
+    def build_command(self) -> List[str]:
+        """ffmpeg command that writes a continuous frame stream to stdout"""
+        output = _output_args(self.gray_size, self.quality)
+        if self.gray_size:
+            # Merge the frame-rate limit into the scale/format filter chain
+            output[1] = f'fps={self.fps},{output[1]}'
+        else:
+            output = ['-vf', f'fps={self.fps}'] + output
+        return [
+            'ffmpeg',
+            '-nostdin',
+            '-loglevel', 'error',
+            '-rtsp_transport', 'tcp',
+            '-i', self.url,
+            '-an',
+            *output,
+            'pipe:1'
+        ]
+
+    def start(self):
+        """Start the background reader thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rtsp-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the reader thread and the ffmpeg process"""
+        self._stop.set()
+        with self._process_lock:
+            if self._process is not None and self._process.poll() is None:
+                self._process.terminate()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def latest(self) -> Tuple[Optional[bytes], float]:
+        """Return the most recent frame and the time it was received"""
+        with self._lock:
+            return self._frame, self._frame_time
+
+    def latest_fresh(self, max_age: float) -> Optional[bytes]:
+        """Return the most recent frame if it is younger than max_age seconds"""
+        frame, frame_time = self.latest()
+        if frame is None or time.time() - frame_time > max_age:
+            return None
+        return frame
+
+    def _run(self):
+        """Reader loop: spawn ffmpeg, consume frames, reconnect on failure"""
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            received_before = self.frames_received
+            process = None
+            try:
+                with self._process_lock:
+                    # Checked under the lock so stop() cannot miss a process started now
+                    if self._stop.is_set():
+                        break
+                    process = self._process = subprocess.Popen(
+                        self.build_command(),
+                        stdin=subprocess.DEVNULL,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.DEVNULL,
+                        bufsize=0
+                    )
+                self._read_stream(process)
+            except Exception as e:
+                self.log(f"RTSP reader error: {e}")
+            finally:
+                if process is not None:
+                    self._reap_process(process)
+
+            if self._stop.is_set():
+                break
+
+            # Reset the backoff once a session has delivered frames
+            if self.frames_received > received_before:
+                delay = self.reconnect_delay
+
+            self.reconnects += 1
+            self.log(f"RTSP stream dropped, reconnecting in {delay:g}s")
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _read_stream(self, process: subprocess.Popen):
+        """Split the byte stream into frames until EOF or stall"""
+        view = memoryview(self._buffer)
+        try:
+            view = self._consume(process.stdout, view)
+        finally:
+            view.release()
+
+    def _consume(self, stdout, view: memoryview) -> memoryview:
+        """Read into the reusable buffer and publish each complete frame"""
+        buffer = self._buffer
+        raw_size = self.gray_size[0] * self.gray_size[1] if self.gray_size else 0
+        fd = stdout.fileno()
+        filled = 0
+        last_data = time.time()
+
+        while not self._stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                if time.time() - last_data > self.stall_timeout:
+                    self.log(f"RTSP stream stalled for {self.stall_timeout:.0f}s")
+                    break
+                continue
+
+            if filled == len(buffer):
+                # A single frame is larger than the buffer
+                view = _grow(buffer, view)
+            read = stdout.readinto(view[filled:])
+            if not read:
+                break
+            last_data = time.time()
+            filled += read
+
+            # Keep only the newest complete frame from this read
+            frame = None
+            consumed = 0
+            if raw_size:
+                complete = filled - filled % raw_size
+                if complete:
+                    frame = bytes(view[complete - raw_size:complete])
+                    consumed = complete
+            else:
+                spans, consumed = split_jpegs(buffer, filled)
+                if spans:
+                    start, end = spans[-1]
+                    frame = bytes(view[start:end])
+
+            if consumed:
+                remaining = filled - consumed
+                view[:remaining] = view[consumed:filled]
+                filled = remaining
+
+            if frame is not None:
+                with self._lock:
+                    self._frame = frame
+                    self._frame_time = last_data
+                self.frames_received += 1
+
+        return view
+
+    def _reap_process(self, process: subprocess.Popen):
+        """Kill (if still running), wait for and close an ffmpeg process; reader thread only"""
+        with self._process_lock:
+            if self._process is process:
+                self._process = None
+        try:
+            if process.poll() is None:
+                process.kill()
+            process.wait(timeout=5)
+        except Exception:
+            pass
+        finally:
+            if process.stdout:
+                process.stdout.close()
+
+
+class FileFrameSource:
+    """Frames of a video file or snapshot directory, one per capture() call
+
+    Videos are sampled every `interval` seconds of stream time by a single
+    ffmpeg process; directories are read in file name order. capture() returns
+    None once the source is exhausted. `position` is the stream time of the
+    last frame returned, so replays can run on stream time instead of the wall
+    clock.
+    """
+
+    def __init__(self, path: str, interval: float = 1.0, quality: int = 2,
+                 gray_size: Optional[Tuple[int, int]] = None):
+        self.path = path
+        self.interval = interval
+        self.quality = quality
+        self.gray_size = gray_size
+        self.frames_read = 0
+        self.exhausted = False
+        self.started = time.time()
+        self._files: Optional[List[str]] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._pending = bytearray()
+
+    @property
+    def position(self) -> float:
+        return max(0, self.frames_read - 1) * self.interval
+
+    def clock(self) -> float:
+        """Wall-clock time at which the last frame would have been live"""
+        return self.started + self.position
+
+    def build_command(self) -> List[str]:
+        """ffmpeg command that writes one frame per interval of the file to stdout"""
+        output = _output_args(self.gray_size, self.quality)
+        if self.gray_size:
+            output[1] = f'fps=1/{self.interval:g},{output[1]}'
+        else:
+            output = ['-vf', f'fps=1/{self.interval:g}'] + output
+        return ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', self.path, '-an', *output, 'pipe:1']
+
+    def capture(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Next frame, or None at the end of the source"""
+        if self.exhausted:
+            return None
+        try:
+            if os.path.isdir(self.path):
+                frame = self._next_file()
+            else:
+                frame = self._next_frame()
+        except OSError:
+            # Missing file or ffmpeg: a recording does not come back, so the source ends here
+            self.exhausted = True
+            self.close()
+            raise
+        if frame is None:
+            self.exhausted = True
+            self.close()
+        else:
+            self.frames_read += 1
+        return frame
+
+    def _next_file(self) -> Optional[bytes]:
+        if self._files is None:
+            self._files = sorted(name for name in os.listdir(self.path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+        if self.frames_read >= len(self._files):
+            return None
+        with open(os.path.join(self.path, self._files[self.frames_read]), 'rb') as f:
+            data = f.read()
+        if self.gray_size:
+            from .decode import decode_grayscale
+            return decode_grayscale(data, self.gray_size).tobytes()
+        return data
+
+    def _next_frame(self) -> Optional[bytes]:
+        if self._process is None:
+            self._process = subprocess.Popen(self.build_command(), stdin=subprocess.DEVNULL,
+                                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        pending = self._pending
+        raw_size = self.gray_size[0] * self.gray_size[1] if self.gray_size else 0
+        while True:
+            if raw_size:
+                if len(pending) >= raw_size:
+                    frame = bytes(pending[:raw_size])
+                    del pending[:raw_size]
+                    return frame
+            else:
+                start = pending.find(JPEG_SOI)
+                end = pending.find(JPEG_EOI, start + 2) if start >= 0 else -1
+                if end >= 0:
+                    frame = bytes(pending[start:end + 2])
+                    del pending[:end + 2]
+                    return frame
+            chunk = self._process.stdout.read1(BUFFER_SIZE)
+            if not chunk:
+                return None
+            pending += chunk
+
+    def close(self):
+        """Stop ffmpeg if it is still running"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
@@ -0,0 +1,98 @@
+"""
+Coarse-to-fine detection cascade
+A tiny thumbnail is compared first; the full-resolution path only runs when it shows change
+"""
+
+from io import BytesIO
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .decode import DETECTION_SIZE, gray_from_raw
+from .diff import FrameDiffer
+
+# Coarse level: 1/4 of the detection frame on each side
+COARSE_SIZE = (80, 60)
+COARSE_FACTOR = DETECTION_SIZE[0] // COARSE_SIZE[0]
+
+# Outcomes of CoarseGate.check(), also used as counter names
+CASCADE_DECISIONS = ('quiet', 'passed', 'refresh')
+
+
+def coarse_grayscale(image_bytes: bytes, mode: str = 'fast') -> np.ndarray:
+    """Decode a frame straight to the COARSE_SIZE thumbnail
+
+    JPEGs are decoded at the smallest DCT scale (1/8) that still covers the
+    thumbnail; raw frames are block-averaged.
+    """
+    if mode == 'raw':
+        frame = gray_from_raw(image_bytes, DETECTION_SIZE)
+        width, height = COARSE_SIZE
+        blocks = frame.reshape(height, COARSE_FACTOR, width, COARSE_FACTOR)
+        return blocks.mean(axis=(1, 3), dtype=np.float32).astype(np.uint8)
+
+    from PIL import Image
+    img = Image.open(BytesIO(image_bytes))
+    img.draft('L', COARSE_SIZE)
+    if img.mode != 'L':
+        img = img.convert('L')
+    if img.size != COARSE_SIZE:
+        img = img.resize(COARSE_SIZE, Image.Resampling.BOX)
+    return np.asarray(img)
+
+
+class CoarseGate:
+    """First cascade level: decides whether a tick needs the full-resolution path
+
+    Each thumbnail is compared with the previous one. Averaging 4x4 blocks
+    dilutes small changes, so both thresholds should be conservative (lower
+    than the full-resolution ones): a false "passed" only costs a full check,
+    a false "quiet" misses motion. Every refresh_every-th quiet tick returns
+    "refresh": the caller should let the full-resolution background model learn
+    that frame (without evaluating it), so it never falls far behind slow
+    lighting changes.
+    """
+
+    def __init__(self, threshold: int = 15, min_changed: int = 8, refresh_every: int = 10,
+                 bounds: Optional[Tuple[int, int, int, int]] = None):
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.refresh_every = refresh_every
+        self.bounds = bounds
+        self.differ = FrameDiffer(threshold)
+        self.last_changed = 0
+        self._previous: Optional[np.ndarray] = None
+        self._quiet_run = 0
+
+    @classmethod
+    def for_detection_bounds(cls, pixel_bounds: Optional[Tuple[int, int, int, int]], **kwargs) -> 'CoarseGate':
+        """Gate limited to (y0, y1, x0, x1) detection-frame bounds, e.g. an ROI's pixel_bounds"""
+        bounds = None
+        if pixel_bounds is not None:
+            y0, y1, x0, x1 = pixel_bounds
+            bounds = (y0 // COARSE_FACTOR, -(-y1 // COARSE_FACTOR), x0 // COARSE_FACTOR, -(-x1 // COARSE_FACTOR))
+        return cls(bounds=bounds, **kwargs)
+
+    def check(self, coarse: np.ndarray) -> str:
+        """'quiet' (skip the full path), 'passed' (coarse change) or 'refresh' (periodic full check)"""
+        if self.bounds is not None:
+            y0, y1, x0, x1 = self.bounds
+            coarse = coarse[y0:y1, x0:x1]
+
+        previous = self._previous
+        if previous is None or previous.shape != coarse.shape:
+            self._previous = coarse.copy()
+            self._quiet_run = 0
+            return 'passed'
+
+        self.last_changed, _ = self.differ.compare(coarse, previous)
+        np.copyto(previous, coarse)
+        if self.last_changed >= self.min_changed:
+            self._quiet_run = 0
+            return 'passed'
+
+        self._quiet_run += 1
+        if self.refresh_every and self._quiet_run >= self.refresh_every:
+            self._quiet_run = 0
+            return 'refresh'
+        return 'quiet'
@@ -0,0 +1,435 @@
+"""
+Local pre-classifier
+A small CPU-only HOG + linear (softmax) model that scores the motion crop before the vision API sees it
+
+    cd deployment
+    python -m motion_core.classifier train --events /config/camera_detection/events -o preclassifier.npz
+    python -m motion_core.classifier train --replay driveway.mp4 --labels driveway.csv --interval 2 -o preclassifier.npz
+    python -m motion_core.classifier eval --model preclassifier.npz --replay evening.mp4 --labels evening.csv
+
+Frames are scored the way the event store keeps them: downscaled to a
+160 px thumbnail and JPEG-encoded (`as_thumbnail`), so live frames, stored
+thumbnails and replayed footage all give the same features. The crop is the
+motion box the trigger was judged on (stored with each event). It becomes a
+fixed-size grayscale patch, a histogram of oriented gradients (HOG) over it
+plus two shape features (aspect ratio and share of the frame). A multinomial logistic regression turns those into probabilities
+for nothing/person/vehicle/animal. The frame goes to the API when the object
+probability (1 - p(nothing)) reaches the threshold, so the threshold trades API
+calls against missed objects; `eval` prints that trade-off per threshold.
+
+Training data comes from the event store (the API's answers to past triggers
+are the labels, so the model learns to predict when the API will find
+nothing) and/or from recorded footage with a CSV of labelled time spans:
+
+    start,end,label
+    12.0,19.5,person
+    40,52,vehicle
+
+Frames that trigger outside every span are labelled nothing. Pure NumPy and
+Pillow; no extra dependencies.
+"""
+
+import argparse
+import csv
+import json
+import sys
+from io import BytesIO
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .decode import DETECTION_SIZE
+from .eventstore import encode_thumbnail
+from .payload import CropBox, expand_box
+
+CLASSES = ('nothing', 'person', 'vehicle', 'animal')
+PATCH_SIZE = 64
+HOG_CELL = 8
+HOG_BINS = 9
+GATE_THRESHOLDS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+# Frames are classified as event-store thumbnails (its default width and quality)
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_QUALITY = 70
+
+
+def hog_features(patch: np.ndarray, cell: int = HOG_CELL, bins: int = HOG_BINS) -> np.ndarray:
+    """Histogram of oriented gradients of a square grayscale patch
+
+    Unsigned orientations, linear interpolation between neighbouring bins,
+    2x2-cell blocks with L2-Hys normalisation (Dalal & Triggs). The cells are
+    summed with one np.bincount, so a 64x64 patch costs well under a millisecond.
+    """
+    image = patch.astype(np.float32)
+    gx = np.zeros_like(image)
+    gy = np.zeros_like(image)
+    gx[:, 1:-1] = image[:, 2:] - image[:, :-2]
+    gy[1:-1, :] = image[2:, :] - image[:-2, :]
+    magnitude = np.hypot(gx, gy)
+    position = (np.degrees(np.arctan2(gy, gx)) % 180.0) / (180.0 / bins) - 0.5
+    lower = np.floor(position)
+    upper_weight = position - lower
+    lower = lower.astype(np.intp) % bins
+    upper = (lower + 1) % bins
+
+    cells_y, cells_x = image.shape[0] // cell, image.shape[1] // cell
+    rows = np.minimum(np.arange(image.shape[0]) // cell, cells_y - 1)
+    cols = np.minimum(np.arange(image.shape[1]) // cell, cells_x - 1)
+    cell_index = (rows[:, None] * cells_x + cols[None, :]) * bins
+    histogram = np.bincount((cell_index + lower).ravel(), (magnitude * (1 - upper_weight)).ravel(),
+                            minlength=cells_y * cells_x * bins)
+    histogram += np.bincount((cell_index + upper).ravel(), (magnitude * upper_weight).ravel(),
+                             minlength=cells_y * cells_x * bins)
+    histogram = histogram.reshape(cells_y, cells_x, bins)
+
+    blocks = np.concatenate([histogram[:-1, :-1], histogram[:-1, 1:],
+                             histogram[1:, :-1], histogram[1:, 1:]], axis=2)
+    blocks /= np.sqrt((blocks ** 2).sum(axis=2, keepdims=True) + 1e-6)
+    np.minimum(blocks, 0.2, out=blocks)
+    blocks /= np.sqrt((blocks ** 2).sum(axis=2, keepdims=True) + 1e-6)
+    return blocks.ravel().astype(np.float32)
+
+
+def as_thumbnail(frame: np.ndarray, width: int = THUMBNAIL_WIDTH, quality: int = THUMBNAIL_QUALITY) -> np.ndarray:
+    """A detection frame as the event store thumbnails it: downscaled, JPEG round-tripped, grayscale"""
+    return np.asarray(Image.open(BytesIO(encode_thumbnail(frame, width, quality))).convert('L'))
+
+
+def crop_patch(frame: np.ndarray, box: Optional[CropBox], margin: float = 0.15,
+               size: int = PATCH_SIZE) -> np.ndarray:
+    """Grayscale crop of box (frame fractions, plus margin) resized to size x size"""
+    height, width = frame.shape[:2]
+    left, top, right, bottom = expand_box(box, margin) if box else (0.0, 0.0, 1.0, 1.0)
+    x0, y0 = int(left * width), int(top * height)
+    x1, y1 = max(x0 + 1, int(np.ceil(right * width))), max(y0 + 1, int(np.ceil(bottom * height)))
+    crop = Image.fromarray(np.ascontiguousarray(frame[y0:y1, x0:x1]))
+    if crop.mode != 'L':
+        crop = crop.convert('L')
+    return np.asarray(crop.resize((size, size), Image.Resampling.BILINEAR))
+
+
+def crop_features(frame: np.ndarray, box: Optional[CropBox], margin: float = 0.15,
+                  size: int = PATCH_SIZE) -> np.ndarray:
+    """Feature vector of one motion crop: HOG of the patch, log aspect ratio and area share"""
+    left, top, right, bottom = box or (0.0, 0.0, 1.0, 1.0)
+    box_width = max(right - left, 1e-3)
+    box_height = max(bottom - top, 1e-3)
+    height, width = frame.shape[:2]
+    shape = np.array([np.log(box_width * width / (box_height * height)), box_width * box_height],
+                     dtype=np.float32)
+    return np.concatenate([hog_features(crop_patch(frame, box, margin, size)), shape])
+
+
+class LinearModel:
+    """Multinomial logistic regression on standardised features, stored as one .npz file"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, mean: np.ndarray, scale: np.ndarray,
+                 classes: Tuple[str, ...] = CLASSES, patch_size: int = PATCH_SIZE, margin: float = 0.15,
+                 thumbnail_width: int = THUMBNAIL_WIDTH, thumbnail_quality: int = THUMBNAIL_QUALITY):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        self.classes = tuple(classes)
+        self.patch_size = patch_size
+        self.margin = margin
+        # The thumbnail the training frames were scored as; live frames are converted the same way
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_quality = thumbnail_quality
+
+    def probabilities(self, features: np.ndarray) -> np.ndarray:
+        """(N, classes) class probabilities for (N, features) rows"""
+        logits = ((features - self.mean) / self.scale) @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            np.savez(f, weights=self.weights, bias=self.bias, mean=self.mean, scale=self.scale,
+                     classes=np.array(self.classes), patch_size=self.patch_size, margin=self.margin,
+                     thumbnail_width=self.thumbnail_width, thumbnail_quality=self.thumbnail_quality)
+
+    @classmethod
+    def load(cls, path: str) -> 'LinearModel':
+        """Load a saved model; raises OSError if unreadable and ValueError if it is not a model"""
+        try:
+            archive = np.load(path, allow_pickle=False)
+        except ValueError:
+            raise ValueError(f"{path} is not a pre-classifier model")
+        with archive as data:
+            try:
+                # Models saved before the thumbnail settings were stored used the defaults
+                thumbnail = [int(data[key]) if key in data.files else default for key, default in
+                             (('thumbnail_width', THUMBNAIL_WIDTH), ('thumbnail_quality', THUMBNAIL_QUALITY))]
+                model = cls(data['weights'], data['bias'], data['mean'], data['scale'],
+                            tuple(str(name) for name in data['classes']),
+                            int(data['patch_size']), float(data['margin']), *thumbnail)
+            except KeyError as e:
+                raise ValueError(f"{path} is not a pre-classifier model (missing {e})")
+        if 'nothing' not in model.classes:
+            raise ValueError(f"{path} has no 'nothing' class")
+        expected = len(hog_features(np.zeros((model.patch_size, model.patch_size), np.uint8))) + 2
+        if model.weights.shape != (expected, len(model.classes)):
+            raise ValueError(f"{path} was trained for different features")
+        return model
+
+
+def train(features: np.ndarray, labels: np.ndarray, classes: Tuple[str, ...] = CLASSES,
+          l2: float = 1e-2, epochs: int = 300, learning_rate: float = 0.5,
+          patch_size: int = PATCH_SIZE, margin: float = 0.15,
+          thumbnail_width: int = THUMBNAIL_WIDTH) -> LinearModel:
+    """Fit a LinearModel by full-batch gradient descent on class-balanced cross-entropy
+
+    labels are indices into classes. Each class carries the same total weight,
+    so a few vehicles are not drowned out by hundreds of empty triggers.
+    """
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0) + 1e-6
+    x = (features - mean) / scale
+    count, dims = x.shape
+    onehot = np.zeros((count, len(classes)), dtype=np.float32)
+    onehot[np.arange(count), labels] = 1
+    present = onehot.sum(axis=0)
+    sample_weight = (onehot / np.maximum(present, 1)).sum(axis=1) / np.count_nonzero(present)
+
+    weights = np.zeros((dims, len(classes)), dtype=np.float32)
+    bias = np.zeros(len(classes), dtype=np.float32)
+    # Classes without examples keep a large negative bias instead of a uniform share
+    bias[present == 0] = -10.0
+    trained = present > 0
+    for _ in range(epochs):
+        logits = x @ weights + bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        error = (exp / exp.sum(axis=1, keepdims=True) - onehot) * sample_weight[:, None]
+        weights -= learning_rate * (x.T @ error + l2 * weights)
+        bias[trained] -= learning_rate * error.sum(axis=0)[trained]
+    return LinearModel(weights, bias, mean, scale, classes, patch_size, margin, thumbnail_width)
+
+
+class PreClassifier:
+    """Runtime gate: scores a motion crop and decides whether it is worth an API call"""
+
+    def __init__(self, model_path: str, threshold: float = 0.3):
+        self.model = LinearModel.load(model_path)
+        self.model_path = model_path
+        self.threshold = threshold
+        self._nothing = self.model.classes.index('nothing')
+
+    def classify(self, frame: np.ndarray, box: Optional[CropBox]) -> Tuple[str, float]:
+        """Most likely class of the crop and its object probability (1 - p(nothing))
+
+        frame is the full detection frame; it is scored as the thumbnail the model was trained on.
+        """
+        model = self.model
+        thumbnail = as_thumbnail(frame, model.thumbnail_width, model.thumbnail_quality)
+        features = crop_features(thumbnail, box, model.margin, model.patch_size)
+        probabilities = self.model.probabilities(features[None, :])[0]
+        return self.model.classes[int(probabilities.argmax())], float(1.0 - probabilities[self._nothing])
+
+
+# Training data
+
+def label_index(label: str) -> Optional[int]:
+    return CLASSES.index(label) if label in CLASSES else None
+
+
+def events_dataset(path: str, camera: Optional[str] = None, limit: int = 100000, margin: float = 0.15,
+                   thumbnail_width: int = THUMBNAIL_WIDTH) -> Tuple[np.ndarray, np.ndarray]:
+    """Features and labels from analysed events in an event store
+
+    The label is the type of the most confident detection, or nothing when the
+    API found nothing. The crop is the motion box stored with the event (frame
+    fractions, so it applies to the thumbnail unchanged); events from before
+    it was stored fall back to their blob boxes. Events without a crop, without
+    a thumbnail or with a thumbnail of another width are skipped.
+    """
+    from .eventstore import EventReader
+
+    store = EventReader(path)
+    width, height = DETECTION_SIZE
+    features, labels = [], []
+    for status in ('analyzed', 'cached'):
+        for event in store.events(camera=camera, status=status, limit=limit):
+            box = tuple(event['crop']) if event['crop'] else None
+            if box is None and event['blobs']:
+                boxes = np.asarray(event['blobs'], dtype=np.float32)
+                box = (float(boxes[:, 0].min()) / width, float(boxes[:, 1].min()) / height,
+                       float(boxes[:, 2].max()) / width, float(boxes[:, 3].max()) / height)
+            if box is None or event['thumb_segment'] is None:
+                continue
+            detections = sorted(event['detections'], key=lambda d: d.get('confidence') or 0, reverse=True)
+            label = label_index(detections[0]['type']) if detections else 0
+            data = store.thumbnail(event['id'])
+            if label is None or data is None:
+                continue
+            frame = np.asarray(Image.open(BytesIO(data)).convert('L'))
+            if frame.shape[1] != thumbnail_width:
+                continue
+            features.append(crop_features(frame, box, margin))
+            labels.append(label)
+    return _stack(features, labels)
+
+
+def load_spans(path: str) -> List[Tuple[float, float, int]]:
+    """(start, end, class index) rows of a start,end,label CSV"""
+    spans = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            label = label_index(row['label'].strip())
+            if label is None:
+                raise ValueError(f"{path}: unknown label '{row['label']}' (use {', '.join(CLASSES)})")
+            spans.append((float(row['start']), float(row['end']), label))
+    return spans
+
+
+def replay_dataset(source: str, spans: List[Tuple[float, float, int]], settings: Optional[Dict] = None,
+                   interval: float = 1.0, margin: float = 0.15,
+                   thumbnail_width: int = THUMBNAIL_WIDTH) -> Tuple[np.ndarray, np.ndarray]:
+    """Features and labels for every frame of a recording that the detection settings trigger on
+
+    Uses the replay loader and the same Camera detection and thumbnailing as
+    the app, so the crops match what the pre-classifier will see live.
+    """
+    from .camera import Camera, camera_configs
+    from .replay import load_frames
+
+    config = {'snapshot_url': 'replay://', 'cooldown_seconds': 0}
+    config.update(settings or {})
+    camera = Camera(camera_configs(config)[0])
+    frames, timestamps = load_frames(source, interval)
+    features, labels = [], []
+    for frame, timestamp in zip(frames, timestamps):
+        detection = camera.detect(frame)
+        if detection is None or not detection.triggered:
+            continue
+        label = next((index for start, end, index in spans if start <= timestamp < end), 0)
+        features.append(crop_features(as_thumbnail(frame, thumbnail_width), camera.motion_box(), margin))
+        labels.append(label)
+    return _stack(features, labels)
+
+
+def _stack(features: List[np.ndarray], labels: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+    if not features:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.intp)
+    return np.stack(features), np.asarray(labels, dtype=np.intp)
+
+
+# Evaluation
+
+def evaluate(model: LinearModel, features: np.ndarray, labels: np.ndarray,
+             thresholds: Iterable[float] = GATE_THRESHOLDS) -> Dict:
+    """Confusion matrix, accuracy and the API-call trade-off at each gate threshold"""
+    probabilities = model.probabilities(features)
+    predicted = probabilities.argmax(axis=1)
+    size = len(model.classes)
+    confusion = np.bincount(labels * size + predicted, minlength=size * size).reshape(size, size)
+
+    nothing = model.classes.index('nothing')
+    object_probability = 1.0 - probabilities[:, nothing]
+    objects = labels != nothing
+    gate = []
+    for threshold in thresholds:
+        sent = object_probability >= threshold
+        gate.append({
+            "threshold": threshold,
+            "api_calls": float(sent.mean()) if len(sent) else 0.0,
+            "objects_kept": float(sent[objects].mean()) if objects.any() else 1.0,
+            "empty_filtered": float((~sent[~objects]).mean()) if (~objects).any() else 0.0,
+        })
+    return {
+        "samples": int(len(labels)),
+        "accuracy": float((predicted == labels).mean()) if len(labels) else 0.0,
+        "classes": list(model.classes),
+        "confusion": confusion.tolist(),
+        "gate": gate
+    }
+
+
+def print_report(report: Dict, out: Callable[[str], None] = print):
+    classes = report['classes']
+    out(f"{report['samples']} samples, accuracy {report['accuracy']:.1%}")
+    out("confusion (rows: label, columns: predicted)")
+    out(" " * 10 + "".join(f"{name:>9}" for name in classes))
+    for name, row in zip(classes, report['confusion']):
+        out(f"{name:>10}" + "".join(f"{count:>9}" for count in row))
+    out("threshold  api calls  objects kept  empty filtered")
+    for row in report['gate']:
+        out(f"{row['threshold']:>9.2f}  {row['api_calls']:>9.1%}  {row['objects_kept']:>12.1%}  "
+            f"{row['empty_filtered']:>14.1%}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Train or evaluate the local pre-classifier")
+    parser.add_argument('command', choices=('train', 'eval'))
+    parser.add_argument('--events', action='append', default=[], help="event store directory (repeatable)")
+    parser.add_argument('--camera', help="only events from this camera")
+    parser.add_argument('--replay', action='append', default=[], help="video file or frame directory (repeatable)")
+    parser.add_argument('--labels', action='append', default=[],
+                        help="start,end,label CSV for the --replay source at the same position")
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds between replayed frames")
+    parser.add_argument('--settings', default='{}', help="JSON dict of detection settings for --replay")
+    parser.add_argument('--thumbnail-width', type=int, default=THUMBNAIL_WIDTH,
+                        help="thumbnail width to train on; must match event_store_thumbnail_width (train)")
+    parser.add_argument('--model', help="model to evaluate (eval)")
+    parser.add_argument('-o', '--output', default='preclassifier.npz', help="where to save the model (train)")
+    parser.add_argument('--holdout', type=float, default=0.25, help="share of samples held out for evaluation (train)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the evaluation report to this file")
+    args = parser.parse_args(argv)
+
+    if len(args.labels) != len(args.replay):
+        parser.error("give one --labels CSV per --replay source")
+    if args.command == 'eval' and not args.model:
+        parser.error("eval needs --model")
+
+    model = None
+    width = args.thumbnail_width
+    if args.command == 'eval':
+        try:
+            model = LinearModel.load(args.model)
+        except (OSError, ValueError) as e:
+            sys.exit(f"cannot load {args.model}: {e}")
+        width = model.thumbnail_width
+
+    sets = [events_dataset(path, args.camera, thumbnail_width=width) for path in args.events]
+    settings = json.loads(args.settings)
+    for source, labels in zip(args.replay, args.labels):
+        sets.append(replay_dataset(source, load_spans(labels), settings, args.interval, thumbnail_width=width))
+    sets = [(x, y) for x, y in sets if len(y)]
+    if not sets:
+        sys.exit("no labelled samples (give --events and/or --replay with --labels)")
+    features = np.concatenate([x for x, _ in sets])
+    labels = np.concatenate([y for _, y in sets])
+    counts = ', '.join(f"{name} {int((labels == index).sum())}" for index, name in enumerate(CLASSES))
+    print(f"{len(labels)} samples: {counts}")
+
+    if args.command == 'train':
+        order = np.random.default_rng(args.seed).permutation(len(labels))
+        held = int(len(labels) * args.holdout)
+        test, fit = order[:held], order[held:]
+        model = train(features[fit], labels[fit], thumbnail_width=width)
+        if held:
+            print(f"held-out evaluation ({held} samples):")
+            report = evaluate(model, features[test], labels[test])
+        else:
+            print("training-set evaluation (no holdout):")
+            report = evaluate(model, features, labels)
+        print_report(report)
+        # The saved model is refit on every sample
+        if held:
+            model = train(features, labels, thumbnail_width=width)
+        model.save(args.output)
+        print(f"saved {args.output}")
+    else:
+        report = evaluate(model, features, labels)
+        print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
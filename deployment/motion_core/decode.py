@@ -0,0 +1,50 @@
+"""
+Frame decoding for motion detection
+Turns captured frames into small grayscale arrays for pixel comparison
+"""
+
+from io import BytesIO
+from typing import Tuple
+
+import numpy as np
+
+# Resolution used for pixel comparison (320x240 is plenty)
+DETECTION_SIZE = (320, 240)
+
+DECODE_MODES = ('fast', 'lanczos', 'raw')
+
+
+def decode_grayscale(image_bytes: bytes, size: Tuple[int, int] = DETECTION_SIZE,
+                     mode: str = 'fast') -> np.ndarray:
+    """Decode a JPEG into a grayscale array of the given (width, height)
+
+    fast:    let the JPEG decoder downscale in the DCT domain and emit luma only,
+             then finish with a cheap box filter
+    lanczos: full decode and LANCZOS resize (original behaviour, slowest)
+    raw:     the bytes are already 8-bit grayscale at the target size
+    """
+    if mode == 'raw':
+        return gray_from_raw(image_bytes, size)
+
+    # Pillow is imported on first use (not at import time) to keep app loads fast
+    from PIL import Image
+    img = Image.open(BytesIO(image_bytes))
+    if mode == 'lanczos':
+        img = img.resize(size, Image.Resampling.LANCZOS)
+        return np.asarray(img.convert('L'))
+
+    # draft() picks the largest 1/2, 1/4 or 1/8 scale that is still >= size
+    img.draft('L', size)
+    if img.mode != 'L':
+        img = img.convert('L')
+    if img.size != size:
+        img = img.resize(size, Image.Resampling.BOX)
+    return np.asarray(img)
+
+
+def gray_from_raw(raw: bytes, size: Tuple[int, int] = DETECTION_SIZE) -> np.ndarray:
+    """Wrap an ffmpeg gray rawvideo frame as a (height, width) uint8 array without copying"""
+    width, height = size
+    if len(raw) != width * height:
+        raise ValueError(f"raw frame is {len(raw)} bytes, expected {width}x{height} = {width * height}")
+    return np.frombuffer(raw, dtype=np.uint8, count=width * height).reshape(height, width)
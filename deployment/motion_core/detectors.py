@@ -0,0 +1,34 @@
+"""
+Detection strategies
+Which test decides that a captured frame shows motion
+
+    pixel     - decode to 320x240 grayscale and compare against the background
+                model (ROI, blobs and the cascade apply); Camera.detect()
+    filesize  - the original heuristic of the scheduled app: the JPEG size
+                changed by more than filesize_threshold bytes; no decoding
+"""
+
+from typing import Optional
+
+DETECTORS = ('pixel', 'filesize')
+
+
+class FileSizeDetector:
+    """Motion test on the byte size of consecutive JPEG frames
+
+    Rough: compression makes busy scenes bigger, so a person or car entering
+    the frame usually changes the size, but so do lighting changes. Kept for
+    setups that ran the scheduled app.
+    """
+
+    def __init__(self, threshold: int = 50000):
+        self.threshold = threshold
+        self.last_size: Optional[int] = None
+
+    def apply(self, frame_bytes: bytes) -> Optional[int]:
+        """Size difference to the previous frame in bytes, or None for the first frame"""
+        size = len(frame_bytes)
+        previous, self.last_size = self.last_size, size
+        if previous is None:
+            return None
+        return abs(size - previous)
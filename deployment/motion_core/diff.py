@@ -0,0 +1,90 @@
+"""
+Frame differencing for motion detection
+uint8 absolute difference with preallocated scratch buffers
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+class FrameDiffer:
+    """Counts pixels whose brightness changed by more than a threshold
+
+    All intermediate arrays are allocated once per frame shape and reused, and
+    the absolute difference stays in uint8 (max - min never overflows), so a
+    check creates no full-frame temporaries.
+    """
+
+    def __init__(self, threshold: int = 30):
+        self.threshold = threshold
+        self._shape = None
+        self._batch_shape = None
+
+    def _ensure_buffers(self, shape: Tuple[int, ...]):
+        """(Re)allocate single-frame scratch buffers when the frame shape changes"""
+        if shape != self._shape:
+            self._shape = shape
+            self._high = np.empty(shape, dtype=np.uint8)
+            self._diff = np.empty(shape, dtype=np.uint8)
+            self._mask = np.empty(shape, dtype=bool)
+
+    def _ensure_batch_buffers(self, shape: Tuple[int, ...]):
+        """(Re)allocate stack scratch buffers when the stack shape changes"""
+        if shape != self._batch_shape:
+            self._batch_shape = shape
+            self._batch_high = np.empty(shape, dtype=np.uint8)
+            self._batch_diff = np.empty(shape, dtype=np.uint8)
+            self._batch_mask = np.empty(shape, dtype=bool)
+
+    @property
+    def diff(self) -> np.ndarray:
+        """Absolute difference from the last compare() call (reused buffer)"""
+        return self._diff
+
+    @property
+    def mask(self) -> np.ndarray:
+        """Changed-pixel mask from the last compare() call (reused buffer)"""
+        return self._mask
+
+    def compare(self, current: np.ndarray, previous: np.ndarray) -> Tuple[int, float]:
+        """Return (changed_pixels, avg_change) between two uint8 frames"""
+        self._ensure_buffers(current.shape)
+        high, diff, mask = self._high, self._diff, self._mask
+
+        # |a - b| computed as max - min, safe in uint8
+        np.maximum(current, previous, out=high)
+        np.minimum(current, previous, out=diff)
+        np.subtract(high, diff, out=diff)
+
+        # The mask is built once and drives both the count and the masked sum;
+        # multiplying by the mask is much cheaper than np.sum(where=...)
+        np.greater(diff, self.threshold, out=mask)
+        changed_pixels = int(np.count_nonzero(mask))
+        if changed_pixels == 0:
+            return 0, 0.0
+        np.multiply(diff, mask, out=high)
+        total_change = int(high.sum(dtype=np.uint64))
+        return changed_pixels, total_change / changed_pixels
+
+    def compare_batch(self, frames: np.ndarray, reference: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Score a stack of N frames (N, H, W) against one reference frame (H, W)
+
+        Returns (changed_pixels, avg_change) arrays of length N.
+        """
+        self._ensure_batch_buffers(frames.shape)
+        high, diff, mask = self._batch_high, self._batch_diff, self._batch_mask
+
+        np.maximum(frames, reference, out=high)
+        np.minimum(frames, reference, out=diff)
+        np.subtract(high, diff, out=diff)
+        np.greater(diff, self.threshold, out=mask)
+
+        axes = tuple(range(1, frames.ndim))
+        changed_pixels = np.count_nonzero(mask, axis=axes)
+        np.multiply(diff, mask, out=high)
+        total_change = high.sum(axis=axes, dtype=np.uint64)
+        avg_change = np.divide(total_change, changed_pixels,
+                               out=np.zeros(len(frames), dtype=np.float64),
+                               where=changed_pixels > 0)
+        return changed_pixels, avg_change
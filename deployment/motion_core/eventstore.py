@@ -0,0 +1,499 @@
+"""
+Local event store
+Triggers and detections in SQLite (WAL mode), trigger thumbnails in append-only segment files
+
+    cd deployment
+    python -m motion_core.eventstore /config/camera_detection/events --since 7d --counts
+    python -m motion_core.eventstore /config/camera_detection/events --type vehicle --limit 20
+    python -m motion_core.eventstore /config/camera_detection/events --thumbnail 1234 -o trigger.jpg
+
+Writes are queued and applied in batches by one background thread, so the
+detection path only appends to a deque. Thumbnails are small grayscale JPEGs
+appended to the current segment file; the database stores (segment, offset,
+length) instead of one file per event. Old events and whole segments are
+removed by age and total thumbnail size.
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+DATABASE_NAME = 'events.db'
+SEGMENT_PATTERN = re.compile(r'^thumbs-(\d{6})\.seg$')
+
+# Outcome of a trigger, stored in events.status
+EVENT_STATUSES = ('triggered', 'analyzed', 'cached', 'filtered', 'skipped', 'error')
+COUNT_FIELDS = ('type', 'location', 'camera')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    camera TEXT NOT NULL,
+    ts REAL NOT NULL,
+    changed_pixels INTEGER,
+    avg_change REAL,
+    blobs TEXT,
+    crop TEXT,
+    status TEXT NOT NULL DEFAULT 'triggered',
+    summary TEXT,
+    thumb_segment INTEGER,
+    thumb_offset INTEGER,
+    thumb_length INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_camera_ts ON events (camera, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY,
+    event_id INTEGER NOT NULL,
+    camera TEXT NOT NULL,
+    ts REAL NOT NULL,
+    type TEXT,
+    location TEXT,
+    description TEXT,
+    confidence REAL
+);
+CREATE INDEX IF NOT EXISTS detections_event ON detections (event_id);
+CREATE INDEX IF NOT EXISTS detections_type_ts ON detections (type, ts);
+CREATE INDEX IF NOT EXISTS detections_camera_ts ON detections (camera, ts);
+"""
+
+# Columns added after the first release: (name, type) for ALTER TABLE on older stores
+ADDED_COLUMNS = (('crop', 'TEXT'),)
+
+
+def encode_thumbnail(frame: np.ndarray, width: int = 160, quality: int = 70) -> bytes:
+    """Downscale a grayscale detection frame to `width` pixels wide and encode it as JPEG"""
+    img = Image.fromarray(frame, mode='L')
+    if img.width > width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.BOX)
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+
+def parse_age(text: str) -> float:
+    """Seconds in an age like '30m', '12h' or '7d' (plain numbers are seconds)"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*', text)
+    if not match:
+        raise ValueError(f"invalid age '{text}' (use e.g. 30m, 12h, 7d)")
+    unit = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}[match.group(2)]
+    return float(match.group(1)) * unit
+
+
+class EventReader:
+    """Read-only queries on an event store directory (safe from any thread or process)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.database = os.path.join(path, DATABASE_NAME)
+
+    def _connect(self, readonly: bool = True) -> sqlite3.Connection:
+        if readonly:
+            connection = sqlite3.connect(f"file:{self.database}?mode=ro", uri=True, timeout=10)
+        else:
+            connection = sqlite3.connect(self.database, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps commits durable against crashes without an fsync per batch
+            connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def events(self, camera: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None, object_type: Optional[str] = None,
+               status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Events newest first, each with its detections; object_type matches any of them"""
+        where, params = self._filters('e', camera, since, until)
+        if status:
+            where.append("e.status = ?")
+            params.append(status)
+        if object_type:
+            where.append("EXISTS (SELECT 1 FROM detections d WHERE d.event_id = e.id AND d.type = ?)")
+            params.append(object_type)
+        sql = "SELECT e.* FROM events e"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.ts DESC LIMIT ?"
+        params.append(limit)
+
+        connection = self._connect()
+        try:
+            events = [dict(row) for row in connection.execute(sql, params)]
+            by_id = {event['id']: event for event in events}
+            for event in events:
+                event['blobs'] = json.loads(event['blobs']) if event['blobs'] else None
+                event['crop'] = json.loads(event['crop']) if event['crop'] else None
+                event['detections'] = []
+            if by_id:
+                marks = ','.join('?' * len(by_id))
+                for row in connection.execute(
+                        f"SELECT event_id, type, location, description, confidence FROM detections "
+                        f"WHERE event_id IN ({marks}) ORDER BY id", list(by_id)):
+                    by_id[row['event_id']]['detections'].append(
+                        {key: row[key] for key in ('type', 'location', 'description', 'confidence')})
+            return events
+        finally:
+            connection.close()
+
+    def counts(self, by: str = 'type', camera: Optional[str] = None, since: Optional[float] = None,
+               until: Optional[float] = None) -> Dict[str, int]:
+        """Number of detections per type, location or camera, e.g. vehicles this week"""
+        if by not in COUNT_FIELDS:
+            raise ValueError(f"by must be one of {', '.join(COUNT_FIELDS)}")
+        where, params = self._filters('d', camera, since, until)
+        sql = f"SELECT d.{by} AS key, COUNT(*) AS n FROM detections d"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" GROUP BY d.{by} ORDER BY n DESC"
+        connection = self._connect()
+        try:
+            return {row['key']: row['n'] for row in connection.execute(sql, params)}
+        finally:
+            connection.close()
+
+    def thumbnail(self, event_id: int) -> Optional[bytes]:
+        """JPEG thumbnail of an event, or None if it has none (or it was pruned)"""
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT thumb_segment, thumb_offset, thumb_length FROM events WHERE id = ?",
+                                     (event_id,)).fetchone()
+        finally:
+            connection.close()
+        if row is None or row['thumb_segment'] is None:
+            return None
+        try:
+            with open(os.path.join(self.path, f"thumbs-{row['thumb_segment']:06d}.seg"), 'rb') as f:
+                f.seek(row['thumb_offset'])
+                data = f.read(row['thumb_length'])
+        except FileNotFoundError:
+            return None
+        return data if len(data) == row['thumb_length'] else None
+
+    @staticmethod
+    def _filters(alias: str, camera: Optional[str], since: Optional[float],
+                 until: Optional[float]) -> Tuple[List[str], List]:
+        where, params = [], []
+        if camera:
+            where.append(f"{alias}.camera = ?")
+            params.append(camera)
+        if since is not None:
+            where.append(f"{alias}.ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append(f"{alias}.ts < ?")
+            params.append(until)
+        return where, params
+
+
+class EventStore(EventReader):
+    """SQLite event log plus thumbnail segments under one directory
+
+    record_trigger() and record_result() never block: operations go to a
+    bounded deque (excess is dropped and counted) that a writer thread applies
+    in one transaction per batch. Event ids are handed out immediately so a
+    result can reference its trigger before either is written. Queries open
+    their own read-only connection; WAL lets them run while the writer commits.
+    """
+
+    def __init__(self, path: str, max_age_days: float = 30, max_mb: float = 500,
+                 thumbnail_width: int = 160, thumbnail_quality: int = 70, segment_mb: float = 16,
+                 batch_interval: float = 1.0, max_queue: int = 1000, prune_interval: float = 3600,
+                 log: Optional[Callable[[str], None]] = None):
+        super().__init__(path)
+        self.max_age_days = max_age_days
+        self.max_bytes = int(max_mb * 2 ** 20)
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_quality = thumbnail_quality
+        self.segment_bytes = int(min(segment_mb * 2 ** 20, max(self.max_bytes // 8, 2 ** 20)))
+        self.batch_interval = batch_interval
+        self.max_queue = max(1, max_queue)
+        self.prune_interval = prune_interval
+        self.log = log or (lambda message: None)
+
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.pruned_events = 0
+        self.thumbnail_bytes = 0
+
+        os.makedirs(path, exist_ok=True)
+        connection = self._connect(readonly=False)
+        try:
+            with connection:
+                connection.executescript(SCHEMA)
+                columns = {row['name'] for row in connection.execute("PRAGMA table_info(events)")}
+                for name, kind in ADDED_COLUMNS:
+                    if name not in columns:
+                        connection.execute(f"ALTER TABLE events ADD COLUMN {name} {kind}")
+            self._next_id = (connection.execute("SELECT MAX(id) FROM events").fetchone()[0] or 0) + 1
+        finally:
+            connection.close()
+
+        self._id_lock = threading.Lock()
+        self._ops: deque = deque()
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="event-store", daemon=True)
+        self._thread.start()
+
+    # Detection path (non-blocking)
+
+    def record_trigger(self, camera: str, changed_pixels: int = 0, avg_change: float = 0.0,
+                       blobs: Optional[List] = None, frame: Optional[np.ndarray] = None,
+                       timestamp: Optional[float] = None,
+                       crop: Optional[Tuple[float, float, float, float]] = None) -> Optional[int]:
+        """Queue a trigger event; returns its id, or None if the queue was full
+
+        frame is the grayscale detection frame; it is copied here and only
+        encoded as a thumbnail on the writer thread. crop is the motion box
+        (frame fractions) the trigger was judged on, e.g. by the pre-classifier.
+        """
+        with self._id_lock:
+            event_id = self._next_id
+            self._next_id += 1
+        row = (event_id, camera, timestamp or time.time(), int(changed_pixels), float(avg_change),
+               json.dumps([list(blob.box) for blob in blobs]) if blobs else None,
+               json.dumps([float(value) for value in crop]) if crop else None)
+        thumbnail = frame.copy() if frame is not None and self.thumbnail_width else None
+        return event_id if self._enqueue(('trigger', row, thumbnail)) else None
+
+    def record_result(self, event_id: Optional[int], detections: List[Dict], summary: str = '',
+                      status: str = 'analyzed'):
+        """Queue the outcome of a trigger (its detections, or why there are none)
+
+        Detections take the camera and time of their trigger event.
+        """
+        if event_id is None:
+            return
+        rows = [(detection.get('type'), detection.get('location'), detection.get('description'),
+                 detection.get('confidence'), event_id)
+                for detection in detections]
+        self._enqueue(('result', (status, summary, event_id), rows))
+
+    def _enqueue(self, op: Tuple) -> bool:
+        with self._condition:
+            if not self._running or len(self._ops) >= self.max_queue:
+                self.dropped += 1
+                return False
+            self._ops.append(op)
+            self._pending += 1
+            self._condition.notify()
+        return True
+
+    # Writer thread
+
+    def _run(self):
+        """Writer loop: collect a batch, write it, prune now and then; drains the queue on close"""
+        connection = self._connect(readonly=False)
+        segment = self._open_segment()
+        next_prune = time.time()
+        try:
+            while True:
+                with self._condition:
+                    if self._running and not self._ops:
+                        self._condition.wait(max(0.0, next_prune - time.time()))
+                    running = self._running
+                if running and self._ops and self.batch_interval:
+                    # Let a burst collect into one transaction
+                    time.sleep(self.batch_interval)
+                with self._condition:
+                    batch = list(self._ops)
+                    self._ops.clear()
+                if batch:
+                    segment = self._write(connection, segment, batch)
+                if time.time() >= next_prune:
+                    segment = self._prune(connection, segment)
+                    next_prune = time.time() + self.prune_interval
+                if not running:
+                    return
+        finally:
+            segment[1].close()
+            connection.close()
+
+    def _write(self, connection: sqlite3.Connection, segment, batch: List[Tuple]):
+        """Apply one batch in a single transaction (thumbnails are appended first)"""
+        try:
+            events, updates, detections = [], [], []
+            for op in batch:
+                if op[0] == 'trigger':
+                    row, frame = op[1], op[2]
+                    thumb = (None, None, None)
+                    if frame is not None:
+                        segment, thumb = self._append_thumbnail(segment, frame)
+                    events.append(row + thumb)
+                else:
+                    updates.append(op[1])
+                    detections.extend(op[2])
+            segment[1].flush()
+            with connection:
+                connection.executemany(
+                    "INSERT INTO events (id, camera, ts, changed_pixels, avg_change, blobs, crop, "
+                    "thumb_segment, thumb_offset, thumb_length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", events)
+                connection.executemany("UPDATE events SET status = ?, summary = ? WHERE id = ?", updates)
+                connection.executemany(
+                    "INSERT INTO detections (event_id, camera, ts, type, location, description, confidence) "
+                    "SELECT id, camera, ts, ?, ?, ?, ? FROM events WHERE id = ?", detections)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed_batches += 1
+            self.log(f"Event store write failed ({len(batch)} operations lost): {e}")
+        finally:
+            with self._condition:
+                self._pending -= len(batch)
+                self._condition.notify_all()
+        return segment
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        """(number, path) of every segment file, oldest first"""
+        found = []
+        for name in os.listdir(self.path):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                found.append((int(match.group(1)), os.path.join(self.path, name)))
+        return sorted(found)
+
+    def _open_segment(self, number: Optional[int] = None):
+        """(number, file) of the segment new thumbnails are appended to"""
+        if number is None:
+            segments = self._segments()
+            number = segments[-1][0] if segments else 1
+        handle = open(os.path.join(self.path, f"thumbs-{number:06d}.seg"), 'ab')
+        return number, handle
+
+    def _append_thumbnail(self, segment, frame: np.ndarray):
+        number, handle = segment
+        data = encode_thumbnail(frame, self.thumbnail_width, self.thumbnail_quality)
+        offset = handle.tell()
+        if offset and offset + len(data) > self.segment_bytes:
+            handle.close()
+            number, handle = self._open_segment(number + 1)
+            offset = 0
+        handle.write(data)
+        self.thumbnail_bytes += len(data)
+        return (number, handle), (number, offset, len(data))
+
+    def _prune(self, connection: sqlite3.Connection, segment):
+        """Remove events past max_age_days, then the oldest segments over max_mb"""
+        try:
+            removed = 0
+            with connection:
+                if self.max_age_days:
+                    cutoff = time.time() - self.max_age_days * 86400
+                    connection.execute("DELETE FROM detections WHERE ts < ?", (cutoff,))
+                    removed += connection.execute("DELETE FROM events WHERE ts < ?", (cutoff,)).rowcount
+
+                    # Segments only hold older thumbnails once their last append is past the cutoff
+                    for number, path in self._segments():
+                        if number != segment[0] and os.path.getmtime(path) < cutoff:
+                            os.remove(path)
+
+                if self.max_bytes:
+                    segments = self._segments()
+                    total = sum(os.path.getsize(path) for _, path in segments)
+                    for number, path in segments:
+                        if total <= self.max_bytes or number == segment[0]:
+                            break
+                        total -= os.path.getsize(path)
+                        os.remove(path)
+                        newest = connection.execute("SELECT MAX(id) FROM events WHERE thumb_segment = ?",
+                                                    (number,)).fetchone()[0]
+                        if newest is not None:
+                            connection.execute("DELETE FROM detections WHERE event_id <= ?", (newest,))
+                            removed += connection.execute("DELETE FROM events WHERE id <= ?",
+                                                          (newest,)).rowcount
+            if removed:
+                self.pruned_events += removed
+                self.log(f"Event store: removed {removed} old event(s)")
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as e:
+            self.log(f"Event store retention failed: {e}")
+        return segment
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until everything queued so far is written"""
+        deadline = time.time() + timeout
+        with self._condition:
+            self._condition.notify()
+            while self._pending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Write what is queued and stop the writer thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict:
+        """Writer counters (no database access)"""
+        with self._condition:
+            queued = len(self._ops)
+        return {
+            "queued": queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "pruned_events": self.pruned_events
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query the camera detection event store")
+    parser.add_argument('path', help="event store directory (event_store_path)")
+    parser.add_argument('--since', help="only events newer than this age, e.g. 12h, 7d")
+    parser.add_argument('--camera', help="only this camera")
+    parser.add_argument('--type', help="only events with a detection of this type")
+    parser.add_argument('--status', choices=EVENT_STATUSES, help="only events with this outcome")
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--counts', choices=COUNT_FIELDS, nargs='?', const='type',
+                        help="count detections per type (default), location or camera instead of listing events")
+    parser.add_argument('--thumbnail', type=int, metavar='ID', help="write the thumbnail of event ID")
+    parser.add_argument('-o', '--output', help="output file for --thumbnail (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(os.path.join(args.path, DATABASE_NAME)):
+        parser.error(f"no event store in {args.path}")
+    store = EventReader(args.path)
+    since = time.time() - parse_age(args.since) if args.since else None
+
+    if args.thumbnail is not None:
+        data = store.thumbnail(args.thumbnail)
+        if data is None:
+            sys.exit(f"event {args.thumbnail} has no thumbnail")
+        if args.output:
+            with open(args.output, 'wb') as f:
+                f.write(data)
+        else:
+            sys.stdout.buffer.write(data)
+        return
+
+    if args.counts:
+        for key, count in store.counts(args.counts, args.camera, since).items():
+            print(f"{count:>8}  {key}")
+        return
+
+    for event in store.events(args.camera, since, None, args.type, args.status, args.limit):
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event['ts']))
+        found = ', '.join(f"{d['type']}@{d['location']}" for d in event['detections']) or event['summary'] or ''
+        thumb = ' [thumb]' if event['thumb_segment'] is not None else ''
+        print(f"{event['id']:>7}  {stamp}  {event['camera']:<12} {event['status']:<9} "
+              f"{event['changed_pixels']:>6} px{thumb}  {found}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Tick-overrun protection
+At most one check in flight per camera, and a time budget for every stage of a check
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+OVERLAP_POLICIES = ('skip', 'coalesce')
+
+# Default per-stage budgets in seconds
+DEFAULT_STAGE_BUDGETS = {
+    'capture': 10.0,
+    'decode': 1.0,
+    'detect': 1.0,
+    'classify': 1.0,
+    'analysis_capture': 10.0,
+}
+
+
+class CheckGuard:
+    """Lets one check per camera run at a time
+
+    A tick that arrives while a check is running is either skipped, or (with
+    the coalesce policy) folded into a single follow-up run that starts as soon
+    as the current check finishes. Any number of overlapping ticks produce at
+    most one follow-up, so slow checks never pile up on worker threads.
+    """
+
+    def __init__(self, policy: str = 'skip'):
+        if policy not in OVERLAP_POLICIES:
+            raise ValueError(f"overlap policy must be one of {', '.join(OVERLAP_POLICIES)}")
+        self.policy = policy
+        self.runs = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.overruns = 0
+
+        self._lock = threading.Lock()
+        self._running = False
+        self._pending = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def try_enter(self) -> bool:
+        """Claim the camera for a check; False if one is already in flight"""
+        with self._lock:
+            if self._running:
+                if self.policy == 'coalesce' and not self._pending:
+                    self._pending = True
+                    self.coalesced += 1
+                else:
+                    self.skipped += 1
+                return False
+            self._running = True
+            self.runs += 1
+            return True
+
+    def exit(self, duration: float = 0.0, interval: float = 0.0) -> bool:
+        """Release the camera; True if a coalesced tick should run now (camera stays claimed)"""
+        with self._lock:
+            if interval and duration > interval:
+                self.overruns += 1
+            if self._pending:
+                self._pending = False
+                self.runs += 1
+                return True
+            self._running = False
+            return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "skipped": self.skipped,
+                "coalesced": self.coalesced,
+                "overruns": self.overruns
+            }
+
+
+class StageBudget:
+    """Time budgets for the stages of one check
+
+    Each stage gets min(its own budget, what is left of the total budget):
+    captures use remaining() as their ffmpeg timeout, and before every later
+    stage the caller asks skip_if_expired() and drops the rest of the check
+    once the total is used up. CPU stages cannot be interrupted, so a stage
+    that ran over its own budget is recorded in `overruns` for the log.
+    """
+
+    def __init__(self, total: float, budgets: Optional[Dict[str, float]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.total = total
+        self.budgets = dict(DEFAULT_STAGE_BUDGETS)
+        self.budgets.update(budgets or {})
+        self.clock = clock
+        self.started = clock()
+        self.timings: Dict[str, float] = {}
+        self.overruns: List[str] = []
+        self.skipped: Optional[str] = None
+        self._stage = None
+        self._stage_started = 0.0
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def expired(self) -> bool:
+        """True once the whole check has used up its budget"""
+        return self.elapsed() >= self.total
+
+    def skip_if_expired(self, stage: str) -> bool:
+        """True if the total budget is used up, so stage and everything after it should be skipped"""
+        if not self.expired():
+            return False
+        self.skipped = stage
+        return True
+
+    def remaining(self, stage: str) -> float:
+        """Time allowed for a stage"""
+        left = max(0.0, self.total - self.elapsed())
+        return min(self.budgets.get(stage, left), left)
+
+    def start(self, stage: str):
+        self._stage = stage
+        self._stage_started = self.clock()
+
+    def end(self) -> float:
+        """Finish the current stage and return how long it took"""
+        elapsed = self.clock() - self._stage_started
+        self.timings[self._stage] = elapsed
+        if elapsed > self.budgets.get(self._stage, self.total):
+            self.overruns.append(self._stage)
+        self._stage = None
+        return elapsed
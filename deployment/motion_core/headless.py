@@ -0,0 +1,148 @@
+"""
+Headless runner
+Runs the detection pipeline on recordings without AppDaemon or Home Assistant
+
+    python -m motion_core driveway.mp4 --interval 2 --analyzer none
+    python -m motion_core clips/ porch.mkv --settings '{"blob_detection": true}'
+
+Every source (video file or directory of snapshots) becomes one camera read
+with capture_mode file; the pipeline runs on stream time, so cooldowns behave
+as they would live. MQTT messages and Home Assistant events are written to
+stdout as JSON lines and the log goes to stderr. With an API key (--api-key or
+ANTHROPIC_API_KEY) triggers are analyzed as usual; without one, or with
+--analyzer none, they become motion-only events.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .pipeline import MotionPipeline
+
+
+class HeadlessHost:
+    """The AppDaemon methods MotionPipeline uses, for scripts
+
+    Timers are not scheduled: the caller drives check_motion() itself.
+    """
+
+    name = 'headless'
+
+    def __init__(self, stream=None, log_stream=None):
+        self.stream = stream or sys.stdout
+        self.log_stream = log_stream or sys.stderr
+        self._lock = threading.Lock()
+
+    def log(self, message: str):
+        self._write(self.log_stream, f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} {message}")
+
+    def error(self, message: str):
+        self._write(self.log_stream, f"{datetime.now().strftime('%H:%M:%S.%f')[:-3]} ERROR {message}")
+
+    def run_in(self, callback, delay, **kwargs):
+        return None
+
+    def run_every(self, callback, start, interval, **kwargs):
+        return None
+
+    def call_service(self, service: str, **kwargs):
+        if service == 'mqtt/publish':
+            self._write(self.stream, json.dumps({"topic": kwargs.get('topic'), "payload": kwargs.get('payload'),
+                                                 "retain": kwargs.get('retain', False)}))
+
+    def fire_event(self, event: str, **kwargs):
+        self._write(self.stream, json.dumps({"event": event, "data": kwargs}))
+
+    def _write(self, stream, line: str):
+        with self._lock:
+            stream.write(line + "\n")
+            stream.flush()
+
+
+def headless_args(sources: List[str], interval: float, settings: Optional[Dict] = None) -> Dict:
+    """App settings for reading each source as one camera"""
+    args = dict(settings or {})
+    args.update({
+        'mqtt_client': 'stdout',
+        'metrics_interval': 0,
+        'analysis_queue_size': max(args.get('analysis_queue_size', 2), 1000),
+        'analysis_max_age': float('inf'),
+        'capture_mode': 'file',
+        'file_interval': interval,
+        'check_interval': interval,
+    })
+    names = []
+    for source in sources:
+        name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0] or 'camera'
+        if name in names:
+            name = f"{name}_{len(names) + 1}"
+        names.append(name)
+    if len(sources) == 1:
+        args['snapshot_url'] = sources[0]
+        args['camera_name'] = names[0]
+    else:
+        args['cameras'] = [{'name': name, 'snapshot_url': source} for name, source in zip(names, sources)]
+    return args
+
+
+def run(pipeline: MotionPipeline) -> Dict[str, Dict]:
+    """Check every camera in turn until all sources are exhausted; returns per-camera metrics"""
+    active = list(pipeline.cameras.values())
+    while active:
+        for camera in list(active):
+            pipeline.check_motion({'camera': camera.name})
+            if camera.snapshot_capture.exhausted:
+                active.remove(camera)
+                # The recording ended during the post-roll: analyze what was collected
+                if camera.pending_job is not None:
+                    job, camera.pending_job = camera.pending_job, None
+                    pipeline.submit_analysis(camera, job, camera.postroll_frames - camera.postroll_remaining)
+    pipeline.analysis_queue.wait()
+    return {name: camera.metrics.snapshot() for name, camera in pipeline.cameras.items()}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='python -m motion_core',
+                                     description="Run motion detection on recordings without Home Assistant")
+    parser.add_argument('sources', nargs='+', help="video file or directory of frames (one camera each)")
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="seconds of stream time between checks (one frame is sampled per interval)")
+    parser.add_argument('--settings', default='{}', help="JSON dict of app settings (as in apps.yaml)")
+    parser.add_argument('--analyzer', choices=('anthropic', 'none'),
+                        help="default: anthropic with an API key, otherwise none")
+    parser.add_argument('--api-key', default=os.environ.get('ANTHROPIC_API_KEY'),
+                        help="Anthropic API key (default: $ANTHROPIC_API_KEY)")
+    parser.add_argument('--quiet', action='store_true', help="no per-check log lines")
+    parser.add_argument('--json', help="write the per-camera counters and stage timings to this file")
+    args = parser.parse_args(argv)
+
+    settings = headless_args(args.sources, args.interval, json.loads(args.settings))
+    if args.api_key:
+        settings.setdefault('anthropic_api_key', args.api_key)
+    settings['analyzer'] = args.analyzer or ('anthropic' if settings.get('anthropic_api_key') else 'none')
+    if args.quiet:
+        settings['log_ticks'] = False
+
+    host = HeadlessHost()
+    pipeline = MotionPipeline(settings, host=host, label='headless')
+    if not pipeline.start():
+        pipeline.stop()
+        sys.exit(1)
+    try:
+        results = run(pipeline)
+    finally:
+        pipeline.stop()
+
+    for name, snapshot in results.items():
+        counters = snapshot['counters']
+        check = snapshot['stages'].get('check', {})
+        print(f"{name}: {counters.get('checks', 0)} checks, {counters.get('triggers', 0)} triggers, "
+              f"{counters.get('analyses', 0)} analyses, {counters.get('api_skipped', 0)} motion-only "
+              f"(check p50 {check.get('p50', 0) * 1000:.1f} ms)", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
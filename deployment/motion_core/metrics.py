@@ -0,0 +1,179 @@
+"""
+Pipeline metrics
+Rolling latency histograms and counters per camera, exportable as JSON or Prometheus text
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# Counters every camera reports, even while still zero
+COUNTERS = (
+    'checks',
+    'triggers',
+    'cooldown_suppressed',
+    'capture_failures',
+    'decode_failures',
+    'analyses',
+    'api_errors',
+    'api_skipped',
+    'cache_hits',
+    'queue_dropped',
+    'budget_skipped',
+)
+
+
+class RollingHistogram:
+    """Latency samples in a fixed ring; percentiles cover the last `size` observations"""
+
+    def __init__(self, size: int = 512):
+        self._samples = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self._samples[self.count % len(self._samples)] = value
+        self.count += 1
+        self.total += value
+
+    def summary(self) -> Dict:
+        """count/sum over all time, mean and p50/p95/p99 (seconds) over the window"""
+        window = self._samples[:min(self.count, len(self._samples))]
+        if not len(window):
+            return {"count": 0, "sum": 0.0}
+        p50, p95, p99 = np.percentile(window, [50, 95, 99])
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(float(window.mean()), 6),
+            "p50": round(float(p50), 6),
+            "p95": round(float(p95), 6),
+            "p99": round(float(p99), 6)
+        }
+
+
+class Metrics:
+    """Stage timings and event counters for one camera
+
+    Recording is a lock plus an array store, cheap enough for every stage of
+    every check; percentiles are only computed when a snapshot is taken.
+    """
+
+    def __init__(self, window: int = 512):
+        self.window = window
+        self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+        self.stages: Dict[str, RollingHistogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    def observe_all(self, timings: Dict[str, float]):
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def increment(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time a with-block as one observation of stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.summary() for stage, histogram in self.stages.items()}
+            }
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(snapshots: Dict[str, Dict], namespace: str = 'camera_detection') -> str:
+    """Render {camera name: Metrics.snapshot()} in the Prometheus text exposition format"""
+    counter_lines: Dict[str, List[str]] = {}
+    stage_lines: List[str] = []
+    for camera, snapshot in snapshots.items():
+        label = f'camera="{_escape(camera)}"'
+        for name, value in snapshot['counters'].items():
+            counter_lines.setdefault(name, []).append(f"{namespace}_{name}_total{{{label}}} {value}")
+        for stage, summary in snapshot['stages'].items():
+            stage_label = f'{label},stage="{_escape(stage)}"'
+            for quantile, value in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+                if quantile in summary:
+                    stage_lines.append(f'{namespace}_stage_seconds{{{stage_label},quantile="{value}"}} '
+                                       f'{summary[quantile]}')
+            stage_lines.append(f"{namespace}_stage_seconds_sum{{{stage_label}}} {summary['sum']}")
+            stage_lines.append(f"{namespace}_stage_seconds_count{{{stage_label}}} {summary['count']}")
+
+    lines = []
+    for name, samples in counter_lines.items():
+        lines.append(f"# HELP {namespace}_{name}_total Total {name.replace('_', ' ')} per camera")
+        lines.append(f"# TYPE {namespace}_{name}_total counter")
+        lines.extend(samples)
+    if stage_lines:
+        lines.append(f"# HELP {namespace}_stage_seconds Pipeline stage latency in seconds over the recent window")
+        lines.append(f"# TYPE {namespace}_stage_seconds summary")
+        lines.extend(stage_lines)
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Minimal HTTP endpoint serving Prometheus text on /metrics from a background thread
+
+    It listens on localhost only unless given another bind address, since the
+    metrics name every camera.
+    """
+
+    def __init__(self, render: Callable[[], str], port: int, host: str = '127.0.0.1'):
+        self.render = render
+        self.port = port
+        self.host = host
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        # http.server is only loaded when the endpoint is enabled
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        render = self.render
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-http', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,85 @@
+"""
+AI payload preparation
+Crops, downscales and re-encodes a captured frame before it is sent for analysis
+"""
+
+from io import BytesIO
+from typing import Optional, Tuple
+
+import numpy as np
+
+PAYLOAD_CROPS = ('none', 'motion', 'roi')
+
+# Crop boxes are (left, top, right, bottom) as fractions 0-1 of the frame
+CropBox = Tuple[float, float, float, float]
+
+
+def mask_bounding_box(mask: Optional[np.ndarray], frame_size: Tuple[int, int],
+                      offset: Tuple[int, int] = (0, 0)) -> Optional[CropBox]:
+    """Bounding box of the changed pixels in a detection mask, as frame fractions
+
+    offset is the (x, y) position of the mask inside the detection frame, for
+    masks computed on an ROI crop.
+    """
+    if mask is None:
+        return None
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(mask.any(axis=0))
+    width, height = frame_size
+    x0, y0 = offset
+    return (float(x0 + cols[0]) / width, float(y0 + rows[0]) / height,
+            float(x0 + cols[-1] + 1) / width, float(y0 + rows[-1] + 1) / height)
+
+
+def expand_box(box: CropBox, margin: float) -> CropBox:
+    """Grow a crop box by margin (fraction of its size) on each side, clipped to the frame"""
+    left, top, right, bottom = box
+    dx = (right - left) * margin
+    dy = (bottom - top) * margin
+    return (max(0.0, left - dx), max(0.0, top - dy), min(1.0, right + dx), min(1.0, bottom + dy))
+
+
+def prepare_payload(jpeg_bytes: bytes, crop_box: Optional[CropBox] = None, margin: float = 0.15,
+                    max_edge: int = 0, quality: int = 80) -> bytes:
+    """Crop to crop_box (+ margin), fit within max_edge pixels and re-encode as JPEG
+
+    The JPEG is decoded once, at the smallest DCT scale that still gives the
+    cropped area at least max_edge pixels on its long side. The original bytes
+    are returned untouched when there is nothing to do (no crop and the frame
+    already fits max_edge) and when re-encoding would not make them smaller.
+    Grayscale frames stay grayscale.
+    """
+    if crop_box is None and not max_edge:
+        return jpeg_bytes
+
+    from PIL import Image
+    img = Image.open(BytesIO(jpeg_bytes))
+    full_width, full_height = img.size
+    if crop_box is None and max(full_width, full_height) <= max_edge:
+        # Only the header has been read; another encode would just lose quality
+        return jpeg_bytes
+    mode = 'L' if img.mode == 'L' else 'RGB'
+    box = expand_box(crop_box, margin) if crop_box else (0.0, 0.0, 1.0, 1.0)
+    crop_width = max(1.0, (box[2] - box[0]) * full_width)
+    crop_height = max(1.0, (box[3] - box[1]) * full_height)
+
+    if max_edge:
+        # Ask the decoder for a reduced-scale image that still covers max_edge after cropping
+        scale = min(1.0, max_edge / max(crop_width, crop_height))
+        img.draft(mode, (int(full_width * scale) + 1, int(full_height * scale) + 1))
+    if img.mode != mode:
+        img = img.convert(mode)
+
+    width, height = img.size
+    if crop_box:
+        img = img.crop((round(box[0] * width), round(box[1] * height),
+                        round(box[2] * width), round(box[3] * height)))
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.BILINEAR)
+
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality)
+    payload = out.getvalue()
+    return payload if len(payload) < len(jpeg_bytes) else jpeg_bytes
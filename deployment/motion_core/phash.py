@@ -0,0 +1,115 @@
+"""
+Perceptual-hash result cache
+Skips repeat vision calls when the scene has not meaningfully changed since the last analysis
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+HASH_METHODS = ('dhash', 'ahash')
+
+
+def _block_means(gray: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """Average a grayscale array down to rows x cols with a reshape (edges trimmed)"""
+    block_h = gray.shape[0] // rows
+    block_w = gray.shape[1] // cols
+    trimmed = gray[:block_h * rows, :block_w * cols]
+    return trimmed.reshape(rows, block_h, cols, block_w).mean(axis=(1, 3), dtype=np.float32)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    """Pack a boolean array into an integer, first element as the highest bit"""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def average_hash(gray: np.ndarray, hash_size: int = 8) -> int:
+    """aHash: which blocks are brighter than the mean"""
+    blocks = _block_means(gray, hash_size, hash_size)
+    return _pack_bits(blocks > blocks.mean())
+
+
+def difference_hash(gray: np.ndarray, hash_size: int = 8) -> int:
+    """dHash: whether each block is brighter than its right-hand neighbour"""
+    blocks = _block_means(gray, hash_size, hash_size + 1)
+    return _pack_bits(blocks[:, 1:] > blocks[:, :-1])
+
+
+def image_hash(gray: np.ndarray, method: str = 'dhash', hash_size: int = 8) -> int:
+    """Hash a grayscale array with the named method"""
+    if method == 'ahash':
+        return average_hash(gray, hash_size)
+    if method == 'dhash':
+        return difference_hash(gray, hash_size)
+    raise ValueError(f"Unknown hash method '{method}' (expected one of {', '.join(HASH_METHODS)})")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count('1')
+
+
+class ResultCache:
+    """Analysis results keyed by perceptual hash, with Hamming lookup, TTL and LRU eviction
+
+    A lookup hits when a stored hash is within max_distance bits of the query and
+    younger than ttl seconds. The most recently hit entries survive eviction.
+    """
+
+    def __init__(self, max_entries: int = 32, ttl: float = 600, max_distance: int = 5,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.clock = clock
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: int) -> Optional[Dict]:
+        """Return the cached result closest to key, or None on a miss"""
+        now = self.clock()
+        with self._lock:
+            best_key, best_distance = None, self.max_distance + 1
+            for stored_key, (stored_at, _) in list(self._entries.items()):
+                if now - stored_at > self.ttl:
+                    del self._entries[stored_key]
+                    continue
+                distance = hamming_distance(key, stored_key)
+                if distance < best_distance:
+                    best_key, best_distance = stored_key, distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][1]
+
+    def store(self, key: int, result: Dict):
+        """Cache a result, evicting the least recently used entries beyond max_entries"""
+        with self._lock:
+            self._entries[key] = (self.clock(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters, e.g. for publishing over MQTT"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries)
+            }
@@ -0,0 +1,893 @@
+"""
+Detection pipeline
+Capture -> detect -> (cache, pre-classifier) -> analyze -> publish for every configured camera
+
+The AppDaemon apps are thin adapters over MotionPipeline; the headless CLI
+(python -m motion_core) drives the same class against recordings. Anything
+host-specific goes through `host`, an object with AppDaemon's method names:
+
+    log(message)                                  error(message)
+    run_in(callback, delay, **kwargs)             run_every(callback, start, interval, **kwargs)
+    call_service(service, **kwargs)               fire_event(event, **kwargs)
+
+An AppDaemon app passes itself; headless.HeadlessHost implements them for
+scripts. Each stage is a strategy chosen by name in the settings:
+capture_mode (capture.CAPTURE_MODES), decode_mode (decode.DECODE_MODES),
+detector (detectors.DETECTORS), analyzer (analyzers.ANALYZERS) and mqtt_client
+(publisher.MQTT_CLIENTS). Optional features (event store, pre-classifier,
+metrics endpoint, paho-mqtt, anthropic, PyAV) are imported only when configured.
+"""
+
+import base64
+import json
+import os
+import subprocess
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .analyzers import create_analyzer
+from .camera import Camera, camera_configs
+from .cascade import coarse_grayscale
+from .decode import DETECTION_SIZE, decode_grayscale
+from .guard import StageBudget
+from .metrics import MetricsServer, prometheus_text
+from .payload import expand_box, prepare_payload
+from .phash import image_hash
+from .publisher import MQTT_CLIENTS, MQTTPublisher, PahoBackend, ServiceBackend, StreamBackend
+from .workqueue import OVERFLOW_POLICIES, AnalysisQueue
+from .vision import min_cacheable_tokens
+
+# What the scheduled app always did: JPEG-size motion test, at most one analysis a
+# minute, QoS 1, a Home Assistant event per detection and no static decorations
+SCHEDULED_DEFAULTS = {
+    'detector': 'filesize',
+    'cooldown_seconds': 60,
+    'mqtt_qos': 1,
+    'detection_event': 'camera_detection',
+    'ignore_keywords': ['decoration', 'deer', 'stag', 'reindeer', 'illuminated', 'christmas', 'holiday', 'light'],
+}
+
+
+def scheduled_args(args: Dict) -> Dict:
+    """Settings for the scheduled app: its defaults, then the user's (motion_threshold is its filesize_threshold)"""
+    config = dict(SCHEDULED_DEFAULTS)
+    config.update(args)
+    if 'motion_threshold' in args and 'filesize_threshold' not in args:
+        config['filesize_threshold'] = args['motion_threshold']
+    return config
+
+
+class MotionPipeline:
+    """Cameras, analysis queue, publisher and event store of one app instance"""
+
+    def __init__(self, args: Dict, host: Any, label: str = 'pixel-based'):
+        self.args = args
+        self.host = host
+        self.label = label
+        self.cameras: Dict[str, Camera] = {}
+        self.analyzer = None
+        self.capture_pool = None
+        self.analysis_queue = None
+        self.publisher = None
+        self.event_store = None
+        self.metrics_server = None
+
+    def log(self, message: str):
+        self.host.log(message)
+
+    def error(self, message: str):
+        self.host.error(message)
+
+    def start(self) -> bool:
+        """Build everything from the settings and schedule the checks; False on a configuration error"""
+        # Get configuration
+        self.mqtt_topic_prefix = self.args.get('mqtt_topic_prefix', 'camera_detection')
+
+        # AI analysis runs on a bounded queue so the motion loop never waits on the API
+        self.analysis_workers = self.args.get('analysis_workers', 1)
+        self.analysis_queue_size = self.args.get('analysis_queue_size', 2)
+        self.analysis_overflow = self.args.get('analysis_overflow', 'drop_oldest')
+        self.analysis_max_age = self.args.get('analysis_max_age', 60)
+
+        # Observability: per-tick log lines can be switched off; stage timings and
+        # counters are published every metrics_interval seconds (0 = never) and
+        # optionally served in Prometheus format on metrics_port (bound to metrics_host)
+        self.log_ticks = self.args.get('log_ticks', True)
+        self.metrics_interval = self.args.get('metrics_interval', 60)
+        self.metrics_port = self.args.get('metrics_port')
+        self.metrics_host = self.args.get('metrics_host', '127.0.0.1')
+        # Home Assistant event fired for every published detection (off when unset)
+        self.detection_event = self.args.get('detection_event')
+        if self.analysis_overflow not in OVERFLOW_POLICIES:
+            self.error(f"analysis_overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+            return False
+
+        # Cameras: a `cameras` list, or the app-level settings for a single camera
+        try:
+            for config in camera_configs(self.args):
+                camera = Camera(config)
+                self.cameras[camera.name] = camera
+        except (ValueError, KeyError) as e:
+            self.error(f"Invalid camera configuration: {e}")
+            return False
+
+        # One analyzer (and Anthropic client) shared by every camera
+        try:
+            self.analyzer = create_analyzer(self.args, on_change=self.publish_api_state,
+                                            log=self.log, error=self.error)
+        except ValueError as e:
+            self.error(str(e))
+            return False
+        except Exception as e:
+            self.error(f"Failed to initialize Anthropic client: {e}")
+            return False
+        if self.analyzer.name == 'anthropic':
+            self.log(f"✓ Anthropic client initialized ({self.analyzer.model}, "
+                     f"max {self.analyzer.max_tokens} output tokens)")
+            if self.analyzer.cache_prompt and not self.analyzer.prompt_cached:
+                self.log("Prompt cache not used: the prompt and tool schema are shorter than the "
+                         f"{min_cacheable_tokens(self.analyzer.model)}-token minimum the API caches")
+        else:
+            self.log(f"✓ Analyzer: {self.analyzer.name} (motion-only events)")
+
+        # Captures for all cameras share one bounded thread pool
+        self.capture_workers = self.args.get('capture_workers', min(len(self.cameras), 4))
+        self.capture_pool = ThreadPoolExecutor(
+            max_workers=max(1, self.capture_workers),
+            thread_name_prefix="camera-capture"
+        )
+
+        self.analysis_queue = AnalysisQueue(
+            self.analyze_frame,
+            workers=self.analysis_workers,
+            maxsize=self.analysis_queue_size,
+            overflow=self.analysis_overflow,
+            max_age=self.analysis_max_age,
+            log=self.log,
+            on_change=self.publish_analysis_queue,
+            on_discard=self.discard_job
+        )
+
+        # MQTT: batched outbound queue, optionally over a direct broker connection
+        self.mqtt_client = self.args.get('mqtt_client', 'service')
+        if self.mqtt_client not in MQTT_CLIENTS:
+            self.error(f"mqtt_client must be one of {', '.join(MQTT_CLIENTS)}")
+            return False
+        self.publisher = self.create_publisher()
+
+        # Local event history: triggers, detections and thumbnails (off unless a path is set)
+        event_store_path = self.args.get('event_store_path')
+        if event_store_path:
+            try:
+                from .eventstore import EventStore
+                self.event_store = EventStore(
+                    event_store_path,
+                    max_age_days=self.args.get('event_store_max_days', 30),
+                    max_mb=self.args.get('event_store_max_mb', 500),
+                    thumbnail_width=self.args.get('event_store_thumbnail_width', 160),
+                    log=self.log
+                )
+                self.log(f"✓ Event store: {event_store_path}")
+            except Exception as e:
+                self.error(f"Could not open event store at {event_store_path}: {e}")
+
+        # Publish online status
+        self.publish_status("online")
+        self.publish_api_state(self.analyzer.state())
+
+        if self.metrics_interval:
+            self.host.run_every(self.publish_metrics, f"now+{self.metrics_interval}", self.metrics_interval)
+        if self.metrics_port:
+            try:
+                self.metrics_server = MetricsServer(self.render_metrics, int(self.metrics_port), self.metrics_host)
+                self.metrics_server.start()
+                self.log(f"✓ Prometheus metrics on {self.metrics_host}:{self.metrics_port} (/metrics)")
+            except OSError as e:
+                self.error(f"Could not start metrics endpoint on {self.metrics_host}:{self.metrics_port}: {e}")
+                self.metrics_server = None
+
+        # Start periodic checking, staggered so cameras do not all capture at once
+        camera_count = len(self.cameras)
+        for index, camera in enumerate(self.cameras.values()):
+            prefix = camera.log_prefix
+            try:
+                camera.start(log=self.log)
+            except ImportError:
+                self.error(f"{prefix}motion_source '{camera.motion_source}' needs PyAV (pip install av); "
+                           f"falling back to pixel detection")
+                camera.use_pixels()
+                camera.start(log=self.log)
+            if camera.frame_reader:
+                self.log(f"{prefix}✓ Persistent RTSP stream started ({camera.stream_fps} fps)")
+            if camera.vector_reader:
+                mode = "keyframes only" if camera.vector_reader.keyframes_only else (
+                    f"motion vectors of {camera.mv_min_magnitude:g}+ px in {camera.mv_min_frames}+ frames")
+                self.log(f"{prefix}✓ Compressed-domain stream reader started ({mode})")
+            self.log(f"{prefix}✓ Checking for motion every {camera.check_interval} seconds")
+            if camera.filesize_detector is not None:
+                self.log(f"{prefix}✓ Motion threshold: {camera.filesize_threshold} bytes (file-size detector)")
+            else:
+                self.log(f"{prefix}✓ Motion threshold: {camera.motion_pixel_threshold} changed pixels")
+                self.log(f"{prefix}✓ Pixel difference: {camera.pixel_difference_threshold} brightness change")
+            self.log(f"{prefix}✓ Cooldown: {camera.cooldown_seconds} seconds")
+            if camera.filesize_detector is None:
+                self.log(f"{prefix}✓ Background model: {camera.background_model_name}")
+            if camera.roi:
+                regions = ', '.join(f"{r.name} ({r.threshold} px)" for r in camera.roi.regions)
+                self.log(f"{prefix}✓ Regions: {regions} - evaluating {camera.roi.active_fraction:.0%} of frame")
+            if camera.blob_detection:
+                max_area = f"-{camera.blob_max_area}" if camera.blob_max_area else "+"
+                self.log(f"{prefix}✓ Blob detection: trigger on blobs of {camera.blob_min_area}{max_area} pixels "
+                         f"(open {camera.blob_open}, close {camera.blob_close})")
+            if camera.cascade is not None:
+                self.log(f"{prefix}✓ Cascade: full check when {camera.cascade.min_changed}+ coarse pixels "
+                         f"change by {camera.cascade.threshold}+, refresh every {camera.cascade.refresh_every} quiet ticks")
+            if camera.preclassifier is not None:
+                self.log(f"{prefix}✓ Pre-classifier: {camera.preclassifier.model_path}, API call when "
+                         f"object score >= {camera.preclassifier.threshold}")
+            if camera.frame_ring is not None:
+                self.log(f"{prefix}✓ Analysis frames: {camera.analysis_frames} ({camera.preroll_frames} pre-roll, "
+                         f"{camera.postroll_frames} post-roll, buffer {camera.frame_ring.nbytes // 1024} KB)")
+
+            start_offset = 5 + int(index * camera.check_interval / camera_count)
+            if camera.scheduler:
+                # Each check schedules the next one with an adaptive delay
+                self.log(f"{prefix}✓ Adaptive schedule: {camera.scheduler.burst_interval}s after motion, "
+                         f"up to {camera.scheduler.idle_interval}s when idle")
+                self.host.run_in(self.schedule_check, start_offset, camera=camera.name)
+            else:
+                self.host.run_every(self.schedule_check, f"now+{start_offset}", camera.check_interval,
+                                    camera=camera.name)
+
+        self.log(f"✓ Camera Motion Detection started ({self.label}, {camera_count} camera(s))")
+        return True
+
+    def stop(self):
+        """Stop cameras, workers and the publisher (safe after a failed start)"""
+        self.log("Shutting down Camera Motion Detection")
+        for camera in self.cameras.values():
+            camera.stop()
+        if self.capture_pool:
+            self.capture_pool.shutdown(wait=False, cancel_futures=True)
+        if self.analysis_queue:
+            self.analysis_queue.stop()
+        if self.event_store:
+            self.event_store.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        self.publish_status("offline")
+        if self.publisher:
+            self.publisher.stop()
+
+    def schedule_check(self, kwargs):
+        """Timer callback: run the camera's check on the shared capture pool"""
+        camera = self.cameras[kwargs['camera']]
+        if not camera.guard.try_enter():
+            # A check is still in flight: never queue a second one behind it
+            stats = camera.guard.stats()
+            action = 'coalesced' if camera.overlap_policy == 'coalesce' else 'skipped'
+            self.log(f"{camera.log_prefix}Previous check still running, tick {action} "
+                     f"(skipped: {stats['skipped']}, coalesced: {stats['coalesced']})")
+            return
+        self.capture_pool.submit(self.run_check, kwargs)
+
+    def run_check(self, kwargs):
+        """Run one check (plus any coalesced tick), then schedule the next one if adaptive"""
+        camera = self.cameras[kwargs['camera']]
+        started = time.time()
+        try:
+            while True:
+                check_started = time.time()
+                self.check_motion(kwargs)
+                duration = time.time() - check_started
+                if duration > camera.check_interval:
+                    self.log(f"{camera.log_prefix}Check took {duration:.1f}s, longer than the "
+                             f"{camera.check_interval}s interval")
+                if not camera.guard.exit(duration, camera.check_interval):
+                    break
+                self.log(f"{camera.log_prefix}Running coalesced check")
+        finally:
+            if camera.scheduler:
+                interval = camera.scheduler.next_interval()
+                delay = max(1, round(interval - (time.time() - started)))
+                self.host.run_in(self.schedule_check, delay, camera=camera.name)
+
+    def capture_frame(self, camera: Camera, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Capture frame from RTSP as raw bytes"""
+        if camera.frame_reader:
+            # Persistent mode: read the latest-frame slot without blocking
+            frame_data = camera.frame_reader.latest_fresh(camera.max_frame_age)
+            if frame_data is None:
+                self.log(f"{camera.log_prefix}No frame from stream in the last {camera.max_frame_age}s "
+                         f"(reconnects: {camera.frame_reader.reconnects})")
+            return frame_data
+
+        try:
+            # Snapshot mode: one ffmpeg run, JPEG read straight from its stdout
+            return camera.snapshot_capture.capture(timeout)
+        except subprocess.TimeoutExpired:
+            self.log(f"{camera.log_prefix}Frame capture timeout")
+            return None
+        except Exception as e:
+            self.error(f"{camera.log_prefix}Error capturing frame: {e}")
+            return None
+
+    def save_debug_snapshot(self, camera: Camera, frame_bytes: bytes):
+        """Write a frame to debug_snapshot_dir (only when explicitly enabled)"""
+        if not camera.debug_snapshot_dir:
+            return
+        try:
+            os.makedirs(camera.debug_snapshot_dir, exist_ok=True)
+            filename = f"motion_{camera.name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jpg"
+            with open(os.path.join(camera.debug_snapshot_dir, filename), 'wb') as f:
+                f.write(frame_bytes)
+        except Exception as e:
+            self.error(f"Error saving debug snapshot: {e}")
+
+    def capture_analysis_frame(self, camera: Camera, frame_bytes: bytes,
+                               timeout: Optional[float] = None) -> Optional[bytes]:
+        """Return a full-quality JPEG for AI analysis"""
+        if camera.analysis_capture is None:
+            return frame_bytes
+        # Raw grayscale detection frames: grab a JPEG only now that it is needed
+        try:
+            return camera.analysis_capture.capture(timeout)
+        except Exception as e:
+            self.error(f"{camera.log_prefix}Error capturing frame for analysis: {e}")
+            return None
+
+    def image_to_grayscale_array(self, image_bytes: bytes, decode_mode: str = 'fast'):
+        """Convert captured frame bytes to a 320x240 grayscale numpy array for comparison"""
+        try:
+            return decode_grayscale(image_bytes, DETECTION_SIZE, decode_mode)
+        except Exception as e:
+            self.error(f"Error converting image: {e}")
+            return None
+
+    def log_tick(self, message: str):
+        """Log a line that is written on every check, unless log_ticks is off"""
+        if self.log_ticks:
+            self.log(message)
+
+    def log_region_scores(self, camera: Camera, scores: list):
+        """Log changed pixels per ROI region"""
+        triggered = [name for name, count, threshold in scores if count > threshold]
+        summary = ', '.join(f"{name}: {count}/{threshold}" for name, count, threshold in scores)
+        self.log_tick(f"{camera.log_prefix}Pixels changed in regions: {summary}")
+        if triggered:
+            self.log(f"{camera.log_prefix}Regions over threshold: {', '.join(triggered)}")
+
+    def log_blobs(self, camera: Camera, blobs: list):
+        """Log the blobs that passed the area filters"""
+        if not blobs:
+            self.log_tick(f"{camera.log_prefix}Blobs: none of {camera.blob_min_area}+ pixels")
+            return
+        largest = blobs[0]
+        self.log_tick(f"{camera.log_prefix}Blobs: {len(blobs)}, largest {largest.area} px "
+                      f"at ({largest.centroid[0]:.0f}, {largest.centroid[1]:.0f})")
+
+    def check_motion(self, kwargs):
+        """Capture frame and check for motion"""
+        camera = self.cameras[kwargs['camera']]
+        prefix = camera.log_prefix
+        budget = StageBudget(camera.tick_budget, camera.stage_budgets)
+        metrics = camera.metrics
+        metrics.increment('checks')
+        self.log_tick(f"{prefix}Checking for motion...")
+        try:
+            if camera.vector_reader is not None:
+                # Compressed domain: everything the stream reader accumulated since the last check
+                budget.start('capture')
+                sample = camera.vector_reader.consume(camera.max_frame_age)
+                budget.end()
+                if sample is None:
+                    metrics.increment('capture_failures')
+                    self.log(f"{prefix}No frame from stream in the last {camera.max_frame_age}s "
+                             f"(reconnects: {camera.vector_reader.reconnects})")
+                    return
+                current_frame_bytes = None
+                current_frame_array = sample.frame
+                if camera.frame_ring is not None:
+                    self.buffer_frame(camera, current_frame_array, None)
+                budget.start('detect')
+                detection = camera.detect_sample(sample)
+                budget.end()
+            else:
+                # Get current frame
+                budget.start('capture')
+                current_frame_bytes = self.capture_frame(camera, budget.remaining('capture'))
+                budget.end()
+                if not current_frame_bytes:
+                    if camera.capture_mode == 'file' and camera.snapshot_capture.exhausted:
+                        self.log_tick(f"{prefix}End of {camera.snapshot_url}")
+                        return
+                    metrics.increment('capture_failures')
+                    self.log(f"{prefix}Failed to capture frame")
+                    return
+                if self.budget_exhausted(camera, budget, 'detect'):
+                    return
+
+                if camera.filesize_detector is not None:
+                    # Legacy detector: compares JPEG sizes, nothing is decoded
+                    current_frame_array = None
+                    budget.start('detect')
+                    detection = camera.detect_bytes(current_frame_bytes)
+                    budget.end()
+                else:
+                    # Coarse-to-fine: most ticks end after comparing a tiny thumbnail
+                    if camera.cascade is not None:
+                        budget.start('coarse')
+                        decision = camera.cascade.check(coarse_grayscale(current_frame_bytes, camera.decode_mode))
+                        budget.end()
+                        metrics.increment(f"cascade_{decision}")
+                        if decision != 'passed':
+                            if camera.scheduler:
+                                camera.scheduler.record(False)
+                            frame = None
+                            if decision == 'refresh':
+                                # Refresh ticks keep the background model current
+                                frame = self.image_to_grayscale_array(current_frame_bytes, camera.decode_mode)
+                                if frame is not None:
+                                    camera.learn(frame)
+                            if camera.frame_ring is not None:
+                                # Quiet frames go into the pre-roll undecoded; only a trigger decodes them
+                                self.buffer_frame(camera, frame, current_frame_bytes)
+                            self.log_tick(f"{prefix}No significant motion detected (coarse: "
+                                          f"{camera.cascade.last_changed}/{camera.cascade.min_changed})")
+                            return
+
+                    # Convert to grayscale array
+                    budget.start('decode')
+                    current_frame_array = self.image_to_grayscale_array(current_frame_bytes, camera.decode_mode)
+                    budget.end()
+                    if current_frame_array is None:
+                        metrics.increment('decode_failures')
+                        self.log(f"{prefix}Failed to convert frame to array")
+                        return
+
+                    if camera.frame_ring is not None:
+                        self.buffer_frame(camera, current_frame_array, current_frame_bytes)
+                    if self.budget_exhausted(camera, budget, 'detect'):
+                        return
+
+                    # Compare against the background model (updates it in place)
+                    budget.start('detect')
+                    detection = camera.detect(current_frame_array)
+                    budget.end()
+            if detection is not None:
+                motion_triggered = detection.triggered
+                changed_pixels = detection.changed_pixels
+                avg_change = detection.avg_change
+
+                if detection.region_scores is not None:
+                    self.log_region_scores(camera, detection.region_scores)
+                elif camera.filesize_detector is not None:
+                    self.log_tick(f"{prefix}Frame difference: {changed_pixels} bytes (threshold: {camera.filesize_threshold})")
+                else:
+                    self.log_tick(f"{prefix}Pixels changed: {changed_pixels} (threshold: {camera.motion_pixel_threshold}), avg change: {avg_change:.1f}")
+                if detection.blobs is not None:
+                    self.log_blobs(camera, detection.blobs)
+                if camera.scheduler:
+                    camera.scheduler.record(motion_triggered)
+
+                if motion_triggered:
+                    # Check cooldown
+                    current_time = camera.clock()
+                    if current_time - camera.last_analysis_time >= camera.cooldown_seconds:
+                        if camera.filesize_detector is not None:
+                            self.log(f"{prefix}🎯 Motion detected! Frame size changed by {changed_pixels} bytes")
+                        else:
+                            self.log(f"{prefix}🎯 Motion detected! {changed_pixels} pixels changed (avg: {avg_change:.1f})")
+                        metrics.increment('triggers')
+                        with metrics.timer('publish'):
+                            self.publish_motion(camera, detection.blobs)
+                        camera.last_analysis_time = current_time
+                        event_id = None
+                        motion_box = camera.motion_box()
+                        if self.event_store is not None:
+                            event_id = self.event_store.record_trigger(
+                                camera.name, changed_pixels, avg_change, detection.blobs, current_frame_array,
+                                timestamp=current_time, crop=motion_box)
+
+                        # Same scene as a recent analysis: republish its result instead of calling the API
+                        frame_hash = None
+                        if camera.result_cache is not None and detection.region is not None:
+                            frame_hash = image_hash(detection.region, camera.result_cache_hash)
+                            cached = camera.result_cache.lookup(frame_hash)
+                            self.publish_cache_stats(camera)
+                            if cached is not None:
+                                metrics.increment('cache_hits')
+                                self.log(f"{prefix}Scene matches a recent analysis, reusing cached result")
+                                self.handle_result(camera, cached, event_id, status='cached')
+                                return
+
+                        # Local pre-classifier: crops that look empty are not worth an API call
+                        if camera.preclassifier is not None and current_frame_array is not None:
+                            if self.budget_exhausted(camera, budget, 'classify', event_id):
+                                return
+                            budget.start('classify')
+                            label, score = camera.preclassifier.classify(current_frame_array, motion_box)
+                            budget.end()
+                            if score < camera.preclassifier.threshold:
+                                metrics.increment('preclassifier_rejected')
+                                self.log(f"{prefix}Pre-classifier: {label} (object score {score:.2f} < "
+                                         f"{camera.preclassifier.threshold}), skipping AI analysis")
+                                self.record_result(event_id, [], f"Pre-classifier: {label} ({score:.2f})", 'filtered')
+                                return
+                            metrics.increment('preclassifier_passed')
+                            self.log_tick(f"{prefix}Pre-classifier: {label} (object score {score:.2f})")
+
+                        # API unhealthy, over budget, rate limited or no analyzer: the motion event
+                        # above is all we publish. The rate-limit token is taken now, not on the worker
+                        unavailable = self.analyzer.reserve()
+                        if unavailable:
+                            metrics.increment('api_skipped')
+                            self.log(f"{prefix}AI analysis unavailable ({unavailable}), motion-only event")
+                            self.record_result(event_id, [], f"AI analysis unavailable: {unavailable}", 'skipped')
+                            return
+
+                        if self.budget_exhausted(camera, budget, 'analysis_capture', event_id):
+                            self.analyzer.release()
+                            return
+                        budget.start('analysis_capture')
+                        analysis_frame = self.capture_analysis_frame(camera, current_frame_bytes,
+                                                                     budget.remaining('analysis_capture'))
+                        budget.end()
+                        if analysis_frame:
+                            job = {
+                                "camera": camera.name,
+                                "frame": analysis_frame,
+                                "crop_box": camera.payload_crop_box(),
+                                "hash": frame_hash,
+                                "event_id": event_id,
+                                "reserved": True
+                            }
+                            if camera.frame_ring is not None and camera.postroll_frames:
+                                # Hold the job until the post-roll frames are in the buffer
+                                if camera.pending_job is None:
+                                    camera.pending_job = job
+                                    camera.postroll_remaining = camera.postroll_frames
+                                    self.log(f"{prefix}Collecting {camera.postroll_frames} post-roll frame(s) before analysis")
+                                else:
+                                    self.analyzer.release()
+                            else:
+                                self.submit_analysis(camera, job)
+                        else:
+                            self.analyzer.release()
+                    else:
+                        metrics.increment('cooldown_suppressed')
+                        remaining = int(camera.cooldown_seconds - (current_time - camera.last_analysis_time))
+                        self.log(f"{prefix}Motion detected but in cooldown ({remaining}s remaining)")
+                else:
+                    self.log_tick(f"{prefix}No significant motion detected")
+
+            else:
+                self.log(f"{prefix}First frame captured, establishing baseline")
+
+        except Exception as e:
+            self.error(f"{prefix}Error checking motion: {e}")
+            self.error(traceback.format_exc())
+        finally:
+            metrics.observe_all(budget.timings)
+            metrics.observe('check', budget.elapsed())
+            if budget.overruns:
+                over = ', '.join(f"{stage} {budget.timings[stage]:.2f}s (budget {budget.budgets[stage]}s)"
+                                 for stage in budget.overruns)
+                self.log(f"{prefix}Stages over budget: {over}")
+
+    def budget_exhausted(self, camera: Camera, budget: StageBudget, stage: str,
+                         event_id: Optional[int] = None) -> bool:
+        """Skip (log, count and, for a trigger, record) the rest of a check whose tick budget is used up"""
+        if not budget.skip_if_expired(stage):
+            return False
+        camera.metrics.increment('budget_skipped')
+        self.log(f"{camera.log_prefix}Check used its whole {camera.tick_budget}s budget, "
+                 f"skipping {stage} and later stages")
+        self.record_result(event_id, [], f"Tick budget used up before {stage}", 'skipped')
+        return True
+
+    def buffer_frame(self, camera: Camera, frame, frame_bytes: Optional[bytes]):
+        """Keep the full frame for pre/post-roll (raw and stream-reader frames have no JPEG of their own)
+
+        Without a decoded frame the captured bytes are kept and decoded if a trigger reads them.
+        """
+        jpeg = None if camera.decode_mode == 'raw' else frame_bytes
+        if frame is None:
+            camera.frame_ring.push_encoded(frame_bytes, jpeg)
+        else:
+            camera.frame_ring.push(frame, jpeg)
+        if camera.pending_job is not None:
+            camera.postroll_remaining -= 1
+            if camera.postroll_remaining <= 0:
+                job, camera.pending_job = camera.pending_job, None
+                self.submit_analysis(camera, job, camera.postroll_frames)
+
+    def submit_analysis(self, camera: Camera, job: Dict, postroll: int = 0):
+        """Attach the buffered pre/post-roll frames to a job and queue it"""
+        if camera.frame_ring is not None:
+            sequence = camera.frame_ring.recent(camera.preroll_frames + 1 + postroll)
+            job['sequence'] = sequence
+            job['trigger_index'] = max(0, len(sequence) - 1 - postroll)
+        if not self.analysis_queue.submit(job):
+            camera.metrics.increment('queue_dropped')
+            self.log(f"{camera.log_prefix}Analysis queue full, frame dropped")
+
+    def discard_job(self, job: Dict):
+        """A queued job was dropped or expired: its reserved API call will not happen"""
+        if job.get('reserved'):
+            job['reserved'] = False
+            self.analyzer.release()
+
+    def prepare_analysis_payload(self, camera: Camera, frame_bytes: bytes, crop_box) -> bytes:
+        """Crop, downscale and re-encode the frame according to the camera's payload settings"""
+        try:
+            payload = prepare_payload(
+                frame_bytes,
+                crop_box=crop_box,
+                margin=camera.payload_margin,
+                max_edge=camera.payload_max_edge,
+                quality=camera.payload_quality
+            )
+        except Exception as e:
+            self.error(f"{camera.log_prefix}Error preparing payload, sending original frame: {e}")
+            return frame_bytes
+        if payload is not frame_bytes:
+            self.log(f"{camera.log_prefix}Payload: {len(frame_bytes)} -> {len(payload)} bytes")
+        return payload
+
+    def analyze_frame(self, job: Dict):
+        """Analyze a queued frame job with the configured analyzer"""
+        camera = self.cameras[job['camera']]
+        prefix = camera.log_prefix
+        frame_bytes = job['frame']
+        sequence = job.get('sequence')
+        metrics = camera.metrics
+        try:
+            payload_started = time.perf_counter()
+            note = None
+            if sequence and camera.analysis_frames == 'contact_sheet':
+                from .ringbuffer import contact_sheet
+                self.log(f"{prefix}Analyzing contact sheet of {len(sequence)} frames...")
+                crop_box = job['crop_box']
+                if crop_box:
+                    crop_box = expand_box(crop_box, camera.payload_margin)
+                # Already cropped, scaled and encoded at the payload settings: no second encode
+                images = [contact_sheet([frame for _, frame, _ in sequence], crop_box=crop_box,
+                                        quality=camera.payload_quality, max_edge=camera.payload_max_edge)]
+                self.log(f"{prefix}Payload: contact sheet {len(images[0])} bytes")
+                note = (f"The image is a contact sheet of {len(sequence)} consecutive grayscale frames, "
+                        f"oldest first, left to right then top to bottom. Frame {job['trigger_index'] + 1} "
+                        f"triggered motion detection.")
+                trigger = 0
+            elif sequence:
+                from .ringbuffer import encode_gray
+                self.log(f"{prefix}Analyzing sequence of {len(sequence)} frames...")
+                images = []
+                for index, (_, frame, jpeg) in enumerate(sequence):
+                    if index == job['trigger_index']:
+                        jpeg = frame_bytes
+                    images.append(self.prepare_analysis_payload(
+                        camera, jpeg or encode_gray(frame, camera.payload_quality), job['crop_box']))
+                note = (f"The {len(images)} images are consecutive frames from the same camera, oldest first. "
+                        f"Frame {job['trigger_index'] + 1} triggered motion detection.")
+                trigger = job['trigger_index']
+            else:
+                self.log(f"{prefix}Analyzing frame ({len(frame_bytes)} bytes)...")
+                images = [self.prepare_analysis_payload(camera, frame_bytes, job['crop_box'])]
+                trigger = 0
+            self.save_debug_snapshot(camera, images[trigger])
+
+            # Convert to base64
+            images_base64 = [base64.b64encode(image).decode('utf-8') for image in images]
+            metrics.observe('payload', time.perf_counter() - payload_started)
+
+            # Analyze with AI
+            with metrics.timer('api'):
+                reserved, job['reserved'] = job.get('reserved', False), False
+                result = self.analyzer.analyze(images_base64, note, reserved)
+            if result.get('skipped'):
+                metrics.increment('api_skipped')
+                self.log(f"{prefix}{result['summary']}, motion-only event")
+                self.record_result(job.get('event_id'), [], result['summary'], 'skipped')
+                return
+            metrics.increment('analyses')
+            if result.get('error'):
+                metrics.increment('api_errors')
+            for name, tokens in result.pop('usage', {}).items():
+                metrics.increment(name, tokens)
+
+            # Remember successful results for this scene
+            if camera.result_cache is not None and job['hash'] is not None and result and not result.get('error'):
+                camera.result_cache.store(job['hash'], result)
+
+            self.handle_result(camera, result, job.get('event_id'))
+
+        except Exception as e:
+            self.error(f"{prefix}Error analyzing frame: {e}")
+            self.error(traceback.format_exc())
+            self.discard_job(job)
+
+    def handle_result(self, camera: Camera, result: Dict, event_id: Optional[int] = None,
+                      status: str = 'analyzed'):
+        """Log an analysis result, publish its detections and add them to the event store"""
+        prefix = camera.log_prefix
+        detections = []
+        for detection in (result or {}).get('detections', []):
+            description = detection.get('description', '')
+            if any(keyword in description.lower() for keyword in camera.ignore_keywords):
+                self.log(f"{prefix}Ignoring {detection.get('type', 'unknown')}: {description}")
+                continue
+            detections.append(detection)
+        if result:
+            self.record_result(event_id, detections, result.get('summary', ''),
+                               'error' if result.get('error') else status)
+        if result and 'detections' in result:
+            self.log(f"{prefix}Analysis complete: {result.get('summary', 'No summary')}")
+
+            # Process detections
+            for detection in detections:
+                obj_type = detection.get('type', 'unknown')
+                location = detection.get('location', 'unknown')
+                description = detection.get('description', '')
+
+                self.log(f"{prefix}Detected [{location.upper()}]: {obj_type} - {description}")
+
+                # Publish to MQTT
+                with camera.metrics.timer('publish'):
+                    self.publish_detection(camera, detection)
+                if self.detection_event:
+                    self.host.fire_event(self.detection_event, camera=camera.name, type=obj_type,
+                                         location=location, description=description,
+                                         confidence=detection.get('confidence', 0))
+        else:
+            self.log(f"{prefix}No detections in analysis result")
+
+    def record_result(self, event_id: Optional[int], detections: List[Dict], summary: str, status: str):
+        """Store the outcome of a trigger (queued; never blocks)"""
+        if self.event_store is not None and event_id is not None:
+            self.event_store.record_result(event_id, detections, summary, status)
+
+    def create_publisher(self) -> MQTTPublisher:
+        """Outbound MQTT queue over a direct broker connection, stdout, or Home Assistant's mqtt.publish service"""
+        backend = None
+        if self.mqtt_client == 'direct':
+            host = self.args.get('mqtt_host', 'core-mosquitto')
+            port = self.args.get('mqtt_port', 1883)
+            try:
+                backend = PahoBackend(
+                    host,
+                    port=port,
+                    username=self.args.get('mqtt_username'),
+                    password=self.args.get('mqtt_password'),
+                    client_id=f"camera_detection_{getattr(self.host, 'name', 'app')}",
+                    will={"topic": f"{self.mqtt_topic_prefix}/status", "payload": "offline", "retain": True},
+                    connect_timeout=self.args.get('mqtt_connect_timeout', 5),
+                    log=self.log
+                )
+                self.log(f"✓ MQTT: direct connection to {host}:{port}")
+            except ImportError:
+                self.log("paho-mqtt is not installed, publishing through Home Assistant instead")
+            except Exception as e:
+                self.error(f"Could not connect to MQTT broker {host}:{port}, publishing through Home Assistant instead: {e}")
+        elif self.mqtt_client == 'stdout':
+            backend = StreamBackend()
+        if backend is None:
+            backend = ServiceBackend(self.host.call_service)
+        return MQTTPublisher(
+            backend,
+            qos=self.args.get('mqtt_qos', 0),
+            batch_interval=self.args.get('mqtt_batch_interval', 0.05),
+            max_queue=self.args.get('mqtt_max_queue', 1000),
+            log=self.log
+        )
+
+    def mqtt_publish(self, topic: str, payload: str, retain: bool = False):
+        """Queue an MQTT message (straight to the service before the publisher exists)"""
+        if self.publisher is None:
+            self.host.call_service("mqtt/publish", topic=topic, payload=payload, retain=retain)
+        else:
+            self.publisher.publish(topic, payload, retain=retain)
+
+    def publish_motion(self, camera: Camera, blobs: Optional[list] = None):
+        """Publish motion event (and blob boxes, with blob detection on) to MQTT"""
+        try:
+            topic = f"{camera.mqtt_topic_prefix}/motion/binary"
+            self.mqtt_publish(topic, "ON", retain=False)
+            if blobs:
+                # Boxes and centroids as fractions 0-1 of the frame, area in detection pixels
+                width, height = DETECTION_SIZE
+                payload = {
+                    "camera": camera.name,
+                    "blobs": [
+                        {
+                            "area": blob.area,
+                            "box": [round(blob.box[0] / width, 4), round(blob.box[1] / height, 4),
+                                    round(blob.box[2] / width, 4), round(blob.box[3] / height, 4)],
+                            "centroid": [round(blob.centroid[0] / width, 4), round(blob.centroid[1] / height, 4)]
+                        }
+                        for blob in blobs
+                    ],
+                    "timestamp": datetime.now().isoformat()
+                }
+                self.mqtt_publish(f"{camera.mqtt_topic_prefix}/motion/blobs", json.dumps(payload), retain=False)
+        except Exception as e:
+            self.error(f"Error publishing motion: {e}")
+
+    def publish_detection(self, camera: Camera, detection: Dict):
+        """Publish detection to MQTT"""
+        try:
+            # Publish to specific topic
+            location = detection.get('location', 'unknown')
+            obj_type = detection.get('type', 'unknown')
+            topic = f"{camera.mqtt_topic_prefix}/{location}/{obj_type}"
+
+            self.mqtt_publish(topic, json.dumps(detection), retain=False)
+
+            # Also publish to last_detection topic
+            topic = f"{camera.mqtt_topic_prefix}/last_detection"
+            payload = {
+                "camera": camera.name,
+                "type": obj_type,
+                "location": location,
+                "description": detection.get('description', ''),
+                "confidence": detection.get('confidence', 0),
+                "timestamp": datetime.now().isoformat()
+            }
+
+            self.mqtt_publish(topic, json.dumps(payload), retain=True)
+
+        except Exception as e:
+            self.error(f"Error publishing detection: {e}")
+
+    def publish_analysis_queue(self, stats: Dict):
+        """Publish analysis queue depth and counters to MQTT"""
+        try:
+            topic = f"{self.mqtt_topic_prefix}/analysis/queue"
+            self.mqtt_publish(topic, json.dumps(stats), retain=True)
+        except Exception as e:
+            self.error(f"Error publishing analysis queue state: {e}")
+
+    def publish_api_state(self, state: Dict):
+        """Publish vision API health, budget and breaker state to MQTT"""
+        try:
+            topic = f"{self.mqtt_topic_prefix}/analysis/api"
+            self.mqtt_publish(topic, json.dumps(state), retain=True)
+        except Exception as e:
+            self.error(f"Error publishing API state: {e}")
+
+    def publish_cache_stats(self, camera: Camera):
+        """Publish result cache hit/miss counters to MQTT"""
+        try:
+            topic = f"{camera.mqtt_topic_prefix}/analysis/cache"
+            self.mqtt_publish(topic, json.dumps(camera.result_cache.stats()), retain=True)
+        except Exception as e:
+            self.error(f"Error publishing cache stats: {e}")
+
+    def publish_metrics(self, kwargs=None):
+        """Publish each camera's stage timings and counters to <prefix>/metrics"""
+        for camera in self.cameras.values():
+            try:
+                payload = camera.metrics.snapshot()
+                payload["guard"] = camera.guard.stats()
+                payload["mqtt"] = self.publisher.stats()
+                if self.event_store is not None:
+                    payload["event_store"] = self.event_store.stats()
+                payload["timestamp"] = datetime.now().isoformat()
+                self.mqtt_publish(f"{camera.mqtt_topic_prefix}/metrics", json.dumps(payload), retain=False)
+            except Exception as e:
+                self.error(f"Error publishing metrics: {e}")
+
+    def render_metrics(self) -> str:
+        """Prometheus text for every camera (called from the metrics endpoint thread)"""
+        return prometheus_text({name: camera.metrics.snapshot() for name, camera in self.cameras.items()})
+
+    def publish_status(self, status: str):
+        """Publish online/offline status"""
+        try:
+            topic = f"{self.mqtt_topic_prefix}/status"
+            self.mqtt_publish(topic, status, retain=True)
+        except Exception as e:
+            self.error(f"Error publishing status: {e}")
@@ -0,0 +1,268 @@
+"""
+MQTT publishing
+A background outbound queue that batches messages and coalesces retained topics, in front
+of either Home Assistant's mqtt.publish service or a direct, persistent broker connection
+(or stdout, for headless runs)
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, TextIO
+
+MQTT_CLIENTS = ('service', 'direct', 'stdout')
+
+
+class ServiceBackend:
+    """Publish through Home Assistant's mqtt/publish service (AppDaemon call_service)"""
+
+    name = 'service'
+
+    def __init__(self, call_service: Callable[..., Any]):
+        self.call_service = call_service
+
+    def send(self, topic: str, payload: str, retain: bool = False, qos: int = 0):
+        self.call_service("mqtt/publish", topic=topic, payload=payload, retain=retain, qos=qos)
+
+    def close(self):
+        pass
+
+
+class MemoryBroker:
+    """In-process broker stand-in: keeps every message and the retained value per topic
+
+    Useful to test the publisher (or the app) without a real broker.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self.messages: List[Dict] = []
+        self.retained: Dict[str, str] = {}
+        self.subscribers: List[Callable[[Dict], None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        self.subscribers.append(callback)
+
+    def send(self, topic: str, payload: str, retain: bool = False, qos: int = 0):
+        message = {"topic": topic, "payload": payload, "retain": retain, "qos": qos}
+        with self._lock:
+            self.messages.append(message)
+            if retain:
+                self.retained[topic] = payload
+        for callback in self.subscribers:
+            callback(message)
+
+    def close(self):
+        pass
+
+
+class StreamBackend:
+    """Write every message as one JSON line to a text stream (stdout by default)"""
+
+    name = 'stdout'
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stdout
+
+    def send(self, topic: str, payload: str, retain: bool = False, qos: int = 0):
+        self.stream.write(json.dumps({"topic": topic, "payload": payload, "retain": retain}) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class PahoBackend:
+    """Direct broker connection with paho-mqtt, kept open and reconnected in the background
+
+    paho-mqtt is optional; constructing this raises ImportError when it is missing,
+    and ConnectionError when the broker does not accept the connection within
+    connect_timeout seconds, so the caller can fall back to another backend.
+    The will message (e.g. status "offline") is published by the broker if the
+    connection drops without a clean disconnect.
+    """
+
+    name = 'direct'
+
+    def __init__(self, host: str, port: int = 1883, username: Optional[str] = None,
+                 password: Optional[str] = None, client_id: str = '', keepalive: int = 60,
+                 will: Optional[Dict] = None, max_queued: int = 1000, connect_timeout: float = 5.0,
+                 log: Optional[Callable[[str], None]] = None):
+        import paho.mqtt.client as mqtt
+
+        self.log = log
+        self._no_connection = mqtt.MQTT_ERR_NO_CONN
+        if hasattr(mqtt, 'CallbackAPIVersion'):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+        else:
+            self.client = mqtt.Client(client_id=client_id)
+        if username:
+            self.client.username_pw_set(username, password)
+        if will:
+            self.client.will_set(will['topic'], will['payload'], qos=will.get('qos', 0),
+                                 retain=will.get('retain', True))
+        # paho buffers QoS>0 messages while reconnecting; bound that buffer
+        self.client.max_queued_messages_set(max_queued)
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+
+        # connect_async never fails by itself: wait for the broker's answer
+        self._connected = threading.Event()
+        self._refused = None
+        self.client.on_connect = self._on_connect
+        self.client.connect_async(host, port, keepalive)
+        self.client.loop_start()
+        if not self._connected.wait(connect_timeout) or self._refused is not None:
+            self.client.disconnect()
+            self.client.loop_stop()
+            if self._refused is not None:
+                raise ConnectionError(f"connection refused ({self._refused})")
+            raise ConnectionError(f"no answer within {connect_timeout}s")
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        # VERSION2 passes a ReasonCode, paho 1.x an int
+        failed = reason_code.is_failure if hasattr(reason_code, 'is_failure') else reason_code != 0
+        if not self._connected.is_set():
+            self._refused = reason_code if failed else None
+            self._connected.set()
+        elif failed and self.log:
+            self.log(f"MQTT broker refused the reconnection ({reason_code})")
+
+    def send(self, topic: str, payload: str, retain: bool = False, qos: int = 0):
+        info = self.client.publish(topic, payload, qos=qos, retain=retain)
+        if info.rc in (0, None):
+            return
+        if qos and info.rc == self._no_connection:
+            # paho keeps QoS>0 messages (up to max_queued) and sends them after reconnecting
+            if self.log:
+                self.log(f"MQTT broker disconnected, {topic} queued until it reconnects")
+            return
+        raise ConnectionError(f"MQTT publish to {topic} failed (rc={info.rc})")
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+
+class MQTTPublisher:
+    """Outbound MQTT queue drained by one background thread
+
+    publish() never blocks on the network. Messages are sent in batches every
+    batch_interval seconds; a retained topic that is published again before its
+    previous value went out is updated in place, so only the latest value is
+    sent. When more than max_queue messages are waiting the oldest are dropped.
+    """
+
+    def __init__(self, backend, qos: int = 0, batch_interval: float = 0.05, max_queue: int = 1000,
+                 log: Optional[Callable[[str], None]] = None):
+        self.backend = backend
+        self.qos = qos
+        self.batch_interval = batch_interval
+        self.max_queue = max_queue
+        self.log = log
+
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._queue: Deque[List] = deque()
+        self._retained: Dict[str, List] = {}
+        self._sending = False
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='mqtt-publisher', daemon=True)
+        self._thread.start()
+
+    def publish(self, topic: str, payload: str, retain: bool = False, qos: Optional[int] = None):
+        """Queue a message; returns immediately"""
+        qos = self.qos if qos is None else qos
+        with self._condition:
+            if self._stopping:
+                return
+            pending = self._retained.get(topic) if retain else None
+            if pending is not None:
+                pending[1] = payload
+                pending[3] = max(pending[3], qos)
+                self.coalesced += 1
+                return
+            entry = [topic, payload, retain, qos]
+            self._queue.append(entry)
+            if retain:
+                self._retained[topic] = entry
+            while len(self._queue) > self.max_queue:
+                oldest = self._queue.popleft()
+                if oldest[2] and self._retained.get(oldest[0]) is oldest:
+                    del self._retained[oldest[0]]
+                self.dropped += 1
+            self._condition.notify()
+
+    @property
+    def depth(self) -> int:
+        with self._condition:
+            return len(self._queue)
+
+    def stats(self) -> Dict:
+        with self._condition:
+            return {
+                "backend": self.backend.name,
+                "depth": len(self._queue),
+                "sent": self.sent,
+                "batches": self.batches,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "failed": self.failed
+            }
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything queued so far has been handed to the backend"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while (self._queue or self._sending) and time.monotonic() < deadline:
+                self._condition.wait(0.05)
+            return not (self._queue or self._sending)
+
+    def stop(self, timeout: float = 5.0):
+        """Send what is still queued, then close the backend"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        self.backend.close()
+
+    def _take_batch(self) -> List[List]:
+        with self._condition:
+            while not self._queue and not self._stopping:
+                self._condition.wait()
+        if self.batch_interval and not self._stopping:
+            # Let a burst (motion + detections + queue/cache stats) collect into one batch
+            time.sleep(self.batch_interval)
+        with self._condition:
+            batch = list(self._queue)
+            self._queue.clear()
+            self._retained.clear()
+            self._sending = bool(batch)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            for topic, payload, retain, qos in batch:
+                try:
+                    self.backend.send(topic, payload, retain=retain, qos=qos)
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    if self.log:
+                        self.log(f"MQTT publish to {topic} failed: {e}")
+            with self._condition:
+                if batch:
+                    self.batches += 1
+                self._sending = False
+                self._condition.notify_all()
+                if self._stopping and not self._queue:
+                    return
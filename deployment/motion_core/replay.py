@@ -0,0 +1,182 @@
+"""
+Offline replay and threshold tuning
+Replays recorded footage through the detection core and sweeps a grid of settings in parallel
+
+    cd deployment
+    python -m motion_core.replay driveway.mp4 --interval 2 \
+        --grid '{"motion_pixel_threshold": [500, 1000, 2000], "pixel_difference_threshold": [20, 30, 40]}'
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .camera import Camera, camera_configs
+from .capture import IMAGE_EXTENSIONS
+from .decode import DETECTION_SIZE, decode_grayscale
+
+# Set in each worker process by _attach_frames
+_frames: Optional[np.ndarray] = None
+_timestamps: Optional[np.ndarray] = None
+_shared: Optional[shared_memory.SharedMemory] = None
+
+
+def load_video(path: str, interval: float = 1.0, size: Tuple[int, int] = DETECTION_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode a video (or stream URL) once into a (N, H, W) uint8 array, one frame per interval seconds"""
+    width, height = size
+    command = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error', '-i', path,
+        '-vf', f"fps=1/{interval:g},scale={width}:{height}:flags=area,format=gray",
+        '-f', 'rawvideo', 'pipe:1'
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    frame_bytes = width * height
+    count = len(result.stdout) // frame_bytes
+    frames = np.frombuffer(result.stdout, dtype=np.uint8, count=count * frame_bytes).reshape(count, height, width)
+    return frames, np.arange(count, dtype=np.float64) * interval
+
+
+def load_directory(path: str, interval: float = 1.0, size: Tuple[int, int] = DETECTION_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode a directory of frames (file name order, interval seconds apart) into a (N, H, W) array"""
+    names = sorted(name for name in os.listdir(path) if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not names:
+        raise ValueError(f"no image files in {path}")
+    width, height = size
+    frames = np.empty((len(names), height, width), dtype=np.uint8)
+    for index, name in enumerate(names):
+        with open(os.path.join(path, name), 'rb') as f:
+            frames[index] = decode_grayscale(f.read(), size)
+    return frames, np.arange(len(names), dtype=np.float64) * interval
+
+
+def load_frames(source: str, interval: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Frames and their timestamps (seconds from the start) from a video file or frame directory"""
+    if os.path.isdir(source):
+        return load_directory(source, interval)
+    return load_video(source, interval)
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """Every combination of the grid's values, e.g. {'a': [1, 2], 'b': [3]} -> [{a: 1, b: 3}, {a: 2, b: 3}]"""
+    keys = list(grid)
+    values = [grid[key] if isinstance(grid[key], list) else [grid[key]] for key in keys]
+    return [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+
+
+def replay(frames: np.ndarray, timestamps: np.ndarray, settings: Dict) -> Dict:
+    """Run frames through a camera built from settings; return its trigger timeline and counts
+
+    A trigger is a motion frame outside the cooldown, i.e. a frame that would
+    have been sent for AI analysis.
+    """
+    config = {'snapshot_url': 'replay://', 'cooldown_seconds': 0}
+    config.update(settings)
+    camera = Camera(camera_configs(config)[0])
+
+    motion_frames = 0
+    last_trigger = None
+    triggers = []
+    for index in range(len(frames)):
+        detection = camera.detect(frames[index])
+        if detection is None or not detection.triggered:
+            continue
+        motion_frames += 1
+        timestamp = float(timestamps[index])
+        if last_trigger is None or timestamp - last_trigger >= camera.cooldown_seconds:
+            last_trigger = timestamp
+            trigger = {"frame": index, "time": timestamp, "changed_pixels": detection.changed_pixels}
+            if detection.blobs is not None:
+                trigger["blobs"] = [blob.box for blob in detection.blobs]
+            triggers.append(trigger)
+
+    return {
+        "settings": settings,
+        "frames": len(frames),
+        "motion_frames": motion_frames,
+        "triggers": len(triggers),
+        "timeline": triggers
+    }
+
+
+def _attach_frames(name: str, shape: Tuple[int, ...], timestamps: np.ndarray):
+    """Worker initializer: map the shared frame array instead of copying it"""
+    global _frames, _timestamps, _shared
+    _shared = shared_memory.SharedMemory(name=name)
+    _frames = np.ndarray(shape, dtype=np.uint8, buffer=_shared.buf)
+    _timestamps = timestamps
+
+
+def _replay_shared(settings: Dict) -> Dict:
+    return replay(_frames, _timestamps, settings)
+
+
+def sweep(frames: np.ndarray, timestamps: np.ndarray, grid: Dict[str, List], base: Optional[Dict] = None,
+          workers: Optional[int] = None) -> List[Dict]:
+    """Replay every grid combination (on top of base settings) across a process pool
+
+    The frames are decoded once and placed in shared memory; workers map them
+    read-only, so each setting costs detection time only.
+    """
+    combinations = [dict(base or {}, **combination) for combination in expand_grid(grid)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(combinations) == 1:
+        return [replay(frames, timestamps, settings) for settings in combinations]
+
+    shared = shared_memory.SharedMemory(create=True, size=max(1, frames.nbytes))
+    try:
+        np.ndarray(frames.shape, dtype=np.uint8, buffer=shared.buf)[:] = frames
+        with ProcessPoolExecutor(max_workers=min(workers, len(combinations)), initializer=_attach_frames,
+                                 initargs=(shared.name, frames.shape, timestamps)) as pool:
+            return list(pool.map(_replay_shared, combinations))
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def _format_settings(settings: Dict, keys: List[str]) -> str:
+    return ' '.join(f"{key}={json.dumps(settings.get(key))}" for key in keys)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay recorded footage and sweep detection settings")
+    parser.add_argument('source', help="video file, stream URL or directory of frames")
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help="seconds between checks (one frame is sampled per interval)")
+    parser.add_argument('--settings', default='{}', help="JSON dict of fixed app settings")
+    parser.add_argument('--grid', default='{}', help="JSON dict of setting -> list of values to sweep")
+    parser.add_argument('--workers', type=int, default=0, help="processes (default: all CPU cores)")
+    parser.add_argument('--timeline', action='store_true', help="print trigger times for each setting")
+    parser.add_argument('--json', help="write every result (with timelines) to this file")
+    args = parser.parse_args(argv)
+
+    frames, timestamps = load_frames(args.source, args.interval)
+    grid = json.loads(args.grid)
+    print(f"Loaded {len(frames)} frames ({frames.nbytes / 2 ** 20:.1f} MB), "
+          f"{len(expand_grid(grid))} setting(s)", file=sys.stderr)
+    results = sweep(frames, timestamps, grid, json.loads(args.settings), args.workers or None)
+
+    keys = list(grid)
+    for result in sorted(results, key=lambda r: r['triggers']):
+        print(f"{result['triggers']:>6} triggers {result['motion_frames']:>6} motion frames  "
+              f"{_format_settings(result['settings'], keys)}")
+        if args.timeline:
+            times = ', '.join(f"{trigger['time']:.0f}s" for trigger in result['timeline'])
+            print(f"       {times}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
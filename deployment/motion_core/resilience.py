@@ -0,0 +1,309 @@
+"""
+Vision API protection
+Token-bucket rate limit, daily call/spend budget, jittered retries and a circuit breaker,
+shared by every camera so an API outage cannot slow detection or run up the bill
+"""
+
+import random
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+# HTTP statuses worth retrying (timeout, conflict, rate limit, server errors, overloaded)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERRORS = ('APIConnectionError', 'APITimeoutError', 'ConnectionError', 'TimeoutError')
+
+# USD per million tokens (Claude 3.5 Haiku); cache writes cost 1.25x input, cache reads 0.1x
+DEFAULT_PRICES = {
+    "input_tokens": 0.80,
+    "output_tokens": 4.00,
+    "cache_write_tokens": 1.00,
+    "cache_read_tokens": 0.08,
+}
+
+
+class APIUnavailable(Exception):
+    """The call was not attempted: rate limited, over budget or circuit open"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient network/server errors; client errors (bad request, auth) are not retried"""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def retry_delay(attempt: int, base: float = 1.0, maximum: float = 30.0,
+                rng: Callable[[], float] = random.random) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(maximum, base * 2**attempt)]"""
+    return rng() * min(maximum, base * 2 ** attempt)
+
+
+class TokenBucket:
+    """Allows `rate` calls per minute on average with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+
+    def try_acquire(self) -> bool:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate / 60.0)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def give_back(self):
+        """Return an acquired token that was not used"""
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class DailyBudget:
+    """Caps calls and estimated spend per calendar day (0 = no limit)"""
+
+    def __init__(self, max_calls: int = 0, max_cost: float = 0.0,
+                 prices: Optional[Dict[str, float]] = None, today: Callable[[], date] = date.today):
+        self.max_calls = max_calls
+        self.max_cost = max_cost
+        self.prices = dict(DEFAULT_PRICES, **(prices or {}))
+        self.today = today
+        self.day = today()
+        self.calls = 0
+        self.cost = 0.0
+
+    def _roll(self):
+        current = self.today()
+        if current != self.day:
+            self.day, self.calls, self.cost = current, 0, 0.0
+
+    def allow(self) -> Optional[str]:
+        """None if another call fits the budget, else the reason it does not"""
+        self._roll()
+        if self.max_calls and self.calls >= self.max_calls:
+            return f"daily call limit of {self.max_calls} reached"
+        if self.max_cost and self.cost >= self.max_cost:
+            return f"daily spend limit of ${self.max_cost:g} reached"
+        return None
+
+    def record(self, usage: Dict[str, int]):
+        self._roll()
+        self.calls += 1
+        self.cost += sum(usage.get(name, 0) * price for name, price in self.prices.items()) / 1e6
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures
+
+    While open no calls are made. After reset_timeout seconds one trial call is
+    let through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == 'open' and self.clock() - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+            return True
+        return self.state == 'closed'
+
+    def would_allow(self) -> bool:
+        """Like allow() but without claiming the half-open trial call"""
+        if self.state == 'open':
+            return self.clock() - self.opened_at >= self.reset_timeout
+        return self.state == 'closed'
+
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            if self.state != 'open':
+                self.trips += 1
+            self.state = 'open'
+            self.opened_at = self.clock()
+
+
+class ResilientClient:
+    """Wraps client.messages.create() with rate limit, budget, retries and circuit breaker
+
+    create() raises APIUnavailable without calling the API when the call is not
+    allowed, and re-raises the last error once retries are exhausted.
+    usage_of(response) must return the token counts used for the spend budget.
+
+    Callers that queue work can reserve() the rate-limit token up front, so a
+    trigger that would be rate limited is turned away before it is queued, then
+    pass reserved=True to create(), or release() a reservation they will not use.
+    """
+
+    def __init__(self, client, usage_of: Callable[[Any], Dict[str, int]],
+                 rate_per_minute: float = 6, burst: int = 3, budget: Optional[DailyBudget] = None,
+                 breaker: Optional[CircuitBreaker] = None, retries: int = 2, retry_base: float = 1.0,
+                 retry_max: float = 20.0, sleep: Callable[[float], None] = time.sleep,
+                 on_change: Optional[Callable[[Dict], None]] = None,
+                 log: Optional[Callable[[str], None]] = None):
+        self.client = client
+        self.usage_of = usage_of
+        self.bucket = TokenBucket(rate_per_minute, burst) if rate_per_minute else None
+        self.budget = budget or DailyBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.retries = retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.sleep = sleep
+        self.on_change = on_change
+        self.log = log
+
+        self.calls = 0
+        self.retried = 0
+        self.failures = 0
+        self.rejected = 0
+        self.reserved = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def available(self) -> Optional[str]:
+        """None if a call could go out now, else why not (does not consume rate or trial calls)"""
+        with self._lock:
+            if not self.breaker.would_allow():
+                return "API circuit open"
+            return self.budget.allow()
+
+    def reserve(self) -> Optional[str]:
+        """Like available(), but also takes the rate-limit token for one later create(reserved=True)"""
+        with self._lock:
+            if not self.breaker.would_allow():
+                reason = "API circuit open"
+            else:
+                reason = self.budget.allow()
+                if reason is None and self.bucket and not self.bucket.try_acquire():
+                    reason = "rate limit reached"
+            if reason:
+                self.rejected += 1
+            else:
+                self.reserved += 1
+        if reason:
+            self._notify()
+        return reason
+
+    def release(self):
+        """Give back the token of a reservation that will not be used"""
+        with self._lock:
+            if self.reserved:
+                self.reserved -= 1
+                if self.bucket:
+                    self.bucket.give_back()
+
+    def _admit(self, reserved: bool = False):
+        with self._lock:
+            if reserved and self.reserved:
+                # The token was taken by reserve()
+                self.reserved -= 1
+            else:
+                reserved = False
+            if not self.breaker.allow():
+                reason = "API circuit open"
+            else:
+                reason = self.budget.allow()
+                if reason is None and not reserved and self.bucket and not self.bucket.try_acquire():
+                    reason = "rate limit reached"
+                if reason and self.breaker.state == 'half_open':
+                    # Give the trial call back; nothing was attempted
+                    self.breaker.state = 'open'
+            if reason:
+                if reserved and self.bucket:
+                    self.bucket.give_back()
+                self.rejected += 1
+                raise APIUnavailable(reason)
+
+    def create(self, reserved: bool = False, **request):
+        try:
+            self._admit(reserved)
+        except APIUnavailable:
+            self._notify()
+            raise
+        attempt = 0
+        while True:
+            try:
+                response = self.client.messages.create(**request)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if attempt < self.retries and retryable:
+                    delay = retry_delay(attempt, self.retry_base, self.retry_max)
+                    attempt += 1
+                    with self._lock:
+                        self.retried += 1
+                    if self.log:
+                        self.log(f"Vision API error ({e}), retry {attempt}/{self.retries} in {delay:.1f}s")
+                    self.sleep(delay)
+                    continue
+                with self._lock:
+                    self.failures += 1
+                    self.last_error = str(e)[:200]
+                    previous = self.breaker.state
+                    if retryable:
+                        self.breaker.record_failure()
+                    elif previous == 'half_open':
+                        # A client error (bad request, oversize image) means the API answered
+                        self.breaker.record_success()
+                    tripped = previous != 'open' and self.breaker.state == 'open'
+                if tripped and self.log:
+                    self.log(f"Vision API circuit opened after {self.breaker.failures} failure(s); "
+                             f"motion-only for {self.breaker.reset_timeout:g}s")
+                self._notify()
+                raise
+
+            with self._lock:
+                self.calls += 1
+                recovered = self.breaker.state != 'closed'
+                self.breaker.record_success()
+                self.budget.record(self.usage_of(response))
+            if recovered and self.log:
+                self.log("Vision API recovered, circuit closed")
+            self._notify()
+            return response
+
+    def state(self) -> Dict:
+        with self._lock:
+            return {
+                "circuit": self.breaker.state,
+                "consecutive_failures": self.breaker.failures,
+                "trips": self.breaker.trips,
+                "calls": self.calls,
+                "retries": self.retried,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "reserved": self.reserved,
+                "calls_today": self.budget.calls,
+                "cost_today": round(self.budget.cost, 4),
+                "daily_call_limit": self.budget.max_calls,
+                "daily_cost_limit": self.budget.max_cost,
+                "last_error": self.last_error
+            }
+
+    def _notify(self):
+        if self.on_change:
+            try:
+                self.on_change(self.state())
+            except Exception:
+                pass
@@ -0,0 +1,173 @@
+"""
+Pre-roll ring buffer
+Keeps the last few detection frames (and their JPEGs) so a trigger can be analyzed as a sequence
+"""
+
+import threading
+import time
+from io import BytesIO
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .decode import DETECTION_SIZE
+from .payload import CropBox
+
+ANALYSIS_FRAMES = ('single', 'sequence', 'contact_sheet')
+
+# (timestamp, grayscale frame, JPEG bytes or None)
+BufferedFrame = Tuple[float, np.ndarray, Optional[bytes]]
+
+
+class FrameRing:
+    """Fixed-capacity ring of grayscale frames plus the most recent JPEGs
+
+    All grayscale frames live in one preallocated (capacity, height, width)
+    uint8 array and pushing copies into the next slot, so memory use is fixed
+    at capacity * width * height bytes plus at most jpeg_slots JPEGs.
+    JPEGs are kept for the newest jpeg_slots frames only.
+
+    Frames nobody has decoded yet (quiet cascade ticks) can be pushed still
+    encoded with push_encoded(); they are decoded with `decode` only if
+    recent() returns them, and until then hold their bytes instead.
+    """
+
+    def __init__(self, capacity: int, frame_size: Tuple[int, int] = DETECTION_SIZE,
+                 jpeg_slots: Optional[int] = None, decode: Optional[Callable[[bytes], np.ndarray]] = None):
+        if capacity < 1:
+            raise ValueError("frame buffer capacity must be at least 1")
+        width, height = frame_size
+        self.capacity = capacity
+        self.frame_size = frame_size
+        self.jpeg_slots = capacity if jpeg_slots is None else max(0, min(jpeg_slots, capacity))
+        self.decode = decode
+
+        self._frames = np.zeros((capacity, height, width), dtype=np.uint8)
+        self._times = np.zeros(capacity, dtype=np.float64)
+        # JPEG slots remember which frame (by sequence number) they belong to
+        self._jpegs: List[Tuple[int, Optional[bytes]]] = [(-1, None)] * self.jpeg_slots
+        # Encoded frames per slot, waiting to be decoded into _frames
+        self._encoded: List[Optional[bytes]] = [None] * capacity
+        self._undecodable = np.zeros(capacity, dtype=bool)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the frame array and the stored JPEGs"""
+        with self._lock:
+            return (self._frames.nbytes + sum(len(jpeg) for _, jpeg in self._jpegs if jpeg)
+                    + sum(len(data) for data in self._encoded if data))
+
+    def push(self, frame: np.ndarray, jpeg: Optional[bytes] = None, timestamp: Optional[float] = None):
+        """Copy a full detection frame (and optionally its JPEG) into the next slot"""
+        if frame.shape != self._frames.shape[1:]:
+            raise ValueError(f"frame shape {frame.shape} does not match buffer {self._frames.shape[1:]}")
+        with self._lock:
+            slot = self._count % self.capacity
+            np.copyto(self._frames[slot], frame)
+            self._encoded[slot] = None
+            self._undecodable[slot] = False
+            self._advance(slot, jpeg, timestamp)
+
+    def push_encoded(self, data: bytes, jpeg: Optional[bytes] = None, timestamp: Optional[float] = None):
+        """Store a frame as captured (JPEG or raw gray bytes); it is decoded only if recent() needs it"""
+        if self.decode is None:
+            raise ValueError("frame buffer has no decoder for encoded frames")
+        with self._lock:
+            slot = self._count % self.capacity
+            self._encoded[slot] = data
+            self._undecodable[slot] = False
+            self._advance(slot, jpeg, timestamp)
+
+    def _advance(self, slot: int, jpeg: Optional[bytes], timestamp: Optional[float]):
+        self._times[slot] = time.time() if timestamp is None else timestamp
+        if self.jpeg_slots:
+            self._jpegs[self._count % self.jpeg_slots] = (self._count, jpeg)
+        self._count += 1
+
+    def recent(self, count: Optional[int] = None) -> List[BufferedFrame]:
+        """Up to count most recent frames, oldest first
+
+        The grayscale arrays are copies, so they stay valid after later pushes.
+        Encoded frames are decoded now; one that cannot be decoded is left out.
+        """
+        with self._lock:
+            available = min(self._count, self.capacity)
+            count = available if count is None else max(0, min(count, available))
+            frames = []
+            for seq in range(self._count - count, self._count):
+                slot = seq % self.capacity
+                if self._encoded[slot] is not None:
+                    self._decode_slot(slot)
+                if self._undecodable[slot]:
+                    continue
+                jpeg = None
+                if self.jpeg_slots:
+                    jpeg_seq, stored = self._jpegs[seq % self.jpeg_slots]
+                    if jpeg_seq == seq:
+                        jpeg = stored
+                frames.append((float(self._times[slot]), self._frames[slot].copy(), jpeg))
+            return frames
+
+    def clear(self):
+        with self._lock:
+            self._count = 0
+            self._jpegs = [(-1, None)] * self.jpeg_slots
+            self._encoded = [None] * self.capacity
+            self._undecodable[:] = False
+
+    def _decode_slot(self, slot: int):
+        data, self._encoded[slot] = self._encoded[slot], None
+        try:
+            frame = self.decode(data)
+        except Exception:
+            frame = None
+        if frame is None or frame.shape != self._frames.shape[1:]:
+            self._undecodable[slot] = True
+        else:
+            np.copyto(self._frames[slot], frame)
+
+
+def encode_gray(frame: np.ndarray, quality: int = 80, max_edge: int = 0) -> bytes:
+    """Encode a grayscale frame as JPEG, first fitting it within max_edge pixels if set"""
+    from PIL import Image
+    img = Image.fromarray(frame, mode='L')
+    if max_edge and max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.BILINEAR)
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+
+def contact_sheet(frames: List[np.ndarray], columns: int = 0, crop_box: Optional[CropBox] = None,
+                  gap: int = 4, quality: int = 80, max_edge: int = 0) -> bytes:
+    """Tile grayscale frames (oldest first, left to right, top to bottom) into one JPEG
+
+    With a crop_box every tile is cropped to the same region first, so the
+    sheet shows the area of interest at full detection resolution. The sheet
+    is scaled to max_edge and encoded once, so it is ready to send as is.
+    """
+    if not frames:
+        raise ValueError("contact sheet needs at least one frame")
+    height, width = frames[0].shape
+    y0, y1, x0, x1 = 0, height, 0, width
+    if crop_box:
+        left, top, right, bottom = crop_box
+        x0, x1 = int(left * width), max(int(left * width) + 1, int(round(right * width)))
+        y0, y1 = int(top * height), max(int(top * height) + 1, int(round(bottom * height)))
+    tile_h, tile_w = y1 - y0, x1 - x0
+
+    columns = columns or int(np.ceil(np.sqrt(len(frames))))
+    rows = int(np.ceil(len(frames) / columns))
+    sheet = np.zeros((rows * tile_h + (rows - 1) * gap, columns * tile_w + (columns - 1) * gap),
+                     dtype=np.uint8)
+    for index, frame in enumerate(frames):
+        row, col = divmod(index, columns)
+        top = row * (tile_h + gap)
+        left = col * (tile_w + gap)
+        sheet[top:top + tile_h, left:left + tile_w] = frame[y0:y1, x0:x1]
+    return encode_gray(sheet, quality, max_edge)
@@ -0,0 +1,118 @@
+"""
+Region-of-interest masks for motion detection
+Splits the detection frame into a tile grid and scores changed pixels per region
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .decode import DETECTION_SIZE
+
+
+def polygon_contains(polygon: Sequence[Sequence[float]], xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Vectorized even-odd point-in-polygon test"""
+    inside = np.zeros(xs.shape, dtype=bool)
+    count = len(polygon)
+    for i in range(count):
+        x1, y1 = polygon[i]
+        x2, y2 = polygon[(i + 1) % count]
+        if y1 == y2:
+            continue
+        crosses = (ys >= min(y1, y2)) & (ys < max(y1, y2))
+        x_at_y = x1 + (ys - y1) * (x2 - x1) / (y2 - y1)
+        inside ^= crosses & (xs < x_at_y)
+    return inside
+
+
+class Region:
+    """A named set of tiles with its own changed-pixel threshold"""
+
+    def __init__(self, name: str, tiles: np.ndarray, threshold: int):
+        self.name = name
+        self.tiles = tiles
+        self.threshold = threshold
+
+
+class MotionROI:
+    """Tile grid with region masks over the detection frame
+
+    Regions are configured as polygons (vertices as fractions 0-1 of frame width
+    and height) or as explicit [row, col] tile lists. A tile belongs to a polygon
+    when its centre is inside it. Frames are cropped to the tile-aligned bounding
+    box of all regions before differencing, so tiles outside it cost nothing, and
+    changed pixels are counted per tile with a reshape-and-sum.
+    """
+
+    def __init__(self, regions: List[Dict], tile_size: int = 20,
+                 default_threshold: int = 2000, frame_size: Tuple[int, int] = DETECTION_SIZE):
+        width, height = frame_size
+        if width % tile_size or height % tile_size:
+            raise ValueError(f"tile_size {tile_size} must divide the {width}x{height} detection frame")
+        if not regions:
+            raise ValueError("roi needs at least one region")
+
+        self.tile_size = tile_size
+        self.rows = height // tile_size
+        self.cols = width // tile_size
+
+        # Tile centres as fractions of the frame
+        centres_y, centres_x = np.mgrid[0:self.rows, 0:self.cols].astype(np.float64)
+        centres_x = (centres_x + 0.5) / self.cols
+        centres_y = (centres_y + 0.5) / self.rows
+
+        self.regions: List[Region] = []
+        for index, config in enumerate(regions):
+            name = config.get('name', f"region_{index + 1}")
+            threshold = config.get('motion_pixel_threshold', default_threshold)
+            if 'polygon' in config:
+                tiles = polygon_contains(config['polygon'], centres_x, centres_y)
+            elif 'tiles' in config:
+                tiles = np.zeros((self.rows, self.cols), dtype=bool)
+                for row, col in config['tiles']:
+                    tiles[row, col] = True
+            else:
+                raise ValueError(f"roi region '{name}' needs a polygon or tiles list")
+            if not tiles.any():
+                raise ValueError(f"roi region '{name}' does not cover any tile")
+            self.regions.append(Region(name, tiles, threshold))
+
+        # Tile-aligned bounding box of every region
+        active = np.logical_or.reduce([region.tiles for region in self.regions])
+        rows = np.flatnonzero(active.any(axis=1))
+        cols = np.flatnonzero(active.any(axis=0))
+        self.tile_bounds = (int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1)
+        row0, row1, col0, col1 = self.tile_bounds
+        self.pixel_bounds = (row0 * tile_size, row1 * tile_size, col0 * tile_size, col1 * tile_size)
+
+        # Region masks restricted to the cropped grid
+        for region in self.regions:
+            region.tiles = np.ascontiguousarray(region.tiles[row0:row1, col0:col1])
+        self.active_tiles = np.ascontiguousarray(active[row0:row1, col0:col1])
+        self.active_pixels = self.active_tiles.repeat(tile_size, axis=0).repeat(tile_size, axis=1)
+
+    @property
+    def active_fraction(self) -> float:
+        """Share of the frame that is actually evaluated"""
+        row0, row1, col0, col1 = self.tile_bounds
+        return (row1 - row0) * (col1 - col0) / (self.rows * self.cols)
+
+    def crop(self, frame: np.ndarray) -> np.ndarray:
+        """Zero-copy view of the frame limited to the regions' bounding box"""
+        y0, y1, x0, x1 = self.pixel_bounds
+        return frame[y0:y1, x0:x1]
+
+    def tile_counts(self, mask: np.ndarray) -> np.ndarray:
+        """Changed pixels per tile for a cropped (H, W) mask"""
+        rows, cols = mask.shape[0] // self.tile_size, mask.shape[1] // self.tile_size
+        tiles = mask.reshape(rows, self.tile_size, cols, self.tile_size)
+        return np.count_nonzero(tiles, axis=(1, 3))
+
+    def score(self, mask: Optional[np.ndarray]) -> Tuple[int, List[Tuple[str, int, int]]]:
+        """Return total changed pixels over region tiles and (name, changed, threshold) per region"""
+        if mask is None:
+            return 0, [(region.name, 0, region.threshold) for region in self.regions]
+        counts = self.tile_counts(mask)
+        total = int(counts[self.active_tiles].sum())
+        return total, [(region.name, int(counts[region.tiles].sum()), region.threshold)
+                       for region in self.regions]
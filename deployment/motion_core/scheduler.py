@@ -0,0 +1,99 @@
+"""
+Adaptive polling interval
+Checks faster for a while after motion and back off during sustained quiet
+"""
+
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+def _parse_time(value: str) -> int:
+    """'HH:MM' -> minutes since midnight"""
+    hours, minutes = str(value).split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+class AdaptiveInterval:
+    """Picks the delay until a camera's next check
+
+    - Motion seen in the last burst_duration seconds: check every burst_interval
+    - Quiet for longer than idle_after seconds: stretch the interval by
+      backoff_factor after every quiet check, up to idle_interval
+    - Otherwise: the base interval, or the interval of a matching time-of-day
+      window (e.g. slower overnight)
+    The result is always clamped to [min_interval, max_interval].
+    """
+
+    def __init__(self, base_interval: float, burst_interval: float = 5, burst_duration: float = 60,
+                 idle_after: float = 300, idle_interval: float = 60, backoff_factor: float = 1.5,
+                 min_interval: float = 1, max_interval: float = 300,
+                 windows: Optional[List[Dict]] = None,
+                 clock: Callable[[], float] = time.time,
+                 local_time: Callable[[], datetime] = datetime.now):
+        self.base_interval = base_interval
+        self.burst_interval = burst_interval
+        self.burst_duration = burst_duration
+        self.idle_after = idle_after
+        self.idle_interval = idle_interval
+        self.backoff_factor = backoff_factor
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self.local_time = local_time
+
+        # Time-of-day windows: [{start: "23:00", end: "06:00", check_interval: 60}, ...]
+        self.windows = []
+        for window in windows or []:
+            self.windows.append((_parse_time(window['start']), _parse_time(window['end']),
+                                 window['check_interval']))
+
+        self.last_motion = None
+        self.quiet_since = clock()
+        self._idle_interval = None
+        self.mode = 'normal'
+
+    def record(self, motion: bool):
+        """Record the outcome of a check"""
+        now = self.clock()
+        if motion:
+            self.last_motion = now
+            self.quiet_since = None
+            self._idle_interval = None
+        elif self.quiet_since is None:
+            self.quiet_since = now
+
+    def base_for_time(self) -> float:
+        """Base interval, taking time-of-day windows into account"""
+        current = self.local_time()
+        minute = current.hour * 60 + current.minute
+        for start, end, interval in self.windows:
+            if start <= end:
+                inside = start <= minute < end
+            else:
+                inside = minute >= start or minute < end
+            if inside:
+                return interval
+        return self.base_interval
+
+    def next_interval(self) -> float:
+        """Seconds until the next check"""
+        now = self.clock()
+        base = self.base_for_time()
+
+        if self.last_motion is not None and now - self.last_motion < self.burst_duration:
+            self.mode = 'burst'
+            interval = self.burst_interval
+        elif self.quiet_since is not None and now - self.quiet_since >= self.idle_after:
+            self.mode = 'idle'
+            if self._idle_interval is None:
+                self._idle_interval = base
+            else:
+                self._idle_interval = min(self._idle_interval * self.backoff_factor,
+                                          max(self.idle_interval, base))
+            interval = self._idle_interval
+        else:
+            self.mode = 'normal'
+            interval = base
+
+        return max(self.min_interval, min(self.max_interval, interval))
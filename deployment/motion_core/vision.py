@@ -0,0 +1,181 @@
+"""
+Vision API requests
+Builds the Anthropic Messages request for a detection and reads the structured answer back
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+DEFAULT_MODEL = "claude-3-5-haiku-20241022"
+
+# The API only caches prefixes of at least this many tokens (Haiku models need
+# twice as many); shorter prefixes marked with cache_control are simply not cached
+MIN_CACHEABLE_TOKENS = 1024
+MIN_CACHEABLE_TOKENS_HAIKU = 2048
+
+# Static instructions; sent as a system prompt, cached when the prefix is long enough
+DETECTION_PROMPT = """Analyze outdoor security camera images for activity.
+
+FOCUS ON THESE AREAS ONLY:
+1. The driveway area (typically to the right side of frame)
+2. Vehicles parked directly in front of the property
+3. People or animals in front of the property or on the driveway
+
+DETECT AND REPORT:
+- People walking, standing, or approaching
+- Vehicles (cars, trucks, bikes, delivery trucks)
+- Animals (pets, wildlife)
+
+IGNORE:
+- Activity on the street/road (not on property)
+- Activity on neighboring properties
+- Background movement (trees, clouds, flags)
+- Static decorations (Christmas lights, deer statues, lawn ornaments)
+
+For each detected object IN THE FOCUS AREAS report its type, location
+(driveway, in_front or walking_by), a brief description of what it is doing
+and your confidence (0.0-1.0). If nothing is detected in the focus areas,
+report an empty detections list."""
+
+# Used when structured output is off: the original free-text JSON instructions
+JSON_INSTRUCTIONS = """Return ONLY a JSON object:
+{
+    "detections": [
+        {
+            "type": "person|vehicle|animal",
+            "location": "driveway|in_front|walking_by",
+            "description": "brief description",
+            "confidence": 0.0-1.0
+        }
+    ],
+    "summary": "brief summary"
+}"""
+
+DETECTION_TOOL = {
+    "name": "report_detections",
+    "description": "Report the people, vehicles and animals seen in the focus areas of the camera image(s).",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "detections": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {"type": "string", "enum": ["person", "vehicle", "animal"]},
+                        "location": {"type": "string", "enum": ["driveway", "in_front", "walking_by"]},
+                        "description": {"type": "string", "description": "Brief, under 15 words"},
+                        "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+                    },
+                    "required": ["type", "location", "description", "confidence"]
+                }
+            },
+            "summary": {"type": "string", "description": "One short sentence"}
+        },
+        "required": ["detections", "summary"]
+    }
+}
+
+
+def system_prompt(prompt: str = DETECTION_PROMPT, structured: bool = True) -> str:
+    """The system prompt text sent for these settings"""
+    return prompt if structured else f"{prompt}\n\n{JSON_INSTRUCTIONS}"
+
+
+def min_cacheable_tokens(model: str) -> int:
+    return MIN_CACHEABLE_TOKENS_HAIKU if 'haiku' in model else MIN_CACHEABLE_TOKENS
+
+
+def prefix_tokens(prompt: str = DETECTION_PROMPT, structured: bool = True) -> int:
+    """Rough token count (4 characters per token) of the static prefix: tool definition plus system prompt"""
+    characters = len(system_prompt(prompt, structured))
+    if structured:
+        characters += len(json.dumps(DETECTION_TOOL))
+    return characters // 4
+
+
+def prompt_cacheable(model: str = DEFAULT_MODEL, prompt: str = DETECTION_PROMPT, structured: bool = True) -> bool:
+    """True if the static prefix is long enough for the API to cache it"""
+    return prefix_tokens(prompt, structured) >= min_cacheable_tokens(model)
+
+
+def build_request(images_base64: List[str], note: Optional[str] = None, model: str = DEFAULT_MODEL,
+                  max_tokens: int = 300, prompt: str = DETECTION_PROMPT, cache_prompt: bool = True,
+                  structured: bool = True) -> Dict[str, Any]:
+    """Keyword arguments for client.messages.create()
+
+    With cache_prompt the static prompt (and the tool definition, which
+    precedes it in the cache prefix) is marked with cache_control so the API
+    can reuse it between calls, but only when that prefix reaches the model's
+    minimum cacheable size. Only the images and a one-line note change per
+    request. With structured output the model must answer through the
+    report_detections tool.
+    """
+    system = {"type": "text", "text": system_prompt(prompt, structured)}
+    if cache_prompt and prompt_cacheable(model, prompt, structured):
+        system["cache_control"] = {"type": "ephemeral"}
+
+    content: List[Dict[str, Any]] = [
+        {
+            "type": "image",
+            "source": {"type": "base64", "media_type": "image/jpeg", "data": image_base64}
+        }
+        for image_base64 in images_base64
+    ]
+    content.append({"type": "text", "text": note or "Report the activity in this image."})
+
+    request: Dict[str, Any] = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "system": [system],
+        "messages": [{"role": "user", "content": content}]
+    }
+    if structured:
+        request["tools"] = [DETECTION_TOOL]
+        request["tool_choice"] = {"type": "tool", "name": DETECTION_TOOL["name"]}
+    return request
+
+
+def parse_response(response) -> Optional[Dict]:
+    """The detection result from a Messages response, or None if there is none
+
+    Prefers the report_detections tool input; falls back to a JSON object in
+    the text (structured output off, or a model that answered in prose).
+    """
+    text = ''
+    for block in response.content:
+        block_type = getattr(block, 'type', None)
+        if block_type == 'tool_use' and block.name == DETECTION_TOOL["name"]:
+            result = dict(block.input)
+            result.setdefault("detections", [])
+            result.setdefault("summary", "")
+            return result
+        if block_type == 'text':
+            text += block.text
+
+    json_match = re.search(r'\{.*\}', text, re.DOTALL)
+    if json_match:
+        try:
+            return json.loads(json_match.group())
+        except ValueError:
+            return None
+    return None
+
+
+def response_text(response) -> str:
+    """Concatenated text blocks of a response, for error messages"""
+    return ''.join(block.text for block in response.content if getattr(block, 'type', None) == 'text')
+
+
+def usage_counts(response) -> Dict[str, int]:
+    """Token usage of a response, including prompt-cache reads and writes"""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return {}
+    return {
+        "input_tokens": getattr(usage, 'input_tokens', 0) or 0,
+        "output_tokens": getattr(usage, 'output_tokens', 0) or 0,
+        "cache_read_tokens": getattr(usage, 'cache_read_input_tokens', 0) or 0,
+        "cache_write_tokens": getattr(usage, 'cache_creation_input_tokens', 0) or 0
+    }
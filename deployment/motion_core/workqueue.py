@@ -0,0 +1,165 @@
+"""
+Bounded work queue for AI analysis
+Lets the motion loop hand frames off without waiting on the vision API
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'keep_latest')
+
+
+class AnalysisQueue:
+    """Bounded job queue served by a small pool of worker threads
+
+    When the queue is full the overflow policy decides what is lost:
+    drop_oldest  - discard the oldest waiting job to make room
+    drop_newest  - reject the new job
+    keep_latest  - discard every waiting job; only the newest one is kept
+    Jobs that waited longer than max_age seconds are discarded unprocessed.
+    on_discard, if set, is called with every job that is dropped or expires.
+    """
+
+    def __init__(self, handler: Callable[[Any], None], workers: int = 1, maxsize: int = 2,
+                 overflow: str = 'drop_oldest', max_age: float = 60.0,
+                 log: Optional[Callable[[str], None]] = None,
+                 on_change: Optional[Callable[[Dict], None]] = None,
+                 on_discard: Optional[Callable[[Any], None]] = None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.handler = handler
+        self.maxsize = max(1, maxsize)
+        self.overflow = overflow
+        self.max_age = max_age
+        self.log = log or (lambda message: None)
+        self.on_change = on_change
+        self.on_discard = on_discard
+
+        self.submitted = 0
+        self.dropped = 0
+        self.expired = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+
+        self._jobs = deque()
+        self._condition = threading.Condition()
+        self._running = True
+        self._workers = [
+            threading.Thread(target=self._work, name=f"analysis-worker-{i + 1}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        with self._condition:
+            return len(self._jobs)
+
+    def stats(self) -> Dict:
+        """Queue counters, e.g. for publishing over MQTT"""
+        with self._condition:
+            return {
+                "depth": len(self._jobs),
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "expired": self.expired
+            }
+
+    def submit(self, job: Any) -> bool:
+        """Queue a job without blocking; returns False if it was rejected"""
+        discarded = []
+        with self._condition:
+            if not self._running:
+                return False
+            self.submitted += 1
+            if len(self._jobs) >= self.maxsize:
+                if self.overflow == 'drop_newest':
+                    discarded.append(job)
+                elif self.overflow == 'keep_latest':
+                    discarded.extend(queued for _, queued in self._jobs)
+                    self._jobs.clear()
+                else:
+                    discarded.append(self._jobs.popleft()[1])
+                self.dropped += len(discarded)
+            accepted = not discarded or discarded[0] is not job
+            if accepted:
+                self._jobs.append((time.time(), job))
+                self._condition.notify()
+        self._discard(discarded)
+        self._notify_change()
+        return accepted
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until no job is waiting or running; False if the timeout ran out first"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._jobs and not self.in_flight, timeout)
+
+    def stop(self, timeout: float = 5.0):
+        """Discard waiting jobs and stop the workers"""
+        with self._condition:
+            self._running = False
+            self._jobs.clear()
+            self._condition.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _work(self):
+        """Worker loop: take the next job and run the handler"""
+        while True:
+            with self._condition:
+                while self._running and not self._jobs:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                queued_at, job = self._jobs.popleft()
+                expired = time.time() - queued_at > self.max_age
+                if expired:
+                    self.expired += 1
+                    self._condition.notify_all()
+                else:
+                    self.in_flight += 1
+            if expired:
+                self._discard([job])
+                continue
+            self._notify_change()
+
+            try:
+                self.handler(job)
+                succeeded = True
+            except Exception as e:
+                self.log(f"Analysis job failed: {e}")
+                succeeded = False
+
+            with self._condition:
+                self.in_flight -= 1
+                if succeeded:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._condition.notify_all()
+            self._notify_change()
+
+    def _discard(self, jobs):
+        """Hand dropped or expired jobs to the owner"""
+        if self.on_discard:
+            for job in jobs:
+                try:
+                    self.on_discard(job)
+                except Exception as e:
+                    self.log(f"Error discarding analysis job: {e}")
+
+    def _notify_change(self):
+        """Report queue state to the owner"""
+        if self.on_change:
+            try:
+                self.on_change(self.stats())
+            except Exception as e:
+                self.log(f"Error reporting analysis queue state: {e}")
@@ -0,0 +1,24 @@
+"""
+Shared test setup
+The detection core is imported as `motion_core`, as the benchmarks and CLIs do.
+
+    python -m pytest -q
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'deployment'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+@pytest.fixture
+def stub_anthropic(monkeypatch):
+    """Make `import anthropic` return the offline benchmark stub; yields the created clients"""
+    from stubs import stub_anthropic_module
+    module = stub_anthropic_module()
+    monkeypatch.setitem(sys.modules, 'anthropic', module)
+    yield module.clients
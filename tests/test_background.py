@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from motion_core.background import (BACKGROUND_MODELS, GaussianModel, LastFrameModel, RunningAverageModel,
+                                    create_background_model)
+
+SHAPE = (60, 80)
+
+
+def _scene(value=100, seed=0, noise=0):
+    rng = np.random.default_rng(seed)
+    frame = np.full(SHAPE, value, dtype=np.int16)
+    if noise:
+        frame += rng.integers(-noise, noise + 1, SHAPE, dtype=np.int16)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def _step(frame, value=220):
+    stepped = frame.copy()
+    stepped[10:30, 20:50] = value
+    return stepped
+
+
+@pytest.mark.parametrize('name', BACKGROUND_MODELS)
+def test_first_frame_establishes_baseline(name):
+    model = create_background_model(name)
+    assert model.apply(_scene()) is None
+    assert model.mask is None
+
+
+@pytest.mark.parametrize('name', BACKGROUND_MODELS)
+def test_static_scene_has_no_motion(name):
+    model = create_background_model(name)
+    model.apply(_scene())
+    for _ in range(20):
+        assert model.apply(_scene()) == (0, 0.0)
+    assert not model.mask.any()
+
+
+@pytest.mark.parametrize('name', BACKGROUND_MODELS)
+def test_step_change_is_detected(name):
+    model = create_background_model(name)
+    for _ in range(10):
+        model.apply(_scene())
+    changed, avg_change = model.apply(_step(_scene()))
+    assert changed == 20 * 30
+    assert avg_change == pytest.approx(120, abs=1)
+    assert model.mask[10:30, 20:50].all() and model.mask.sum() == changed
+
+
+def test_running_average_converges_to_new_scene():
+    model = RunningAverageModel(alpha=0.2)
+    model.apply(_scene(100))
+    for _ in range(60):
+        model.apply(_scene(160))
+    assert np.abs(model.background.astype(int) - 160).max() <= 1
+    assert model.apply(_scene(160)) == (0, 0.0)
+
+
+def test_running_average_absorbs_slow_drift_last_frame_does_not_need_to():
+    average, last = RunningAverageModel(alpha=0.2), LastFrameModel()
+    for value in range(50, 150, 2):
+        for model in (average, last):
+            result = model.apply(_scene(value))
+            assert result is None or result[0] == 0
+
+
+def test_gaussian_learns_noisy_background():
+    model = GaussianModel(threshold=10, alpha=0.05, k=2.5, initial_std=2.0)
+    noisy = [_scene(100, seed=seed, noise=25) for seed in range(200)]
+    early = [model.apply(frame) for frame in noisy[:5]][1:]
+    late = [model.apply(frame) for frame in noisy[100:]]
+    assert np.mean([changed for changed, _ in early]) > 1000
+    assert np.mean([changed for changed, _ in late[-20:]]) < 10
+    # Still sees a real object against the learned variance
+    changed, _ = model.apply(_step(noisy[0], 255))
+    assert changed > 500
+
+
+@pytest.mark.parametrize('name', ('running_average', 'gaussian'))
+def test_reset_and_shape_change_restart_the_baseline(name):
+    model = create_background_model(name)
+    model.apply(_scene())
+    model.apply(_scene())
+    model.reset()
+    assert model.apply(_scene()) is None
+    assert model.apply(np.zeros((30, 40), dtype=np.uint8)) is None
+
+
+def test_unknown_model_name():
+    with pytest.raises(ValueError):
+        create_background_model('median')
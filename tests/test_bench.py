@@ -0,0 +1,29 @@
+from bench_pipeline import bench, main
+from frames import raw_gray, synthetic_jpegs
+from motion_core.decode import DETECTION_SIZE
+
+
+def test_bench_drives_the_pipeline_through_analysis():
+    jpegs = synthetic_jpegs('moving_blob', (320, 180), 24)
+    report = bench(jpegs, jpegs, {}, warmup=2, measure_memory=False)
+    assert report['frames'] == 22
+    assert report['errors'] == 0
+    assert report['triggers'] > 0
+    assert report['analyses'] == report['api_calls'] == report['triggers']
+    for stage in ('capture', 'decode', 'detect', 'check', 'payload', 'api'):
+        assert report['stages'][stage]['count'] > 0
+
+
+def test_bench_raw_mode_analyzes_the_matching_jpeg():
+    jpegs = synthetic_jpegs('moving_blob', (320, 180), 24)
+    report = bench(raw_gray(jpegs, DETECTION_SIZE), jpegs, {'decode_mode': 'raw'}, warmup=2, measure_memory=False)
+    assert report['errors'] == 0
+    assert report['analyses'] == report['triggers'] > 0
+    assert report['stages']['analysis_capture']['count'] == report['triggers']
+
+
+def test_bench_cli_writes_report(tmp_path, capsys):
+    out = tmp_path / 'report.json'
+    main(['--scenes', 'static', '--resolutions', '160x90', '--frames', '6', '--no-memory', '--json', str(out)])
+    assert 'static' in capsys.readouterr().out
+    assert out.exists()
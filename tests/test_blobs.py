@@ -0,0 +1,126 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+from motion_core.blobs import Blob, clean_mask, find_blobs, label_runs, mask_runs
+
+
+def _mask(rows):
+    """Mask from strings: '#' set, '.' clear"""
+    return np.array([[char == '#' for char in row] for row in rows], dtype=bool)
+
+
+def _raw(mask, **kwargs):
+    """find_blobs without the morphological cleanup"""
+    return find_blobs(mask, open_iterations=0, close_iterations=0, **kwargs)
+
+
+def _flood_fill_blobs(mask):
+    """Reference 8-connected labelling: sorted (area, box) per component"""
+    seen = np.zeros_like(mask)
+    height, width = mask.shape
+    found = []
+    for y, x in zip(*np.nonzero(mask)):
+        if seen[y, x]:
+            continue
+        seen[y, x] = True
+        queue, pixels = deque([(y, x)]), []
+        while queue:
+            cy, cx = queue.popleft()
+            pixels.append((cy, cx))
+            for ny in range(max(0, cy - 1), min(height, cy + 2)):
+                for nx in range(max(0, cx - 1), min(width, cx + 2)):
+                    if mask[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        queue.append((ny, nx))
+        ys, xs = zip(*pixels)
+        found.append((len(pixels), (min(xs), min(ys), max(xs) + 1, max(ys) + 1)))
+    return sorted(found)
+
+
+def test_diagonal_pixels_are_one_blob():
+    blobs = _raw(_mask(['#...',
+                        '.#..',
+                        '..#.',
+                        '...#']))
+    assert blobs == [Blob(4, (0, 0, 4, 4), (1.5, 1.5))]
+
+
+def test_separate_regions_largest_first():
+    blobs = _raw(_mask(['##...#',
+                        '##...#',
+                        '......',
+                        '..###.']))
+    assert [(blob.area, blob.box) for blob in blobs] == [(4, (0, 0, 2, 2)), (3, (2, 3, 5, 4)), (2, (5, 0, 6, 2))]
+    assert blobs[0].centroid == (0.5, 0.5)
+
+
+def test_branches_that_join_lower_down_merge():
+    # Two arms of a U and a W only connect on their last rows
+    mask = _mask(['#.#.#...#.#',
+                  '#.#.#...#.#',
+                  '#.#.#...#.#',
+                  '#####....#.'])
+    assert [(blob.area, blob.box) for blob in _raw(mask)] == [(14, (0, 0, 5, 4)), (7, (8, 0, 11, 4))]
+
+
+def test_min_and_max_area_filter():
+    mask = _mask(['###..#',
+                  '###...',
+                  '......',
+                  '##....'])
+    assert [blob.area for blob in _raw(mask)] == [6, 2, 1]
+    assert [blob.area for blob in _raw(mask, min_area=2)] == [6, 2]
+    assert [blob.area for blob in _raw(mask, min_area=2, max_area=5)] == [2]
+    assert _raw(mask, min_area=7) == []
+
+
+def test_boxes_at_frame_edges():
+    mask = np.zeros((6, 8), dtype=bool)
+    mask[:2, :2] = True          # top-left corner
+    mask[4:, 5:] = True          # bottom-right corner
+    mask[2:4, 7] = True          # right edge, joined to the corner blob below it
+    blobs = _raw(mask)
+    boxes = sorted(blob.box for blob in blobs)
+    assert boxes == [(0, 0, 2, 2), (5, 2, 8, 6)]
+    # Exclusive right/bottom reach the frame size exactly
+    assert max(blob.box[2] for blob in blobs) == 8 and max(blob.box[3] for blob in blobs) == 6
+
+
+def test_offset_moves_boxes_and_centroids():
+    mask = _mask(['.##',
+                  '.##'])
+    assert _raw(mask, offset=(100, 40)) == [Blob(4, (101, 40, 103, 42), (101.5, 40.5))]
+
+
+def test_opening_removes_speckle_but_keeps_objects_on_the_border():
+    mask = np.zeros((20, 20), dtype=bool)
+    mask[0:4, 0:4] = True        # object in the corner: border padding must not erode it away
+    mask[10, 10] = True          # single-pixel speckle
+    mask[12:16, 8:14] = True
+    blobs = find_blobs(mask)
+    assert [(blob.area, blob.box) for blob in blobs] == [(24, (8, 12, 14, 16)), (16, (0, 0, 4, 4))]
+
+
+def test_closing_fills_holes():
+    mask = np.zeros((12, 12), dtype=bool)
+    mask[3:8, 3:9] = True
+    mask[5, 5] = False
+    assert find_blobs(mask, open_iterations=0, close_iterations=0)[0].area == 29
+    assert find_blobs(mask, open_iterations=0)[0] == Blob(30, (3, 3, 9, 8), (5.5, 5.0))
+
+
+def test_empty_masks():
+    assert find_blobs(None) == []
+    assert find_blobs(np.zeros((4, 4), dtype=bool)) == []
+    # Everything removed by the opening
+    assert find_blobs(_mask(['#...', '..#.', '....', '#..#'])) == []
+    assert len(label_runs(*mask_runs(np.zeros((3, 3), dtype=bool)))) == 0
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_flood_fill_on_random_masks(seed):
+    rng = np.random.default_rng(seed)
+    mask = rng.random((40, 60)) < 0.35
+    assert sorted((blob.area, blob.box) for blob in _raw(mask)) == _flood_fill_blobs(mask)
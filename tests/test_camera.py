@@ -0,0 +1,68 @@
+import pytest
+
+from motion_core.camera import CAMERA_KEYS, Camera, camera_configs
+
+APP = {
+    'snapshot_url': 'rtsp://default/live',
+    'check_interval': 15,
+    'motion_pixel_threshold': 2500,
+    'cooldown_seconds': 45,
+    'mqtt_topic_prefix': 'home',
+    'anthropic_api_key': 'not a camera setting',
+}
+
+
+def test_single_camera_uses_app_settings_and_prefix():
+    [config] = camera_configs(dict(APP, camera_name='porch'))
+    assert config['name'] == 'porch'
+    assert config['mqtt_topic_prefix'] == 'home'
+    assert config['log_prefix'] == ''
+    assert config['check_interval'] == 15
+    assert 'anthropic_api_key' not in config
+
+
+def test_cameras_inherit_app_settings_and_override_their_own():
+    configs = camera_configs(dict(APP, cameras=[
+        {'name': 'driveway', 'snapshot_url': 'rtsp://driveway/live'},
+        {'name': 'backyard', 'snapshot_url': 'rtsp://backyard/live', 'check_interval': 30,
+         'motion_pixel_threshold': 4000, 'mqtt_topic_prefix': 'yard'},
+        {'snapshot_url': 'rtsp://side/live'},
+    ]))
+    assert [config['name'] for config in configs] == ['driveway', 'backyard', 'camera_3']
+    assert [config['snapshot_url'] for config in configs] == \
+        ['rtsp://driveway/live', 'rtsp://backyard/live', 'rtsp://side/live']
+    assert [config['check_interval'] for config in configs] == [15, 30, 15]
+    assert [config['motion_pixel_threshold'] for config in configs] == [2500, 4000, 2500]
+    assert [config['cooldown_seconds'] for config in configs] == [45] * 3
+    assert [config['mqtt_topic_prefix'] for config in configs] == ['home/driveway', 'yard', 'home/camera_3']
+    assert configs[0]['log_prefix'] == '[driveway] '
+    assert all('anthropic_api_key' not in config for config in configs)
+
+    cameras = [Camera(config) for config in configs]
+    assert [camera.check_interval for camera in cameras] == [15, 30, 15]
+    assert [camera.motion_pixel_threshold for camera in cameras] == [2500, 4000, 2500]
+
+
+def test_overrides_do_not_leak_between_cameras():
+    roi = {'regions': [{'name': 'lawn', 'tiles': [[0, 0]]}]}
+    configs = camera_configs(dict(APP, cameras=[{'name': 'a', 'roi': roi}, {'name': 'b'}]))
+    assert configs[0]['roi'] == roi
+    assert 'roi' not in configs[1]
+
+
+def test_duplicate_camera_names_are_rejected():
+    with pytest.raises(ValueError, match="duplicate camera name 'porch'"):
+        camera_configs(dict(APP, cameras=[{'name': 'porch'}, {'name': 'porch'}]))
+    # Unnamed entries are numbered, and those names count too
+    with pytest.raises(ValueError, match="duplicate camera name 'camera_2'"):
+        camera_configs(dict(APP, cameras=[{'name': 'camera_2'}, {}]))
+
+
+def test_unknown_camera_settings_are_rejected():
+    with pytest.raises(ValueError, match='motion_pixel_treshold'):
+        camera_configs(dict(APP, cameras=[{'name': 'a'}, {'name': 'b', 'motion_pixel_treshold': 10}]))
+    # App-wide settings cannot be set per camera either
+    with pytest.raises(ValueError, match='anthropic_api_key'):
+        camera_configs(dict(APP, cameras=[{'name': 'a', 'anthropic_api_key': 'x'}]))
+    # Every per-camera key is accepted
+    camera_configs(dict(APP, cameras=[{key: None for key in CAMERA_KEYS}]))
@@ -0,0 +1,150 @@
+import os
+import random
+import types
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from motion_core.capture import JPEG_EOI, JPEG_SOI, RTSPFrameReader, split_jpegs
+
+
+def _jpegs(count=4):
+    rng = np.random.default_rng(3)
+    frames = []
+    for _ in range(count):
+        out = BytesIO()
+        Image.fromarray(rng.integers(0, 256, (48, 64), dtype=np.uint8), mode='L').save(out, format='JPEG')
+        frames.append(out.getvalue())
+    return frames
+
+
+def _parse(chunks):
+    """Feed chunks through split_jpegs the way the reader does; returns the frames and the leftover bytes"""
+    buffer = bytearray()
+    frames = []
+    for chunk in chunks:
+        buffer += chunk
+        spans, consumed = split_jpegs(buffer, len(buffer))
+        frames += [bytes(buffer[start:end]) for start, end in spans]
+        del buffer[:consumed]
+    return frames, bytes(buffer)
+
+
+def _split(data, offsets):
+    offsets = sorted(set(offsets))
+    return [data[start:end] for start, end in zip([0] + offsets, offsets + [len(data)])]
+
+
+def _marker_offsets(data):
+    """Offsets that cut every SOI and EOI marker in half"""
+    offsets = []
+    for marker in (JPEG_SOI, JPEG_EOI):
+        index = data.find(marker)
+        while index >= 0:
+            offsets.append(index + 1)
+            index = data.find(marker, index + 1)
+    return offsets
+
+
+def test_frames_split_at_any_offset_are_recovered_byte_exact():
+    jpegs = _jpegs()
+    stream = b''.join(jpegs)
+    assert _parse([stream]) == (jpegs, b'')
+    assert _parse(_split(stream, _marker_offsets(stream))) == (jpegs, b'')
+    assert _parse([stream[index:index + 1] for index in range(len(stream))]) == (jpegs, b'')
+    rng = random.Random(7)
+    for _ in range(50):
+        offsets = rng.sample(range(1, len(stream)), rng.randint(1, 20))
+        assert _parse(_split(stream, offsets)) == (jpegs, b'')
+
+
+def test_bytes_between_frames_are_skipped():
+    jpegs = _jpegs(2)
+    frames, rest = _parse([b'junk' + jpegs[0] + b'\x00\x01' + jpegs[1] + b'\xff'])
+    assert frames == jpegs
+    # The trailing 0xFF could start the next SOI, so it is kept
+    assert rest == b'\xff'
+
+
+def test_truncated_trailing_frame_is_held_back():
+    jpegs = _jpegs(3)
+    cut = jpegs[2][:len(jpegs[2]) // 2]
+    frames, rest = _parse(_split(jpegs[0] + jpegs[1] + cut, [10, len(jpegs[0]) + 1]))
+    assert frames == jpegs[:2]
+    assert rest == cut
+    # The missing half completes it
+    assert _parse([jpegs[0] + jpegs[1] + cut, jpegs[2][len(cut):]]) == (jpegs, b'')
+    # A frame cut inside its EOI marker is not emitted either
+    assert _parse([jpegs[0][:-1]]) == ([], jpegs[0][:-1])
+
+
+class ScriptedStdout:
+    """ffmpeg stdout stand-in: each read returns the next scripted chunk (as much as fits), then EOF"""
+
+    def __init__(self, reader, chunks):
+        self.reader = reader
+        self.chunks = list(chunks)
+        self.reads = []
+        self.published = []
+        # select() needs a real descriptor; this pipe always has a byte waiting
+        self._read, self._write = os.pipe()
+        os.write(self._write, b'x')
+
+    def fileno(self):
+        return self._read
+
+    def readinto(self, view):
+        if self.reads:
+            self.published.append(self.reader.latest()[0])
+        if not self.chunks:
+            return 0
+        chunk = self.chunks.pop(0)
+        if len(chunk) > len(view):
+            chunk, rest = chunk[:len(view)], chunk[len(view):]
+            self.chunks.insert(0, rest)
+        view[:len(chunk)] = chunk
+        self.reads.append(len(chunk))
+        return len(chunk)
+
+    def close(self):
+        os.close(self._read)
+        os.close(self._write)
+
+
+def _read(chunks, buffer_size=None):
+    """Run a reader's parse loop over the chunks; returns it, the read sizes and the frame published after each"""
+    reader = RTSPFrameReader('rtsp://camera')
+    if buffer_size:
+        reader._buffer = bytearray(buffer_size)
+    stdout = ScriptedStdout(reader, chunks)
+    reader._read_stream(types.SimpleNamespace(stdout=stdout))
+    stdout.close()
+    return reader, stdout.reads, stdout.published
+
+
+def test_reader_publishes_newest_complete_frame_per_read():
+    jpegs = _jpegs()
+    stream = b''.join(jpegs)
+    ends = np.cumsum([len(jpeg) for jpeg in jpegs])
+    # One read ends inside the first EOI, one takes in all of the third frame and the next SOI
+    chunks = _split(stream, [ends[0] - 1, ends[1] + 1, ends[2] + 1])
+    # The buffer is smaller than a frame, so it has to grow
+    reader, reads, published = _read(chunks, buffer_size=256)
+    assert len(reader._buffer) > 256
+
+    position = 0
+    expected = []
+    for size in reads:
+        position += size
+        done = [index for index, end in enumerate(ends) if end <= position]
+        expected.append(jpegs[done[-1]] if done else None)
+    assert published == expected
+    assert reader.frames_received == len(set(expected) - {None}) == len(jpegs)
+
+
+def test_reader_keeps_last_complete_frame_when_stream_ends_mid_frame():
+    jpegs = _jpegs(2)
+    reader, _, published = _read([jpegs[0] + jpegs[1][:-1]])
+    assert published == [jpegs[0]]
+    assert reader.frames_received == 1
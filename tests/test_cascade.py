@@ -0,0 +1,71 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from motion_core.cascade import COARSE_SIZE, CoarseGate, coarse_grayscale
+from motion_core.decode import DETECTION_SIZE
+
+
+def _yard():
+    return np.tile(np.linspace(60, 200, COARSE_SIZE[0], dtype=np.uint8), (COARSE_SIZE[1], 1))
+
+
+def _with_box(frame, top=20, left=30, size=8, value=10):
+    moved = frame.copy()
+    moved[top:top + size, left:left + size] = value
+    return moved
+
+
+def test_static_scene_is_quiet_after_the_first_frame():
+    gate = CoarseGate(refresh_every=0)
+    yard = _yard()
+    assert gate.check(yard) == 'passed'
+    assert [gate.check(yard.copy()) for _ in range(20)] == ['quiet'] * 20
+    assert gate.last_changed == 0
+
+
+def test_scene_change_passes_and_becomes_the_new_reference():
+    gate = CoarseGate(threshold=15, min_changed=8, refresh_every=0)
+    yard = _yard()
+    gate.check(yard)
+    moved = _with_box(yard)
+    assert gate.check(moved) == 'passed'
+    assert gate.last_changed == 64
+    assert gate.check(moved) == 'quiet'
+    # Fewer changed thumbnail pixels than min_changed stays quiet
+    assert gate.check(_with_box(moved, top=50, left=5, size=2)) == 'quiet'
+    assert gate.last_changed == 4
+
+
+def test_refresh_every_nth_quiet_tick():
+    gate = CoarseGate(refresh_every=3)
+    yard = _yard()
+    gate.check(yard)
+    decisions = [gate.check(yard) for _ in range(7)]
+    assert decisions == ['quiet', 'quiet', 'refresh', 'quiet', 'quiet', 'refresh', 'quiet']
+    # Motion restarts the count
+    assert gate.check(_with_box(yard)) == 'passed'
+    assert [gate.check(_with_box(yard)) for _ in range(3)] == ['quiet', 'quiet', 'refresh']
+
+
+def test_gate_limited_to_detection_bounds_ignores_motion_outside():
+    # Left half of the detection frame only
+    gate = CoarseGate.for_detection_bounds((0, 240, 0, 160), refresh_every=0)
+    assert gate.bounds == (0, 60, 0, 40)
+    yard = _yard()
+    gate.check(yard)
+    assert gate.check(_with_box(yard, left=60)) == 'quiet'
+    assert gate.check(_with_box(yard, left=10)) == 'passed'
+
+
+def test_coarse_thumbnail_from_jpeg_and_raw():
+    width, height = DETECTION_SIZE
+    frame = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    out = BytesIO()
+    Image.fromarray(np.repeat(np.repeat(frame, 4, axis=0), 4, axis=1)).save(out, format='JPEG', quality=95)
+    fast = coarse_grayscale(out.getvalue())
+    raw = coarse_grayscale(frame.tobytes(), 'raw')
+    for thumbnail in (fast, raw):
+        assert thumbnail.shape == (COARSE_SIZE[1], COARSE_SIZE[0]) and thumbnail.dtype == np.uint8
+    assert np.abs(fast.astype(np.int16) - raw.astype(np.int16)).mean() < 3
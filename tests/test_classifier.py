@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+from motion_core.classifier import (CLASSES, LinearModel, PreClassifier, as_thumbnail, crop_features, evaluate,
+                                    events_dataset, hog_features, train)
+from motion_core.eventstore import EventStore
+
+HOG_SIZE = 7 * 7 * 4 * 9
+
+
+def _yard(rng):
+    base = np.tile(np.linspace(70, 190, 320, dtype=np.float32), (240, 1))
+    return base + rng.normal(0, 3, base.shape).astype(np.float32)
+
+
+def _sample(rng, label):
+    """A detection frame and the motion box around its 'object' (frame fractions)"""
+    frame = _yard(rng)
+    x, y = int(rng.integers(20, 200)), int(rng.integers(20, 120))
+    if label == 1:      # person: tall dark ellipse
+        width, height = int(rng.integers(24, 34)), int(rng.integers(80, 100))
+        ys, xs = np.ogrid[:height, :width]
+        body = ((xs - width / 2) / (width / 2)) ** 2 + ((ys - height / 2) / (height / 2)) ** 2 <= 1
+        frame[y:y + height, x:x + width][body] = 25
+    elif label == 2:    # vehicle: wide box with two dark wheels
+        width, height = int(rng.integers(90, 110)), int(rng.integers(36, 46))
+        frame[y:y + height - 10, x:x + width] = 150
+        frame[y + height - 12:y + height, x + 10:x + 26] = 15
+        frame[y + height - 12:y + height, x + width - 26:x + width - 10] = 15
+    else:               # nothing: a brightness change over bare ground
+        width, height = int(rng.integers(40, 100)), int(rng.integers(40, 100))
+        frame[y:y + height, x:x + width] += 20
+    box = (x / 320, y / 240, (x + width) / 320, (y + height) / 240)
+    return np.clip(frame, 0, 255).astype(np.uint8), box
+
+
+def _dataset(seed, per_class=20):
+    rng = np.random.default_rng(seed)
+    labels = np.repeat(np.arange(3), per_class)
+    samples = [_sample(rng, label) for label in labels]
+    features = np.stack([crop_features(as_thumbnail(frame), box) for frame, box in samples])
+    return samples, features, labels
+
+
+def _fixed_model(path, favour):
+    """Model that ignores the image and always predicts class `favour`"""
+    dims = HOG_SIZE + 2
+    bias = np.zeros(len(CLASSES), dtype=np.float32)
+    bias[CLASSES.index(favour)] = 8.0
+    LinearModel(np.zeros((dims, len(CLASSES)), np.float32), bias, np.zeros(dims, np.float32),
+                np.ones(dims, np.float32)).save(str(path))
+    return str(path)
+
+
+def test_hog_features_shape_and_orientation():
+    flat = hog_features(np.full((64, 64), 128, dtype=np.uint8))
+    assert flat.shape == (HOG_SIZE,) and flat.dtype == np.float32
+    assert not flat.any()
+
+    vertical = np.zeros((64, 64), dtype=np.uint8)
+    vertical[:, 32:] = 255
+    horizontal = vertical.T.copy()
+    # Per-bin totals: a vertical edge has horizontal gradients (bin 0), a horizontal edge bin 4-5
+    bins_v = hog_features(vertical).reshape(-1, 9).sum(axis=0)
+    bins_h = hog_features(horizontal).reshape(-1, 9).sum(axis=0)
+    assert bins_v.argmax() in (0, 8)
+    assert bins_h.argmax() in (4, 5)
+    features = hog_features(vertical)
+    # L2-Hys: clipped at 0.2 before renormalising
+    assert features.min() >= 0 and features.max() <= 1
+
+
+def test_trained_model_separates_synthetic_crops_and_round_trips(tmp_path):
+    _, features, labels = _dataset(1)
+    model = train(features, labels)
+    _, test_features, test_labels = _dataset(2, per_class=10)
+    report = evaluate(model, test_features, test_labels)
+    assert report['samples'] == 30
+    assert report['accuracy'] >= 0.9
+    confusion = np.array(report['confusion'])
+    assert confusion.shape == (4, 4) and confusion.sum() == 30
+    # No animal examples: the class is never predicted
+    assert confusion[:, 3].sum() == 0
+    # A higher threshold sends fewer frames to the API
+    calls = [row['api_calls'] for row in report['gate']]
+    assert calls == sorted(calls, reverse=True)
+
+    path = tmp_path / 'model.npz'
+    model.save(str(path))
+    loaded = LinearModel.load(str(path))
+    assert loaded.classes == model.classes
+    assert (loaded.patch_size, loaded.margin, loaded.thumbnail_width, loaded.thumbnail_quality) == \
+        (model.patch_size, model.margin, 160, 70)
+    np.testing.assert_array_equal(loaded.probabilities(test_features), model.probabilities(test_features))
+
+
+def test_load_rejects_files_that_are_not_models(tmp_path):
+    junk = tmp_path / 'junk.npz'
+    junk.write_bytes(b'not a model')
+    with pytest.raises(ValueError):
+        LinearModel.load(str(junk))
+    partial = tmp_path / 'partial.npz'
+    np.savez(str(partial), weights=np.zeros((3, 4)))
+    with pytest.raises(ValueError, match='missing'):
+        LinearModel.load(str(partial))
+
+
+def test_classify_scores_the_object_probability(tmp_path):
+    frame, box = _sample(np.random.default_rng(3), 1)
+    empty = PreClassifier(_fixed_model(tmp_path / 'empty.npz', 'nothing'), threshold=0.3)
+    label, score = empty.classify(frame, box)
+    assert label == 'nothing' and score < empty.threshold
+    person = PreClassifier(_fixed_model(tmp_path / 'person.npz', 'person'), threshold=0.3)
+    label, score = person.classify(frame, box)
+    assert label == 'person' and score >= person.threshold
+
+
+def test_events_dataset_matches_the_runtime_features(tmp_path):
+    samples, features, labels = _dataset(4, per_class=3)
+    store = EventStore(str(tmp_path / 'events'), batch_interval=0, max_age_days=0)
+    for index, ((frame, box), label) in enumerate(zip(samples, labels)):
+        event_id = store.record_trigger('yard', 900, 20.0, frame=frame, crop=box, timestamp=1000.0 + index)
+        detections = [{'type': CLASSES[label], 'location': 'yard', 'confidence': 0.9}] if label else []
+        store.record_result(event_id, detections)
+    # Not analysed, and no crop or blobs: neither is a training sample
+    store.record_trigger('yard', 900, 20.0, frame=samples[0][0], crop=samples[0][1], timestamp=900.0)
+    store.record_result(store.record_trigger('yard', 900, 20.0, frame=samples[0][0], timestamp=900.0), [])
+    store.close()
+
+    dataset, dataset_labels = events_dataset(str(tmp_path / 'events'))
+    order = np.argsort(-np.arange(len(labels)))  # events come back newest first
+    np.testing.assert_array_equal(dataset_labels, labels[order])
+    # The stored thumbnail and crop give exactly what PreClassifier computes from the live frame
+    np.testing.assert_allclose(dataset, features[order], atol=1e-6)
+    assert len(events_dataset(str(tmp_path / 'events'), thumbnail_width=320)[1]) == 0
@@ -0,0 +1,48 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from motion_core.decode import DETECTION_SIZE, decode_grayscale
+
+
+def _jpeg(width=1280, height=960, mode='RGB'):
+    """Smooth gradients with a few hard edges, encoded like a camera snapshot"""
+    y, x = np.mgrid[0:height, 0:width]
+    gray = ((x * 255 // width + y * 128 // height) % 256).astype(np.uint8)
+    gray[height // 4:height // 2, width // 3:width // 2] = 240
+    if mode == 'RGB':
+        pixels = np.stack([gray, np.flipud(gray), 255 - gray], axis=-1)
+    else:
+        pixels = gray
+    out = BytesIO()
+    Image.fromarray(pixels, mode=mode).save(out, format='JPEG', quality=90)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'L'])
+def test_fast_and_lanczos_decodes_agree(mode):
+    data = _jpeg(mode=mode)
+    fast = decode_grayscale(data, mode='fast')
+    lanczos = decode_grayscale(data, mode='lanczos')
+    for frame in (fast, lanczos):
+        assert frame.shape == (240, 320) and frame.dtype == np.uint8
+    assert np.abs(fast.astype(np.int16) - lanczos.astype(np.int16)).mean() < 3
+
+
+def test_fast_decode_scales_frames_that_are_not_a_power_of_two_larger():
+    frame = decode_grayscale(_jpeg(1920, 1080), mode='fast')
+    assert frame.shape == (240, 320) and frame.dtype == np.uint8
+
+
+def test_raw_frames_are_wrapped_and_checked_for_size():
+    width, height = DETECTION_SIZE
+    raw = bytes(range(256)) * (width * height // 256)
+    frame = decode_grayscale(raw, mode='raw')
+    assert frame.shape == (240, 320) and frame.dtype == np.uint8
+    assert frame.tobytes() == raw
+    for wrong in (raw[:-1], raw + b'\x00', b''):
+        with pytest.raises(ValueError):
+            decode_grayscale(wrong, mode='raw')
+    assert decode_grayscale(bytes(64 * 48), (64, 48), mode='raw').shape == (48, 64)
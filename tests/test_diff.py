@@ -0,0 +1,50 @@
+import numpy as np
+
+from motion_core.diff import FrameDiffer
+
+
+def _frames(count=6, shape=(48, 64), seed=0):
+    rng = np.random.default_rng(seed)
+    reference = rng.integers(0, 256, shape, dtype=np.uint8)
+    frames = np.repeat(reference[None], count, axis=0)
+    for index in range(1, count):
+        # Growing patches of change, both brighter and darker than the reference
+        frames[index, :index * 6, :index * 8] = rng.integers(0, 256, (index * 6, index * 8), dtype=np.uint8)
+    return frames, reference
+
+
+def test_compare_counts_changed_pixels_and_mean_change():
+    previous = np.zeros((4, 4), dtype=np.uint8)
+    current = previous.copy()
+    current[0, 0] = 200
+    current[1, 1] = 31
+    current[2, 2] = 30  # not above the threshold
+    assert FrameDiffer(30).compare(current, previous) == (2, (200 + 31) / 2)
+
+
+def test_compare_is_symmetric_without_uint8_overflow():
+    low = np.full((8, 8), 10, dtype=np.uint8)
+    high = np.full((8, 8), 250, dtype=np.uint8)
+    differ = FrameDiffer(30)
+    assert differ.compare(low, high) == differ.compare(high, low) == (64, 240.0)
+
+
+def test_compare_batch_matches_per_frame_compare():
+    frames, reference = _frames()
+    batch_differ, single_differ = FrameDiffer(30), FrameDiffer(30)
+    changed, average = batch_differ.compare_batch(frames, reference)
+    assert changed.shape == average.shape == (len(frames),)
+    for index, frame in enumerate(frames):
+        expected_changed, expected_average = single_differ.compare(frame, reference)
+        assert changed[index] == expected_changed
+        assert average[index] == expected_average
+
+
+def test_compare_batch_reuses_buffers_across_stack_shapes():
+    differ = FrameDiffer(30)
+    frames, reference = _frames(count=4)
+    first = differ.compare_batch(frames, reference)
+    differ.compare_batch(*_frames(count=3, shape=(20, 20), seed=1))
+    again = differ.compare_batch(frames, reference)
+    assert np.array_equal(first[0], again[0]) and np.array_equal(first[1], again[1])
+    assert again[0][0] == 0 and again[1][0] == 0.0
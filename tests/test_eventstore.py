@@ -0,0 +1,149 @@
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from motion_core.eventstore import EventStore, encode_thumbnail, parse_age
+
+DAY = 86400
+
+
+def _frame(seed, size=(240, 320)):
+    """Noisy detection frame: its thumbnail does not compress much, so segments fill quickly"""
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8)
+
+
+def _store(path, **kwargs):
+    kwargs.setdefault('batch_interval', 0)
+    return EventStore(str(path), **kwargs)
+
+
+def _reopen(path, **kwargs):
+    """Retention runs when the writer starts; closing waits for it"""
+    store = _store(path, **kwargs)
+    store.close()
+    return store
+
+
+def _segment_files(path):
+    return sorted(name for name in os.listdir(path) if name.endswith('.seg'))
+
+
+def test_thumbnails_round_trip_through_segment_offsets(tmp_path):
+    store = _store(tmp_path, thumbnail_width=80)
+    frames = [np.full((240, 320), value, dtype=np.uint8) for value in (30, 120, 220)]
+    ids = [store.record_trigger('porch', 500, 12.5, frame=frame) for frame in frames]
+    no_thumb = store.record_trigger('porch', 500, 12.5)
+    assert store.flush()
+
+    events = {event['id']: event for event in store.events()}
+    offsets = [events[event_id]['thumb_offset'] for event_id in ids]
+    assert offsets[0] == 0 and offsets == sorted(offsets)
+    for event_id, frame in zip(ids, frames):
+        data = store.thumbnail(event_id)
+        assert data == encode_thumbnail(frame, 80)
+        assert len(data) == events[event_id]['thumb_length']
+        img = Image.open(BytesIO(data))
+        assert img.size == (80, 60) and img.mode == 'L'
+        assert abs(int(np.asarray(img).mean()) - int(frame[0, 0])) <= 2
+    assert store.thumbnail(no_thumb) is None
+    assert store.thumbnail(9999) is None
+    store.close()
+
+
+def test_new_segment_starts_when_the_current_one_is_full(tmp_path):
+    store = _store(tmp_path, segment_mb=0.02, max_mb=0)
+    ids = [store.record_trigger('yard', frame=_frame(seed)) for seed in range(8)]
+    assert store.flush()
+    events = {event['id']: event for event in store.events()}
+    segments = [events[event_id]['thumb_segment'] for event_id in ids]
+    assert segments == sorted(segments) and segments[-1] > 1
+    for event_id in ids[1:]:
+        event = events[event_id]
+        if event['thumb_segment'] != events[event_id - 1]['thumb_segment']:
+            assert event['thumb_offset'] == 0
+        assert store.thumbnail(event_id) == encode_thumbnail(_frame(event_id - 1))
+    store.close()
+    assert len(_segment_files(tmp_path)) == segments[-1]
+
+
+def test_events_older_than_max_days_are_pruned(tmp_path):
+    # The writer may prune as soon as it starts, so the old events go in with retention off
+    store = _store(tmp_path, max_age_days=0)
+    now = time.time()
+    old = store.record_trigger('drive', 800, timestamp=now - 40 * DAY, frame=_frame(1))
+    recent = store.record_trigger('drive', 800, timestamp=now - 2 * DAY)
+    store.record_result(old, [{'type': 'vehicle', 'location': 'driveway', 'confidence': 0.9}], 'car')
+    store.record_result(recent, [{'type': 'person', 'location': 'driveway', 'confidence': 0.8}], 'person')
+    store.close()
+    assert _store(tmp_path, max_age_days=0).counts() == {'vehicle': 1, 'person': 1}
+
+    # An old segment that is no longer appended to goes as well
+    first = os.path.join(tmp_path, 'thumbs-000001.seg')
+    os.utime(first, (now - 40 * DAY, now - 40 * DAY))
+    open(os.path.join(tmp_path, 'thumbs-000002.seg'), 'ab').close()
+    store = _reopen(tmp_path, max_age_days=30)
+    assert store.stats()['pruned_events'] == 1
+    assert [event['id'] for event in store.events()] == [recent]
+    assert store.counts() == {'person': 1}
+    assert store.thumbnail(old) is None
+    assert _segment_files(tmp_path) == ['thumbs-000002.seg']
+
+
+def test_oldest_segments_are_evicted_past_max_mb(tmp_path):
+    store = _store(tmp_path, segment_mb=0.02, max_mb=0)
+    ids = [store.record_trigger('yard', frame=_frame(seed)) for seed in range(12)]
+    store.record_result(ids[0], [{'type': 'animal', 'location': 'in_front', 'confidence': 0.7}])
+    store.close()
+    before = _segment_files(tmp_path)
+    total = sum(os.path.getsize(tmp_path / name) for name in before)
+    assert len(before) >= 4
+
+    limit_mb = total / 2 / 2 ** 20
+    store = _reopen(tmp_path, segment_mb=0.02, max_mb=limit_mb)
+    after = _segment_files(tmp_path)
+    assert after == before[len(before) - len(after):] and len(after) < len(before)
+    assert sum(os.path.getsize(tmp_path / name) for name in after) <= limit_mb * 2 ** 20
+    # Events whose thumbnails were evicted are removed with their detections; the rest still read back
+    remaining = {event['id'] for event in store.events(limit=100)}
+    assert remaining and ids[0] not in remaining
+    assert remaining == set(ids[len(ids) - len(remaining):])
+    assert store.stats()['pruned_events'] == len(ids) - len(remaining)
+    assert store.counts() == {}
+    for event_id in remaining:
+        assert store.thumbnail(event_id) == encode_thumbnail(_frame(event_id - 1))
+
+
+def test_ids_continue_after_reopening(tmp_path):
+    store = _store(tmp_path)
+    first = store.record_trigger('porch')
+    store.close()
+    store = _store(tmp_path)
+    assert store.record_trigger('porch') == first + 1
+    store.close()
+
+
+def test_parse_age():
+    assert parse_age('90') == 90
+    assert parse_age('30m') == 1800
+    assert parse_age('7d') == 7 * DAY
+    with pytest.raises(ValueError):
+        parse_age('a week')
+
+
+def test_crop_box_is_stored_and_older_stores_gain_the_column(tmp_path):
+    import sqlite3
+    from motion_core.eventstore import SCHEMA
+    connection = sqlite3.connect(str(tmp_path / 'events.db'))
+    connection.executescript(SCHEMA.replace("    crop TEXT,\n", ""))
+    connection.close()
+
+    store = _store(tmp_path)
+    with_crop = store.record_trigger('porch', crop=(0.25, 0.5, 0.75, 1.0))
+    without = store.record_trigger('porch')
+    store.close()
+    crops = {event['id']: event['crop'] for event in store.events()}
+    assert crops == {with_crop: [0.25, 0.5, 0.75, 1.0], without: None}
@@ -0,0 +1,72 @@
+import pytest
+
+from motion_core.guard import CheckGuard, StageBudget
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_stage_gets_the_smaller_of_its_budget_and_what_is_left():
+    clock = Clock()
+    budget = StageBudget(12, {'capture': 8}, clock=clock)
+    assert budget.remaining('capture') == 8
+    clock.now = 7
+    assert budget.remaining('capture') == 5
+    assert budget.remaining('unknown') == 5
+
+
+def test_overruns_are_recorded_per_stage():
+    clock = Clock()
+    budget = StageBudget(10, {'decode': 1}, clock=clock)
+    budget.start('decode')
+    clock.now = 1.5
+    assert budget.end() == 1.5
+    budget.start('detect')
+    clock.now = 2
+    budget.end()
+    assert budget.timings == {'decode': 1.5, 'detect': 0.5}
+    assert budget.overruns == ['decode']
+
+
+def test_skip_if_expired():
+    clock = Clock()
+    budget = StageBudget(5, clock=clock)
+    clock.now = 4.9
+    assert not budget.skip_if_expired('detect')
+    assert budget.skipped is None
+    clock.now = 5
+    assert budget.skip_if_expired('detect')
+    assert budget.skipped == 'detect'
+    assert budget.remaining('analysis_capture') == 0
+
+
+def test_guard_skip_policy():
+    guard = CheckGuard('skip')
+    assert guard.try_enter()
+    assert not guard.try_enter()
+    assert not guard.try_enter()
+    assert not guard.exit(duration=20, interval=15)
+    assert guard.stats() == {'runs': 1, 'skipped': 2, 'coalesced': 0, 'overruns': 1}
+    assert guard.try_enter()
+
+
+def test_guard_coalesces_into_one_follow_up():
+    guard = CheckGuard('coalesce')
+    assert guard.try_enter()
+    assert not guard.try_enter()
+    assert not guard.try_enter()
+    assert guard.exit()          # follow-up runs, camera stays claimed
+    assert guard.running
+    assert not guard.exit()
+    assert not guard.running
+    assert guard.stats() == {'runs': 2, 'skipped': 1, 'coalesced': 1, 'overruns': 0}
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        CheckGuard('queue')
@@ -0,0 +1,92 @@
+import re
+import urllib.request
+
+import numpy as np
+import pytest
+
+from motion_core.metrics import COUNTERS, Metrics, MetricsServer, RollingHistogram, prometheus_text
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? \S+$')
+
+
+def test_histogram_percentiles_cover_the_window():
+    histogram = RollingHistogram(size=100)
+    for value in range(1, 101):
+        histogram.observe(value / 1000)
+    summary = histogram.summary()
+    assert summary['count'] == 100
+    assert summary['sum'] == pytest.approx(5.05)
+    assert summary['mean'] == pytest.approx(0.0505)
+    expected = np.percentile(np.arange(1, 101) / 1000, [50, 95, 99])
+    assert [summary['p50'], summary['p95'], summary['p99']] == pytest.approx(expected, abs=1e-6)
+
+    # Older samples fall out of the percentiles; count and sum stay all-time
+    for _ in range(100):
+        histogram.observe(1.0)
+    summary = histogram.summary()
+    assert summary['count'] == 200
+    assert summary['p50'] == summary['p99'] == 1.0
+    assert summary['sum'] == pytest.approx(105.05)
+
+
+def test_empty_histogram():
+    assert RollingHistogram().summary() == {"count": 0, "sum": 0.0}
+
+
+def test_metrics_snapshot():
+    metrics = Metrics(window=8)
+    metrics.increment('checks')
+    metrics.increment('input_tokens', 120)
+    metrics.observe_all({'decode': 0.002, 'detect': 0.001})
+    with metrics.timer('api'):
+        pass
+    snapshot = metrics.snapshot()
+    assert set(COUNTERS) <= set(snapshot['counters'])
+    assert snapshot['counters']['checks'] == 1
+    assert snapshot['counters']['input_tokens'] == 120
+    assert snapshot['counters']['triggers'] == 0
+    assert sorted(snapshot['stages']) == ['api', 'decode', 'detect']
+    assert snapshot['stages']['decode']['p50'] == 0.002
+
+
+def test_prometheus_text_format():
+    front, back = Metrics(), Metrics()
+    front.increment('checks', 3)
+    front.observe('detect', 0.25)
+    back.increment('checks')
+    text = prometheus_text({'front': front.snapshot(), 'back "yard"': back.snapshot()})
+    lines = text.splitlines()
+    assert text.endswith('\n')
+
+    # Every metric family has one HELP and one TYPE line, before its samples
+    for name, kind in (('camera_detection_checks_total', 'counter'),
+                       ('camera_detection_stage_seconds', 'summary')):
+        help_index = lines.index(next(line for line in lines if line.startswith(f"# HELP {name} ")))
+        assert lines[help_index + 1] == f"# TYPE {name} {kind}"
+        assert sum(line.startswith(f"# TYPE {name} ") for line in lines) == 1
+    assert 'camera_detection_checks_total{camera="front"} 3' in lines
+    assert 'camera_detection_checks_total{camera="back \\"yard\\""} 1' in lines
+    assert 'camera_detection_stage_seconds{camera="front",stage="detect",quantile="0.5"} 0.25' in lines
+    assert 'camera_detection_stage_seconds{camera="front",stage="detect",quantile="0.99"} 0.25' in lines
+    assert 'camera_detection_stage_seconds_sum{camera="front",stage="detect"} 0.25' in lines
+    assert 'camera_detection_stage_seconds_count{camera="front",stage="detect"} 1' in lines
+    for line in lines:
+        assert line.startswith('# ') or SAMPLE.match(line), line
+
+
+def test_prometheus_namespace():
+    text = prometheus_text({'cam': Metrics().snapshot()}, namespace='motion')
+    assert '# TYPE motion_triggers_total counter' in text
+    assert 'stage_seconds' not in text
+
+
+def test_metrics_server_listens_on_localhost_by_default():
+    server = MetricsServer(lambda: 'camera_checks_total 3\n', 0)
+    server.start()
+    try:
+        host, port = server._server.server_address
+        assert host == '127.0.0.1'
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert response.read() == b'camera_checks_total 3\n'
+    finally:
+        server.stop()
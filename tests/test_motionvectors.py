@@ -0,0 +1,114 @@
+import io
+import sys
+
+import numpy as np
+import pytest
+
+from motion_core.headless import HeadlessHost
+from motion_core.motionvectors import paint_vectors, scan
+from motion_core.pipeline import MotionPipeline
+
+# Layout of PyAV's MotionVectors.to_ndarray()
+VECTOR_DTYPE = np.dtype({
+    'names': ['source', 'w', 'h', 'src_x', 'src_y', 'dst_x', 'dst_y', 'flags', 'motion_x', 'motion_y',
+              'motion_scale'],
+    'formats': ['<i4', 'u1', 'u1', '<i2', '<i2', '<i2', '<i2', '<u8', '<i4', '<i4', '<u2'],
+    'offsets': [0, 4, 5, 6, 8, 10, 12, 16, 24, 28, 32], 'itemsize': 40, 'aligned': True})
+
+
+def _vectors(*blocks):
+    """(dst_x, dst_y, size, motion_x, motion_y, motion_scale) per block, as PyAV would export them"""
+    vectors = np.zeros(len(blocks), dtype=VECTOR_DTYPE)
+    for vector, (x, y, size, dx, dy, scale) in zip(vectors, blocks):
+        vector['source'], vector['w'], vector['h'] = -1, size, size
+        vector['dst_x'], vector['dst_y'] = x, y
+        vector['src_x'], vector['src_y'] = x - dx // max(scale, 1), y - dy // max(scale, 1)
+        vector['motion_x'], vector['motion_y'], vector['motion_scale'] = dx, dy, scale
+    return vectors
+
+
+def test_moving_blocks_are_painted_at_detection_scale():
+    hits = np.zeros((240, 320), dtype=np.uint16)
+    # 16x16 blocks in a 640x480 frame: one moving 3-4-5 px, one still, one below min_magnitude
+    count, magnitude = paint_vectors(_vectors((104, 104, 16, 3, 4, 1), (300, 300, 16, 0, 0, 1),
+                                              (500, 100, 16, 1, 0, 1)), (640, 480), 2.0, hits)
+    assert (count, magnitude) == (1, 5.0)
+    assert hits.sum() == 64
+    assert np.array_equal(np.argwhere(hits).min(axis=0), [48, 48])
+    assert np.array_equal(np.argwhere(hits).max(axis=0), [55, 55])
+
+
+def test_motion_scale_and_accumulation():
+    hits = np.zeros((240, 320), dtype=np.uint16)
+    # Quarter-pel vectors: 8/4 = 2 px/frame
+    vectors = _vectors((8, 8, 16, 8, 0, 4), (16, 8, 16, 0, 8, 4))
+    assert paint_vectors(vectors, (320, 240), 2.0, hits) == (2, 4.0)
+    assert paint_vectors(vectors, (320, 240), 2.5, hits) == (0, 0.0)
+    paint_vectors(vectors, (320, 240), 1.0, hits)
+    # Overlapping blocks count once per call; calls accumulate
+    assert hits.max() == 2 and hits[8, 12] == 2
+    assert np.count_nonzero(hits) == 16 * 24
+
+
+def test_blocks_are_clipped_at_frame_edges():
+    hits = np.zeros((240, 320), dtype=np.uint16)
+    count, _ = paint_vectors(_vectors((0, 0, 16, 6, 0, 1), (1916, 1076, 16, 0, 6, 1)), (1920, 1080), 1.0, hits)
+    assert count == 2
+    # Every block covers at least one detection pixel, and none fall outside the mask
+    assert hits[0, 0] == 1 and hits[239, 319] == 1
+    assert hits[:2, :2].all() and hits.sum() == 2 * 2 + 2 * 3
+
+
+def test_without_pyav_vectors_fall_back_to_pixels_without_a_second_capture(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'av', None)
+    log = io.StringIO()
+    pipeline = MotionPipeline({'snapshot_url': 'rtsp://camera/stream', 'analyzer': 'none',
+                               'motion_source': 'vectors', 'metrics_interval': 0},
+                              host=HeadlessHost(io.StringIO(), log), label='test')
+    try:
+        assert pipeline.start()
+        camera = next(iter(pipeline.cameras.values()))
+        assert camera.motion_source == 'pixels'
+        assert camera.vector_reader is None
+        # Snapshot JPEGs are the detection frames again, so triggers do not capture a second one
+        assert camera.analysis_capture is None
+        assert "falling back to pixel detection" in log.getvalue()
+    finally:
+        pipeline.stop()
+
+
+# --- Recorded H.264 clips (needs PyAV with an H.264 encoder) ---------------------------
+
+def _record(path, moving):
+    """Four seconds at 10 fps of a static yard, with a box crossing it from 1s to 3s if moving"""
+    av = pytest.importorskip('av')
+    try:
+        container = av.open(str(path), 'w')
+        stream = container.add_stream('libx264', rate=10)
+    except Exception as e:
+        pytest.skip(f"no H.264 encoder: {e}")
+    stream.width, stream.height, stream.pix_fmt = 320, 240, 'yuv420p'
+    stream.options = {'preset': 'ultrafast', 'g': '30'}
+    backdrop = np.repeat(np.tile(np.linspace(40, 200, 320), (240, 1)).astype(np.uint8)[:, :, None], 3, axis=2)
+    for index in range(40):
+        frame = backdrop.copy()
+        if moving and 10 <= index < 30:
+            left = 20 + (index - 10) * 12
+            frame[90:150, left:left + 40] = (20, 20, 200)
+        for packet in stream.encode(av.VideoFrame.from_ndarray(frame, format='rgb24')):
+            container.mux(packet)
+    for packet in stream.encode():
+        container.mux(packet)
+    container.close()
+    return str(path)
+
+
+def test_recorded_clip_triggers_only_while_something_moves(tmp_path):
+    settings = {'motion_pixel_threshold': 100}
+    moving = scan(_record(tmp_path / 'moving.mp4', True), settings)
+    assert moving['frames'] == 40
+    assert [check['triggered'] for check in moving['checks']] == [False, True, True, False]
+    assert all(check['magnitude'] > 1 for check in moving['checks'] if check['triggered'])
+
+    still = scan(_record(tmp_path / 'still.mp4', False), settings)
+    assert still['triggers'] == 0
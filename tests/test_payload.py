@@ -0,0 +1,68 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from motion_core.payload import expand_box, mask_bounding_box, prepare_payload
+
+
+def _jpeg(width, height, mode='RGB', quality=90, seed=0):
+    rng = np.random.default_rng(seed)
+    # Smooth gradient plus mild noise: compresses like a real scene
+    y, x = np.mgrid[0:height, 0:width]
+    base = (x * 255 // max(1, width - 1) + y * 64 // max(1, height - 1)) % 256
+    pixels = np.clip(base + rng.integers(-8, 9, base.shape), 0, 255).astype(np.uint8)
+    img = Image.fromarray(pixels, 'L')
+    if mode == 'RGB':
+        img = Image.merge('RGB', (img, img.transpose(Image.Transpose.FLIP_LEFT_RIGHT), img))
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+
+def _size_mode(data):
+    img = Image.open(BytesIO(data))
+    return img.size, img.mode
+
+
+def test_nothing_to_do_returns_original():
+    frame = _jpeg(640, 480)
+    assert prepare_payload(frame) is frame
+    assert prepare_payload(frame, max_edge=1024) is frame
+    assert prepare_payload(frame, max_edge=640) is frame
+
+
+def test_downscale_fits_max_edge():
+    frame = _jpeg(1920, 1080)
+    payload = prepare_payload(frame, max_edge=640, quality=80)
+    assert _size_mode(payload) == ((640, 360), 'RGB')
+    assert len(payload) < len(frame)
+
+
+def test_crop_with_margin():
+    frame = _jpeg(1280, 960)
+    payload = prepare_payload(frame, crop_box=(0.5, 0.5, 0.75, 0.75), margin=0.0, max_edge=0)
+    assert _size_mode(payload)[0] == (320, 240)
+
+
+def test_grayscale_stays_grayscale():
+    frame = _jpeg(1280, 960, mode='L')
+    payload = prepare_payload(frame, max_edge=320)
+    assert _size_mode(payload) == ((320, 240), 'L')
+
+
+def test_re_encode_that_is_not_smaller_returns_original():
+    # Low-quality source re-encoded at high quality grows
+    frame = _jpeg(800, 600, quality=20)
+    assert prepare_payload(frame, max_edge=799, quality=95) is frame
+
+
+def test_boxes():
+    mask = np.zeros((240, 320), dtype=bool)
+    assert mask_bounding_box(mask, (320, 240)) is None
+    assert mask_bounding_box(None, (320, 240)) is None
+    mask[60:120, 80:160] = True
+    assert mask_bounding_box(mask, (320, 240)) == (0.25, 0.25, 0.5, 0.5)
+    assert mask_bounding_box(mask[40:, 40:], (320, 240), offset=(40, 40)) == (0.25, 0.25, 0.5, 0.5)
+    assert expand_box((0.25, 0.25, 0.5, 0.5), 0.5) == (0.125, 0.125, 0.625, 0.625)
+    assert expand_box((0.0, 0.0, 1.0, 1.0), 0.5) == (0.0, 0.0, 1.0, 1.0)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from motion_core.phash import ResultCache, average_hash, difference_hash, hamming_distance, image_hash
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(**kwargs):
+    clock = Clock()
+    return ResultCache(clock=clock, **kwargs), clock
+
+
+def test_hamming_distance():
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance(2 ** 63, 0) == 1
+
+
+def test_hashes_are_stable_under_brightness_and_noise():
+    rng = np.random.default_rng(0)
+    scene = np.tile(np.linspace(0, 200, 320, dtype=np.float32), (240, 1))
+    scene[80:160, 100:180] = 30
+    brighter = np.clip(scene + 40, 0, 255)
+    noisy = np.clip(scene + rng.normal(0, 4, scene.shape), 0, 255)
+    other = scene[:, ::-1]
+    for method in ('dhash', 'ahash'):
+        base = image_hash(scene, method)
+        assert hamming_distance(base, image_hash(noisy, method)) <= 2
+        assert hamming_distance(base, image_hash(other, method)) > 10
+    assert difference_hash(brighter) == difference_hash(scene)
+    assert average_hash(scene) < 2 ** 64
+    with pytest.raises(ValueError):
+        image_hash(scene, 'phash')
+
+
+def test_match_within_max_distance_picks_the_closest():
+    cache, _ = _cache(max_distance=3)
+    cache.store(0b0000, {'summary': 'a'})
+    cache.store(0b0111_0000, {'summary': 'b'})
+    assert cache.lookup(0b0011) == {'summary': 'a'}          # distance 2
+    assert cache.lookup(0b0111) == {'summary': 'a'}          # distance 3, the limit
+    assert cache.lookup(0b1111) is None                      # 4 from a, 5 from b
+    assert cache.lookup(0b0111_0001) == {'summary': 'b'}     # 1 from b, 4 from a
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'entries': 2}
+
+
+def test_entries_expire_after_ttl():
+    cache, clock = _cache(ttl=60)
+    cache.store(1, {'summary': 'old'})
+    clock.now += 60
+    assert cache.lookup(1) == {'summary': 'old'}
+    clock.now += 1
+    assert cache.lookup(1) is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction_keeps_recently_hit_entries():
+    cache, _ = _cache(max_entries=2, max_distance=0)
+    cache.store(1, {'n': 1})
+    cache.store(2, {'n': 2})
+    assert cache.lookup(1) == {'n': 1}   # 1 is now most recently used
+    cache.store(4, {'n': 4})              # evicts 2
+    assert cache.lookup(2) is None
+    assert cache.lookup(1) == {'n': 1}
+    assert cache.lookup(4) == {'n': 4}
+    assert len(cache) == 2
+
+
+def test_storing_an_existing_key_refreshes_it():
+    cache, clock = _cache(ttl=10, max_distance=0)
+    cache.store(1, {'n': 1})
+    clock.now += 8
+    cache.store(1, {'n': 2})
+    clock.now += 8
+    assert cache.lookup(1) == {'n': 2}
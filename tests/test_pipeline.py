@@ -0,0 +1,141 @@
+import io
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+from motion_core.headless import HeadlessHost, headless_args, run
+from motion_core.pipeline import MotionPipeline
+
+
+def _scene_dir(path, count=8):
+    """JPEG snapshots of a static yard with a dark box moving in from frame 4"""
+    os.makedirs(path, exist_ok=True)
+    base = np.tile(np.linspace(60, 200, 320, dtype=np.uint8), (240, 1))
+    for index in range(count):
+        frame = base.copy()
+        if index >= 4:
+            left = 40 + (index - 4) * 50
+            frame[80:180, left:left + 40] = 10
+        Image.fromarray(frame).save(os.path.join(path, f"{index:03d}.jpg"), quality=90)
+    return str(path)
+
+
+def _run(source, **settings):
+    """Run the pipeline headless over a snapshot directory; returns (metrics, messages, log)"""
+    out, log = io.StringIO(), io.StringIO()
+    config = {'analyzer': 'none', 'mqtt_client': 'service', 'cooldown_seconds': 0}
+    config.update(settings)
+    args = headless_args([source], 1.0, config)
+    # Publish through the host (service backend) so messages land in `out`
+    args['mqtt_client'] = config['mqtt_client']
+    pipeline = MotionPipeline(args, host=HeadlessHost(out, log), label='test')
+    assert pipeline.start(), log.getvalue()
+    try:
+        metrics = run(pipeline)
+    finally:
+        pipeline.stop()
+    messages = [json.loads(line) for line in out.getvalue().splitlines()]
+    return metrics[os.path.basename(source)], messages, log.getvalue()
+
+
+def test_headless_run_publishes_motion_only_events(tmp_path):
+    metrics, messages, log = _run(_scene_dir(tmp_path / 'yard'))
+    counters = metrics['counters']
+    assert counters['checks'] == 9      # 8 frames plus the end-of-source check
+    assert counters['triggers'] == 4
+    assert counters['api_skipped'] == 4
+    topics = [message['topic'] for message in messages]
+    assert topics.count('camera_detection/motion/binary') == 4
+    # The batched publisher coalesces retained topics, so only the final status survives
+    assert messages[0] == {'topic': 'camera_detection/status', 'payload': 'offline', 'retain': True}
+    assert 'First frame captured' in log
+
+
+def test_exhausted_tick_budget_skips_the_rest_of_the_check(tmp_path):
+    metrics, messages, log = _run(_scene_dir(tmp_path / 'yard'), tick_budget=0)
+    counters = metrics['counters']
+    assert counters['budget_skipped'] == 8
+    assert counters['triggers'] == 0
+    assert 'detect' not in metrics['stages']
+    assert 'skipping detect and later stages' in log
+
+
+def test_contact_sheet_is_encoded_once(tmp_path, stub_anthropic):
+    metrics, _, log = _run(_scene_dir(tmp_path / 'yard'), analyzer='anthropic', anthropic_api_key='test',
+                           analysis_frames='contact_sheet', preroll_frames=2, postroll_frames=0,
+                           analysis_rate_per_minute=600, analysis_burst=10)
+    assert metrics['counters']['analyses'] == 4
+    assert stub_anthropic[0].messages.calls == 4
+    assert log.count('Payload: contact sheet') == 4
+    assert 'Payload: ' not in log.replace('Payload: contact sheet', '')
+
+
+def test_rate_limited_triggers_are_skipped_before_queueing(tmp_path, stub_anthropic):
+    metrics, _, log = _run(_scene_dir(tmp_path / 'yard'), analyzer='anthropic', anthropic_api_key='test',
+                           analysis_rate_per_minute=1, analysis_burst=1)
+    counters = metrics['counters']
+    assert counters['triggers'] == 4
+    assert counters['analyses'] == 1 and stub_anthropic[0].messages.calls == 1
+    assert counters['api_skipped'] == 3
+    assert log.count('AI analysis unavailable (rate limit reached), motion-only event') == 3
+
+
+def test_cascade_counts_and_lazy_preroll_decodes(tmp_path, stub_anthropic, monkeypatch):
+    import motion_core.camera
+    import motion_core.pipeline
+    from motion_core.decode import decode_grayscale
+    decoded = []
+
+    def counting_decode(*args, **kwargs):
+        decoded.append(args[0])
+        return decode_grayscale(*args, **kwargs)
+
+    monkeypatch.setattr(motion_core.pipeline, 'decode_grayscale', counting_decode)
+    monkeypatch.setattr(motion_core.camera, 'decode_grayscale', counting_decode)
+    # Static frames 0-3, the box crosses in frames 4-9 and is gone from frame 10
+    metrics, _, log = _run(_scene_dir(tmp_path / 'yard', count=14), cascade=True, cascade_refresh=2,
+                           analyzer='anthropic', anthropic_api_key='test', analysis_frames='contact_sheet',
+                           preroll_frames=2, analysis_rate_per_minute=600, analysis_burst=10)
+    counters = metrics['counters']
+    # First frame, then quiet / refresh / quiet before and after the motion
+    assert (counters['cascade_passed'], counters['cascade_quiet'], counters['cascade_refresh']) == (8, 4, 2)
+    assert counters['triggers'] == 7
+    assert log.count('Payload: contact sheet') == 7
+    # Passed and refresh ticks decode; of the quiet frames only frame 3 is, when frame 4's pre-roll needs it
+    assert len(decoded) == 8 + 2 + 1
+
+
+def test_preclassifier_gates_the_api_call(tmp_path, stub_anthropic):
+    from motion_core.classifier import CLASSES, LinearModel, hog_features
+
+    def model(favour):
+        dims = len(hog_features(np.zeros((64, 64), np.uint8))) + 2
+        bias = np.zeros(len(CLASSES), dtype=np.float32)
+        bias[CLASSES.index(favour)] = 8.0
+        path = str(tmp_path / f"{favour}.npz")
+        LinearModel(np.zeros((dims, len(CLASSES)), np.float32), bias, np.zeros(dims, np.float32),
+                    np.ones(dims, np.float32)).save(path)
+        return path
+
+    source = _scene_dir(tmp_path / 'yard')
+    settings = dict(analyzer='anthropic', anthropic_api_key='test', analysis_rate_per_minute=600,
+                    analysis_burst=10, preclassifier_threshold=0.5, event_store_path=str(tmp_path / 'events'))
+    # Object score below the threshold: the trigger is stored as filtered, no API call
+    metrics, _, log = _run(source, preclassifier_model=model('nothing'), **settings)
+    counters = metrics['counters']
+    assert counters['preclassifier_rejected'] == counters['triggers'] == 4
+    assert counters.get('analyses', 0) == 0 and stub_anthropic[0].messages.calls == 0
+    assert 'skipping AI analysis' in log
+    # At or above it the vision API decides
+    metrics, _, _ = _run(source, preclassifier_model=model('person'), **settings)
+    counters = metrics['counters']
+    assert counters['preclassifier_passed'] == counters['analyses'] == 4
+    assert stub_anthropic[1].messages.calls == 4
+
+    from motion_core.eventstore import EventReader
+    events = EventReader(str(tmp_path / 'events')).events()
+    assert sorted(event['status'] for event in events) == ['analyzed'] * 4 + ['filtered'] * 4
+    # Every trigger keeps the crop it was classified on
+    assert all(event['crop'] and len(event['crop']) == 4 for event in events)
@@ -0,0 +1,219 @@
+import io
+import json
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from motion_core.headless import HeadlessHost
+from motion_core.pipeline import MotionPipeline
+from motion_core.publisher import MemoryBroker, MQTTPublisher, PahoBackend, StreamBackend
+
+
+class GatedBroker(MemoryBroker):
+    """MemoryBroker whose first send blocks until released, so messages pile up behind it"""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+
+    def send(self, topic, payload, retain=False, qos=0):
+        self.gate.wait(5)
+        super().send(topic, payload, retain, qos)
+
+
+class FailingBroker(MemoryBroker):
+    def send(self, topic, payload, retain=False, qos=0):
+        if topic == 'bad':
+            raise ConnectionError("broker gone")
+        super().send(topic, payload, retain, qos)
+
+
+def test_burst_goes_out_as_one_batch_in_order():
+    broker = MemoryBroker()
+    received = []
+    broker.subscribe(received.append)
+    publisher = MQTTPublisher(broker, batch_interval=0.05)
+    for index in range(5):
+        publisher.publish(f"cam/{index}", str(index))
+    assert publisher.flush()
+    assert [message['topic'] for message in broker.messages] == [f"cam/{index}" for index in range(5)]
+    assert received == broker.messages
+    assert publisher.stats()['batches'] == 1
+    assert publisher.stats()['sent'] == 5
+    publisher.stop()
+
+
+def test_retained_topic_is_coalesced_to_latest_value():
+    broker = GatedBroker()
+    publisher = MQTTPublisher(broker, batch_interval=0)
+    publisher.publish('cam/first', 'x')
+    time.sleep(0.05)      # the worker is now blocked sending cam/first
+    publisher.publish('cam/status', 'online', retain=True)
+    publisher.publish('cam/motion', 'ON')
+    publisher.publish('cam/status', 'busy', retain=True, qos=1)
+    publisher.publish('cam/status', 'offline', retain=True)
+    publisher.publish('cam/motion', 'ON')
+    broker.gate.set()
+    assert publisher.flush()
+    assert [(m['topic'], m['payload']) for m in broker.messages] == [
+        ('cam/first', 'x'), ('cam/status', 'offline'), ('cam/motion', 'ON'), ('cam/motion', 'ON')]
+    # The coalesced entry keeps its queue position and the highest QoS asked for
+    assert broker.messages[1]['qos'] == 1 and broker.messages[1]['retain']
+    assert broker.retained == {'cam/status': 'offline'}
+    assert publisher.stats()['coalesced'] == 2
+    publisher.stop()
+
+
+def test_queue_overflow_drops_oldest():
+    broker = GatedBroker()
+    publisher = MQTTPublisher(broker, batch_interval=0, max_queue=2)
+    publisher.publish('first', '0')
+    time.sleep(0.05)
+    for index in range(1, 5):
+        publisher.publish(f"topic/{index}", str(index), retain=index == 1)
+    publisher.publish('topic/1', 'again', retain=True)
+    broker.gate.set()
+    assert publisher.flush()
+    # topic/1 was dropped before it was updated again, so the update is queued anew
+    assert [m['topic'] for m in broker.messages] == ['first', 'topic/4', 'topic/1']
+    assert publisher.stats()['dropped'] == 3
+    publisher.stop()
+
+
+def test_failed_send_is_counted_and_logged():
+    lines = []
+    publisher = MQTTPublisher(FailingBroker(), batch_interval=0, log=lines.append)
+    publisher.publish('bad', '1')
+    publisher.publish('good', '2')
+    assert publisher.flush()
+    assert publisher.stats()['failed'] == 1 and publisher.stats()['sent'] == 1
+    assert lines == ["MQTT publish to bad failed: broker gone"]
+    publisher.stop()
+
+
+def test_stop_sends_queued_messages_then_ignores_new_ones():
+    broker = MemoryBroker()
+    publisher = MQTTPublisher(broker, batch_interval=10)
+    publisher.publish('cam/status', 'offline', retain=True)
+    publisher.stop()
+    publisher.publish('cam/late', '1')
+    assert broker.messages == [{'topic': 'cam/status', 'payload': 'offline', 'retain': True, 'qos': 0}]
+
+
+def test_stream_backend_writes_json_lines():
+    stream = io.StringIO()
+    StreamBackend(stream).send('cam/motion', 'ON', retain=False)
+    assert json.loads(stream.getvalue()) == {'topic': 'cam/motion', 'payload': 'ON', 'retain': False}
+
+
+# --- Direct connection, against a fake paho-mqtt ---------------------------------------
+
+class FakeClient:
+    instances = []
+    answer = 0          # CONNACK return code, or None for a broker that never answers
+    publish_rc = 0
+
+    def __init__(self, client_id=''):
+        self.client_id = client_id
+        self.will = None
+        self.on_connect = None
+        self.stopped = False
+        self.published = []
+        FakeClient.instances.append(self)
+
+    def username_pw_set(self, username, password):
+        pass
+
+    def will_set(self, topic, payload, qos=0, retain=False):
+        self.will = (topic, payload, qos, retain)
+
+    def max_queued_messages_set(self, count):
+        pass
+
+    def reconnect_delay_set(self, min_delay, max_delay):
+        pass
+
+    def connect_async(self, host, port, keepalive):
+        self.address = (host, port)
+
+    def loop_start(self):
+        if self.answer is not None:
+            threading.Thread(target=self.on_connect, args=(self, None, {}, self.answer)).start()
+
+    def loop_stop(self):
+        self.stopped = True
+
+    def disconnect(self):
+        pass
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, payload, qos, retain))
+        return types.SimpleNamespace(rc=self.publish_rc)
+
+
+@pytest.fixture
+def paho(monkeypatch):
+    client = types.ModuleType('paho.mqtt.client')
+    client.Client = FakeClient
+    client.MQTT_ERR_NO_CONN = 4
+    mqtt = types.ModuleType('paho.mqtt')
+    mqtt.client = client
+    package = types.ModuleType('paho')
+    package.mqtt = mqtt
+    monkeypatch.setitem(sys.modules, 'paho', package)
+    monkeypatch.setitem(sys.modules, 'paho.mqtt', mqtt)
+    monkeypatch.setitem(sys.modules, 'paho.mqtt.client', client)
+    FakeClient.instances = []
+    monkeypatch.setattr(FakeClient, 'answer', 0)
+    monkeypatch.setattr(FakeClient, 'publish_rc', 0)
+    return FakeClient
+
+
+def test_direct_backend_waits_for_the_broker(paho):
+    backend = PahoBackend('broker', will={'topic': 'cam/status', 'payload': 'offline', 'retain': True})
+    client = paho.instances[0]
+    assert client.address == ('broker', 1883)
+    assert client.will == ('cam/status', 'offline', 0, True)
+    backend.send('cam/motion', 'ON')
+    assert client.published == [('cam/motion', 'ON', 0, False)]
+
+
+@pytest.mark.parametrize('answer, message', [(None, 'no answer within 0.05s'), (5, 'connection refused (5)')])
+def test_direct_backend_raises_when_not_connected(paho, answer, message):
+    paho.answer = answer
+    with pytest.raises(ConnectionError, match=message.replace('(', r'\(').replace(')', r'\)')):
+        PahoBackend('broker', connect_timeout=0.05)
+    assert paho.instances[0].stopped
+
+
+def test_direct_backend_reports_failed_publishes(paho):
+    lines = []
+    backend = PahoBackend('broker', log=lines.append)
+    paho.publish_rc = 4
+    # QoS 1 while disconnected: paho keeps the message for the reconnect
+    backend.send('cam/motion', 'ON', qos=1)
+    assert lines == ["MQTT broker disconnected, cam/motion queued until it reconnects"]
+    with pytest.raises(ConnectionError):
+        backend.send('cam/motion', 'ON', qos=0)
+    paho.publish_rc = 15
+    with pytest.raises(ConnectionError):
+        backend.send('cam/motion', 'ON', qos=1)
+
+
+def test_pipeline_falls_back_to_service_when_broker_is_unreachable(paho):
+    paho.answer = None
+    out, log = io.StringIO(), io.StringIO()
+    pipeline = MotionPipeline({'snapshot_url': 'rtsp://camera/stream', 'analyzer': 'none',
+                               'mqtt_client': 'direct', 'mqtt_connect_timeout': 0.05, 'mqtt_batch_interval': 0},
+                              host=HeadlessHost(out, log), label='test')
+    assert pipeline.start()
+    assert pipeline.publisher.backend.name == 'service'
+    assert 'publishing through Home Assistant instead: no answer within 0.05s' in log.getvalue()
+    pipeline.publisher.flush()
+    pipeline.stop()
+    statuses = [json.loads(line)['payload'] for line in out.getvalue().splitlines()
+                if json.loads(line).get('topic') == 'camera_detection/status']
+    assert statuses == ['online', 'offline']
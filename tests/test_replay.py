@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from frames import SCENES, _encode
+from motion_core.replay import expand_grid, load_frames, replay, sweep
+
+# Frames 4-9 have a person-sized blob walking across the otherwise static yard
+MOTION = range(4, 10)
+
+
+@pytest.fixture(scope='module')
+def recording(tmp_path_factory):
+    """The synthetic scene as a directory of JPEGs, decoded the way the replay tool loads it"""
+    yard = list(SCENES['static'](320, 240, 14))
+    walk = list(SCENES['moving_blob'](320, 240, len(MOTION)))
+    path = tmp_path_factory.mktemp('replay')
+    for index, frame in enumerate(yard):
+        if index in MOTION:
+            frame = walk[index - MOTION.start]
+        (path / f"frame_{index:03d}.jpg").write_bytes(_encode(frame))
+    return load_frames(str(path), interval=2.0)
+
+
+def test_frames_load_once_with_their_timestamps(recording):
+    frames, timestamps = recording
+    assert frames.shape == (14, 240, 320) and frames.dtype == np.uint8
+    assert list(timestamps) == [2.0 * index for index in range(14)]
+
+
+def test_replay_triggers_on_the_motion_span(recording):
+    result = replay(*recording, {'motion_pixel_threshold': 500})
+    # The blob appears at frame 4, moves every frame and is gone again at frame 10
+    expected = list(range(MOTION.start, MOTION.stop + 1))
+    assert [trigger['frame'] for trigger in result['timeline']] == expected
+    assert result['motion_frames'] == result['triggers'] == len(expected)
+    assert result['frames'] == 14
+    assert [trigger['time'] for trigger in result['timeline']] == [2.0 * index for index in expected]
+
+
+def test_cooldown_spaces_triggers_but_not_motion_frames(recording):
+    result = replay(*recording, {'motion_pixel_threshold': 500, 'cooldown_seconds': 5})
+    assert result['motion_frames'] == 7
+    assert [trigger['frame'] for trigger in result['timeline']] == [4, 7, 10]
+
+
+def test_blob_boxes_are_listed_in_the_timeline(recording):
+    result = replay(*recording, {'motion_pixel_threshold': 500, 'blob_detection': True, 'blob_min_area': 200})
+    assert result['triggers'] > 0
+    assert all(trigger['blobs'] for trigger in result['timeline'])
+
+
+def test_expand_grid_orders_combinations_like_nested_loops():
+    assert expand_grid({'a': [1, 2], 'b': [3, 4], 'c': 5}) == [
+        {'a': 1, 'b': 3, 'c': 5}, {'a': 1, 'b': 4, 'c': 5}, {'a': 2, 'b': 3, 'c': 5}, {'a': 2, 'b': 4, 'c': 5}]
+    assert expand_grid({}) == [{}]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_sweep_returns_one_result_per_combination_in_grid_order(recording, workers):
+    grid = {'motion_pixel_threshold': [500, 100000]}
+    results = sweep(*recording, grid, base={'cooldown_seconds': 5}, workers=workers)
+    assert [result['settings'] for result in results] == [
+        {'cooldown_seconds': 5, 'motion_pixel_threshold': 500},
+        {'cooldown_seconds': 5, 'motion_pixel_threshold': 100000}]
+    assert [result['triggers'] for result in results] == [3, 0]
+    assert results[0] == replay(*recording, results[0]['settings'])
@@ -0,0 +1,161 @@
+from datetime import date
+
+import pytest
+
+from motion_core.resilience import (APIUnavailable, CircuitBreaker, DailyBudget, ResilientClient, TokenBucket,
+                                    retry_delay)
+from stubs import StubAnthropic
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyMessages:
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def create(self, **request):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'response'
+
+
+class Overloaded(Exception):
+    status_code = 529
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def _client(api=None, rate=6, burst=2, clock=None, **kwargs):
+    clock = clock or Clock()
+    client = ResilientClient(api or StubAnthropic(), lambda response: {}, rate_per_minute=rate, burst=burst,
+                             breaker=CircuitBreaker(2, 60, clock=clock), sleep=lambda seconds: None, **kwargs)
+    if client.bucket:
+        client.bucket = TokenBucket(rate, burst, clock=clock)
+    return client
+
+
+def test_token_bucket_refills_at_rate():
+    clock = Clock()
+    bucket = TokenBucket(6, burst=2, clock=clock)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    clock.now += 10
+    assert bucket.try_acquire()
+    bucket.give_back()
+    bucket.give_back()
+    bucket.give_back()
+    assert bucket.tokens == 2
+
+
+def test_available_does_not_take_a_token():
+    client = _client(burst=1, clock=Clock())
+    assert client.available() is None
+    assert client.available() is None
+    client.create(model='m')
+    assert client.available() is None      # still only breaker and budget
+    with pytest.raises(APIUnavailable, match='rate limit'):
+        client.create(model='m')
+
+
+def test_reserve_takes_the_token_before_queueing():
+    clock = Clock()
+    client = _client(burst=2, clock=clock)
+    assert client.reserve() is None
+    assert client.reserve() is None
+    # The third trigger is turned away now, not after it waited in the queue
+    assert client.reserve() == 'rate limit reached'
+    assert client.state()['reserved'] == 2 and client.state()['rejected'] == 1
+    client.create(reserved=True, model='m')
+    client.create(reserved=True, model='m')
+    assert client.state()['calls'] == 2 and client.state()['reserved'] == 0
+
+
+def test_release_gives_the_token_back():
+    client = _client(burst=1, clock=Clock())
+    assert client.reserve() is None
+    assert client.reserve() == 'rate limit reached'
+    client.release()
+    client.release()       # nothing left to release
+    assert client.state()['reserved'] == 0
+    assert client.reserve() is None
+    assert client.reserve() == 'rate limit reached'
+
+
+def test_reserved_call_rejected_later_returns_its_token():
+    clock = Clock()
+    api = StubAnthropic()
+    api.messages = FlakyMessages([Overloaded(), Overloaded()])
+    client = _client(api, burst=3, clock=clock, retries=0)
+    for _ in range(2):
+        with pytest.raises(Overloaded):
+            client.create(model='m')
+    assert client.breaker.state == 'open'
+    client.bucket.tokens = 0
+    client.reserved = 1
+    with pytest.raises(APIUnavailable, match='circuit open'):
+        client.create(reserved=True, model='m')
+    assert client.bucket.tokens == 1 and client.reserved == 0
+
+
+def test_reserve_respects_breaker_and_budget():
+    clock = Clock()
+    budget = DailyBudget(max_calls=1, today=lambda: date(2024, 1, 1))
+    client = _client(clock=clock, budget=budget)
+    assert client.reserve() is None
+    client.create(reserved=True, model='m')
+    assert client.reserve() == 'daily call limit of 1 reached'
+    assert client.state()['reserved'] == 0
+
+
+def test_retries_then_trips_the_breaker():
+    clock = Clock()
+    api = StubAnthropic()
+    api.messages = FlakyMessages([Overloaded(), Overloaded(), Overloaded()])
+    client = _client(api, rate=0, clock=clock, retries=2)
+    with pytest.raises(Overloaded):
+        client.create(model='m')
+    assert api.messages.calls == 3
+    state = client.state()
+    assert (state['retries'], state['failures'], state['consecutive_failures']) == (2, 1, 1)
+    assert retry_delay(3, base=1.0, maximum=5.0, rng=lambda: 1.0) == 5.0
+
+
+def test_client_errors_do_not_open_the_circuit():
+    clock = Clock()
+    api = StubAnthropic()
+    api.messages = FlakyMessages([BadRequest() for _ in range(5)])
+    client = _client(api, rate=0, clock=clock, retries=2)
+    for _ in range(5):
+        with pytest.raises(BadRequest):
+            client.create(model='m')
+    # Not retried, and the API is healthy, so the breaker stays closed
+    assert api.messages.calls == 5
+    state = client.state()
+    assert (state['circuit'], state['consecutive_failures'], state['failures'], state['retries']) == \
+        ('closed', 0, 5, 0)
+    assert client.create(model='m') == 'response'
+
+
+def test_client_error_on_the_trial_call_closes_the_circuit():
+    clock = Clock()
+    api = StubAnthropic()
+    api.messages = FlakyMessages([Overloaded(), Overloaded(), BadRequest()])
+    client = _client(api, rate=0, clock=clock, retries=0)
+    for _ in range(2):
+        with pytest.raises(Overloaded):
+            client.create(model='m')
+    assert client.breaker.state == 'open'
+    clock.now += 60
+    with pytest.raises(BadRequest):
+        client.create(model='m')
+    assert client.breaker.state == 'closed'
@@ -0,0 +1,84 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from motion_core.ringbuffer import FrameRing, contact_sheet
+
+
+def _frames(count, size=(32, 24)):
+    width, height = size
+    return [np.full((height, width), 20 * (index + 1), dtype=np.uint8) for index in range(count)]
+
+
+def _decode(data):
+    img = Image.open(BytesIO(data))
+    assert img.mode == 'L'
+    return np.asarray(img)
+
+
+def test_ring_keeps_newest_frames_and_jpegs():
+    ring = FrameRing(3, frame_size=(32, 24), jpeg_slots=2)
+    for index, frame in enumerate(_frames(5)):
+        ring.push(frame, jpeg=b'jpeg%d' % index, timestamp=float(index))
+    recent = ring.recent()
+    assert [timestamp for timestamp, _, _ in recent] == [2.0, 3.0, 4.0]
+    assert [jpeg for _, _, jpeg in recent] == [None, b'jpeg3', b'jpeg4']
+    assert recent[0][1][0, 0] == 60
+    with pytest.raises(ValueError):
+        ring.push(np.zeros((10, 10), dtype=np.uint8))
+
+
+def test_contact_sheet_tiles_oldest_first():
+    sheet = _decode(contact_sheet(_frames(4), gap=4, quality=95))
+    # 2 x 2 grid of 32x24 tiles with 4 px gaps
+    assert sheet.shape == (2 * 24 + 4, 2 * 32 + 4)
+    tiles = [sheet[12, 16], sheet[12, 36 + 16], sheet[28 + 12, 16], sheet[28 + 12, 36 + 16]]
+    assert [abs(int(value) - expected) <= 3 for value, expected in zip(tiles, (20, 40, 60, 80))] == [True] * 4
+
+
+def test_contact_sheet_crops_every_tile():
+    sheet = _decode(contact_sheet(_frames(2), crop_box=(0.5, 0.5, 1.0, 1.0), gap=0))
+    assert sheet.shape == (12, 32)
+
+
+def test_contact_sheet_is_scaled_to_max_edge_in_one_encode():
+    sheet = _decode(contact_sheet(_frames(9, size=(320, 240)), max_edge=256))
+    assert max(sheet.shape) == 256
+    assert _decode(contact_sheet(_frames(1), max_edge=256)).shape == (24, 32)
+    with pytest.raises(ValueError):
+        contact_sheet([])
+
+
+def test_encoded_frames_are_decoded_only_when_read():
+    decoded = []
+
+    def decode(data):
+        decoded.append(data)
+        if data == b'bad':
+            raise ValueError("corrupt frame")
+        return np.full((24, 32), data[0], dtype=np.uint8)
+
+    ring = FrameRing(4, frame_size=(32, 24), jpeg_slots=2, decode=decode)
+    ring.push_encoded(b'\x0a', timestamp=0.0)
+    ring.push_encoded(b'bad', timestamp=1.0)
+    ring.push(np.full((24, 32), 30, dtype=np.uint8), jpeg=b'jpeg2', timestamp=2.0)
+    ring.push_encoded(b'\x28', jpeg=b'\x28', timestamp=3.0)
+    assert decoded == []
+    assert ring.nbytes == 4 * 32 * 24 + len(b'jpeg2') + 1 + (1 + 3 + 1)
+
+    recent = ring.recent(3)
+    # The undecodable frame is left out
+    assert [timestamp for timestamp, _, _ in recent] == [2.0, 3.0]
+    assert [int(frame[0, 0]) for _, frame, _ in recent] == [30, 40]
+    assert [jpeg for _, _, jpeg in recent] == [b'jpeg2', b'\x28']
+    assert decoded == [b'bad', b'\x28']
+    # Decoded once, then served from the frame array
+    assert [int(frame[0, 0]) for _, frame, _ in ring.recent()] == [10, 30, 40]
+    assert decoded == [b'bad', b'\x28', b'\x0a']
+
+
+def test_encoded_push_needs_a_decoder():
+    with pytest.raises(ValueError):
+        FrameRing(2, frame_size=(32, 24)).push_encoded(b'jpeg')
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from motion_core.camera import Camera, camera_configs
+from motion_core.roi import MotionROI, polygon_contains
+
+# 320x240 detection frame, 20 px tiles: 12 rows x 16 cols
+LEFT_HALF = [[0.0, 0.0], [0.5, 0.0], [0.5, 1.0], [0.0, 1.0]]
+
+
+def test_polygon_contains_even_odd():
+    triangle = [[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]]
+    xs = np.array([0.1, 0.6, 0.9, 0.25])
+    ys = np.array([0.1, 0.6, 0.05, 0.25])
+    assert polygon_contains(triangle, xs, ys).tolist() == [True, False, True, True]
+
+
+def test_polygon_region_covers_tiles_with_centre_inside():
+    roi = MotionROI([{'name': 'left', 'polygon': LEFT_HALF}])
+    assert roi.pixel_bounds == (0, 240, 0, 160)
+    assert roi.active_tiles.shape == (12, 8) and roi.active_tiles.all()
+    assert roi.active_fraction == 0.5
+
+
+def test_tile_regions_crop_to_bounding_box():
+    roi = MotionROI([{'name': 'a', 'tiles': [[2, 3], [2, 4]]}, {'name': 'b', 'tiles': [[5, 6]]}])
+    assert roi.tile_bounds == (2, 6, 3, 7)
+    assert roi.pixel_bounds == (40, 120, 60, 140)
+    frame = np.arange(240 * 320).reshape(240, 320)
+    assert roi.crop(frame).shape == (80, 80)
+    # Tiles inside the box but in no region are not evaluated
+    assert roi.active_tiles.sum() == 3
+
+
+def test_score_counts_only_region_tiles_per_region():
+    roi = MotionROI([{'name': 'a', 'tiles': [[0, 0]], 'motion_pixel_threshold': 50},
+                     {'name': 'b', 'tiles': [[0, 2]], 'motion_pixel_threshold': 500}])
+    mask = np.zeros((20, 60), dtype=bool)
+    mask[:10, :10] = True       # 100 px in tile a
+    mask[:, 20:40] = True       # 400 px in the unassigned middle tile
+    mask[:5, 40:60] = True      # 100 px in tile b
+    total, scores = roi.score(mask)
+    assert total == 200
+    assert scores == [('a', 100, 50), ('b', 100, 500)]
+
+
+def test_score_without_mask():
+    roi = MotionROI([{'tiles': [[0, 0]]}], default_threshold=123)
+    assert roi.score(None) == (0, [('region_1', 0, 123)])
+
+
+@pytest.mark.parametrize('config, message', [
+    ({'name': 'x'}, 'polygon or tiles'),
+    ({'name': 'x', 'polygon': [[0.0, 0.0], [0.01, 0.0], [0.0, 0.01]]}, 'does not cover'),
+])
+def test_invalid_regions(config, message):
+    with pytest.raises(ValueError, match=message):
+        MotionROI([config])
+
+
+def test_tile_size_must_divide_frame():
+    with pytest.raises(ValueError, match='tile_size'):
+        MotionROI([{'tiles': [[0, 0]]}], tile_size=30)
+
+
+def _camera_detection(threshold_left, threshold_right, box):
+    camera = Camera(camera_configs({
+        'snapshot_url': 'rtsp://test', 'background_model': 'last_frame',
+        'roi': {'regions': [
+            {'name': 'left', 'polygon': LEFT_HALF, 'motion_pixel_threshold': threshold_left},
+            {'name': 'right', 'polygon': [[0.5, 0.0], [1.0, 0.0], [1.0, 1.0], [0.5, 1.0]],
+             'motion_pixel_threshold': threshold_right},
+        ]}
+    })[0])
+    frame = np.zeros((240, 320), dtype=np.uint8)
+    camera.detect(frame)
+    moved = frame.copy()
+    y0, y1, x0, x1 = box
+    moved[y0:y1, x0:x1] = 200
+    return camera.detect(moved)
+
+
+def test_camera_triggers_per_region_threshold():
+    # 40x40 = 1600 changed pixels on the right half
+    detection = _camera_detection(1000, 2000, (100, 140, 200, 240))
+    assert not detection.triggered
+    assert detection.region_scores == [('left', 0, 1000), ('right', 1600, 2000)]
+    detection = _camera_detection(2000, 1000, (100, 140, 200, 240))
+    assert detection.triggered
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pytest
+
+from motion_core.scheduler import AdaptiveInterval
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(hour=12, **kwargs):
+    clock = Clock()
+    settings = dict(burst_interval=5, burst_duration=60, idle_after=300, idle_interval=60,
+                    backoff_factor=1.5, min_interval=1, max_interval=300)
+    settings.update(kwargs)
+    scheduler = AdaptiveInterval(15, clock=clock, local_time=lambda: datetime(2026, 1, 1, hour, 30), **settings)
+    return scheduler, clock
+
+
+def test_normal_interval_until_idle():
+    scheduler, clock = _scheduler()
+    clock.now = 299
+    assert scheduler.next_interval() == 15
+    assert scheduler.mode == 'normal'
+
+
+def test_motion_speeds_up_for_burst_duration():
+    scheduler, clock = _scheduler()
+    clock.now = 100
+    scheduler.record(True)
+    clock.now = 159
+    assert scheduler.next_interval() == 5
+    assert scheduler.mode == 'burst'
+    scheduler.record(False)
+    clock.now = 160
+    assert scheduler.next_interval() == 15
+
+
+def test_idle_backs_off_stepwise_to_idle_interval():
+    scheduler, clock = _scheduler()
+    clock.now = 300
+    steps = [scheduler.next_interval() for _ in range(6)]
+    assert steps == [15, 22.5, 33.75, 50.625, 60, 60]
+    assert scheduler.mode == 'idle'
+
+
+def test_motion_resets_the_back_off():
+    scheduler, clock = _scheduler()
+    clock.now = 400
+    scheduler.next_interval()
+    scheduler.next_interval()
+    scheduler.record(True)
+    clock.now = 470
+    scheduler.record(False)
+    assert scheduler.next_interval() == 15
+    clock.now = 770
+    assert scheduler.next_interval() == 15   # back-off starts again from the base
+
+
+@pytest.mark.parametrize('hour, expected', [(23, 30), (3, 30), (6, 15), (12, 15)])
+def test_time_of_day_window_wraps_midnight(hour, expected):
+    scheduler, _ = _scheduler(hour=hour, windows=[{'start': '23:00', 'end': '06:00', 'check_interval': 30}])
+    assert scheduler.next_interval() == expected
+
+
+def test_intervals_are_clamped():
+    scheduler, clock = _scheduler(burst_interval=0.2, min_interval=1, idle_interval=900, max_interval=120)
+    scheduler.record(True)
+    assert scheduler.next_interval() == 1
+    scheduler.record(False)
+    clock.now = 1000
+    steps = [scheduler.next_interval() for _ in range(12)]
+    assert max(steps) == 120 and steps[-1] == 120
+
+
+def test_idle_interval_never_drops_below_a_slower_base():
+    scheduler, clock = _scheduler(hour=23, idle_interval=20,
+                                  windows=[{'start': '23:00', 'end': '06:00', 'check_interval': 45}])
+    clock.now = 300
+    assert [scheduler.next_interval() for _ in range(3)] == [45, 45, 45]
@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from stubs import STUB_RESULT, StubAnthropic
+from motion_core.vision import (DETECTION_PROMPT, DETECTION_TOOL, MIN_CACHEABLE_TOKENS, build_request,
+                                parse_response, prefix_tokens, prompt_cacheable, usage_counts)
+
+SONNET = 'claude-sonnet-4-5'
+HAIKU = 'claude-3-5-haiku-20241022'
+# About 1500 tokens: cacheable for Sonnet, still too short for Haiku
+LONG_PROMPT = DETECTION_PROMPT + "\n\n" + "Describe vehicles by colour and type. " * 150
+
+
+def _analyze(client, **settings):
+    response = client.messages.create(**build_request(['aW1hZ2U='], **settings))
+    return response, parse_response(response)
+
+
+def test_structured_request_forces_the_tool():
+    request = build_request(['aW1hZ2U=', 'aW1hZ2Uy'], note='Frame 2 triggered.', model=SONNET)
+    assert request['tools'] == [DETECTION_TOOL]
+    assert request['tool_choice'] == {'type': 'tool', 'name': 'report_detections'}
+    assert request['system'][0]['text'] == DETECTION_PROMPT
+    content = request['messages'][0]['content']
+    assert [block['type'] for block in content] == ['image', 'image', 'text']
+    assert content[-1]['text'] == 'Frame 2 triggered.'
+
+
+def test_tool_use_answer_is_parsed():
+    response, result = _analyze(StubAnthropic())
+    assert response.stop_reason == 'tool_use'
+    assert result == STUB_RESULT
+
+
+def test_text_answer_falls_back_to_the_json_in_it():
+    response, result = _analyze(StubAnthropic(), structured=False)
+    assert response.stop_reason == 'end_turn' and response.content[0].type == 'text'
+    assert result == STUB_RESULT
+    # Prose around the JSON, as from a model that did not use the tool
+    client = StubAnthropic(text=f"Here is what I see:\n{json.dumps(STUB_RESULT)}\nHope that helps.")
+    assert _analyze(client)[1] == STUB_RESULT
+
+
+@pytest.mark.parametrize('text', ["I can't tell what is in this image.", "{detections: [person]}", ""])
+def test_unparseable_text_returns_none(text):
+    assert _analyze(StubAnthropic(text=text))[1] is None
+
+
+def test_tool_answer_missing_fields_gets_defaults():
+    client = StubAnthropic()
+    response = client.messages.create(**build_request(['aW1hZ2U=']))
+    response.content[0].input = {'detections': [STUB_RESULT['detections'][0]]}
+    assert parse_response(response) == {'detections': STUB_RESULT['detections'], 'summary': ''}
+
+
+def test_default_prompt_is_too_short_to_cache():
+    assert prefix_tokens() < MIN_CACHEABLE_TOKENS
+    assert not prompt_cacheable(SONNET)
+    client = StubAnthropic()
+    for _ in range(2):
+        response, _ = _analyze(client, model=SONNET)
+        assert 'cache_control' not in build_request(['aW1hZ2U='], model=SONNET)['system'][0]
+    assert usage_counts(response)['cache_read_tokens'] == 0
+
+
+def test_long_prompt_is_cached_above_the_model_minimum():
+    assert prompt_cacheable(SONNET, LONG_PROMPT)
+    assert not prompt_cacheable(HAIKU, LONG_PROMPT)
+    assert 'cache_control' in build_request(['aW1hZ2U='], model=SONNET, prompt=LONG_PROMPT)['system'][0]
+    assert 'cache_control' not in build_request(['aW1hZ2U='], model=HAIKU, prompt=LONG_PROMPT)['system'][0]
+    assert 'cache_control' not in build_request(['aW1hZ2U='], model=SONNET, prompt=LONG_PROMPT,
+                                                 cache_prompt=False)['system'][0]
+
+    client = StubAnthropic()
+    first, _ = _analyze(client, model=SONNET, prompt=LONG_PROMPT)
+    second, result = _analyze(client, model=SONNET, prompt=LONG_PROMPT)
+    assert usage_counts(first)['cache_write_tokens'] >= MIN_CACHEABLE_TOKENS
+    assert usage_counts(second)['cache_read_tokens'] == usage_counts(first)['cache_write_tokens']
+    assert result == STUB_RESULT
+
+
+def test_stub_ignores_cache_control_below_the_minimum():
+    client = StubAnthropic()
+    request = build_request(['aW1hZ2U='], model=SONNET)
+    request['system'][0]['cache_control'] = {'type': 'ephemeral'}
+    client.messages.create(**request)
+    usage = usage_counts(client.messages.create(**request))
+    assert usage['cache_read_tokens'] == usage['cache_write_tokens'] == 0
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from motion_core.workqueue import AnalysisQueue
+
+
+class BlockingHandler:
+    """Records jobs; holds the worker on the first one until released"""
+
+    def __init__(self):
+        self.jobs = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def __call__(self, job):
+        self.started.set()
+        self.release.wait(5)
+        if job == 'fail':
+            raise RuntimeError('boom')
+        self.jobs.append(job)
+
+
+def _busy_queue(overflow, maxsize=2, **kwargs):
+    """Queue whose only worker is stuck on job 0"""
+    handler = BlockingHandler()
+    queue = AnalysisQueue(handler, workers=1, maxsize=maxsize, overflow=overflow, **kwargs)
+    assert queue.submit(0)
+    assert handler.started.wait(5)
+    return queue, handler
+
+
+def _drain(queue, handler):
+    handler.release.set()
+    assert queue.wait(5)
+    stats = queue.stats()
+    queue.stop()
+    return stats
+
+
+@pytest.mark.parametrize('overflow, accepted, processed, dropped', [
+    ('drop_oldest', [True] * 5, [0, 4, 5], 3),
+    ('drop_newest', [True, True, False, False, False], [0, 1, 2], 3),
+    # Full at 3 (1, 2 discarded) and again at 5 (3, 4 discarded)
+    ('keep_latest', [True] * 5, [0, 5], 4),
+])
+def test_overflow_policies(overflow, accepted, processed, dropped):
+    queue, handler = _busy_queue(overflow)
+    assert [queue.submit(job) for job in (1, 2, 3, 4, 5)] == accepted
+    assert queue.depth == len(processed) - 1
+    stats = _drain(queue, handler)
+    assert handler.jobs == processed
+    assert stats['submitted'] == 6
+    assert stats['dropped'] == dropped
+    assert stats['completed'] == len(processed)
+    assert stats['depth'] == stats['in_flight'] == 0
+
+
+def test_stale_jobs_expire():
+    queue, handler = _busy_queue('drop_oldest', max_age=0.05)
+    queue.submit(1)
+    time.sleep(0.1)
+    stats = _drain(queue, handler)
+    assert handler.jobs == [0]
+    assert stats['expired'] == 1
+
+
+@pytest.mark.parametrize('overflow, discarded', [
+    ('drop_oldest', [1, 2, 3]),
+    ('drop_newest', [3, 4, 5]),
+    ('keep_latest', [1, 2, 3, 4]),
+])
+def test_dropped_jobs_are_handed_to_on_discard(overflow, discarded):
+    jobs = []
+    queue, handler = _busy_queue(overflow, on_discard=jobs.append)
+    for job in (1, 2, 3, 4, 5):
+        queue.submit(job)
+    _drain(queue, handler)
+    assert jobs == discarded
+
+
+def test_expired_jobs_are_handed_to_on_discard():
+    jobs = []
+    queue, handler = _busy_queue('drop_oldest', max_age=0.05, on_discard=jobs.append)
+    queue.submit(1)
+    time.sleep(0.1)
+    _drain(queue, handler)
+    assert jobs == [1]
+
+
+def test_failed_jobs_are_counted_and_logged():
+    messages = []
+    handler = BlockingHandler()
+    handler.release.set()
+    queue = AnalysisQueue(handler, log=messages.append)
+    queue.submit('fail')
+    queue.submit(1)
+    assert queue.wait(5)
+    stats = queue.stats()
+    queue.stop()
+    assert (stats['failed'], stats['completed']) == (1, 1)
+    assert messages == ['Analysis job failed: boom']
+
+
+def test_on_change_reports_queue_state():
+    states = []
+    handler = BlockingHandler()
+    handler.release.set()
+    queue = AnalysisQueue(handler, on_change=states.append)
+    queue.submit(1)
+    assert queue.wait(5)
+    queue.stop()
+    assert states[0]['submitted'] == 1
+    assert any(state['in_flight'] == 1 for state in states)
+    assert states[-1]['completed'] == 1 and states[-1]['in_flight'] == 0
+
+
+def test_stopped_queue_rejects_jobs():
+    queue = AnalysisQueue(lambda job: None)
+    queue.stop()
+    assert not queue.submit(1)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        AnalysisQueue(lambda job: None, overflow='replace')